@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.db.models import Sum, Count
 from django.utils.html import format_html
-from .models import TelegramUser, Conversation, BotAdmin
+from .models import TelegramUser, Conversation, BotAdmin, FaqEntry
+from rag.translit import normalize_query
 import csv
 from django.http import HttpResponse
 
@@ -20,10 +21,10 @@ class TelegramUserAdmin(admin.ModelAdmin):
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'short_question', 'status_badge', 'total_tokens', 'cost_display', 'created_at']
-    list_filter = ['status', 'created_at']
+    list_display = ['id', 'user', 'short_question', 'status_badge', 'route', 'total_tokens', 'cost_display', 'created_at']
+    list_filter = ['status', 'route', 'created_at']
     search_fields = ['question', 'answer', 'user__username', 'user__telegram_id']
-    readonly_fields = ['created_at', 'input_tokens', 'output_tokens', 'total_tokens', 'cost']
+    readonly_fields = ['created_at', 'input_tokens', 'output_tokens', 'total_tokens', 'cached_tokens', 'cost']
     date_hierarchy = 'created_at'
     actions = ['export_to_csv']
 
@@ -72,6 +73,38 @@ class BotAdminAdmin(admin.ModelAdmin):
     search_fields = ['telegram_id', 'username']
 
 
+@admin.register(FaqEntry)
+class FaqEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'short_question', 'alphabet', 'cluster_size', 'is_approved', 'created_at']
+    list_filter = ['is_approved', 'alphabet', 'created_at']
+    list_editable = ['is_approved']
+    search_fields = ['question', 'answer']
+    readonly_fields = ['cluster_size', 'created_at']
+    exclude = ['embedding']
+    actions = ['approve', 'unapprove']
+
+    def short_question(self, obj):
+        return obj.question[:80] + '...' if len(obj.question) > 80 else obj.question
+    short_question.short_description = 'Savol'
+
+    def save_model(self, request, obj, form, change):
+        # Savol matni o'zgarsa embedding qayta hisoblanadi
+        if 'question' in form.changed_data:
+            # OpenAI client faqat shu yerda kerak - manage.py buyruqlari OPENAI_API_KEY siz ishlaydi
+            from rag.embeddings import get_embedding
+            text = obj.question if obj.alphabet == 'russian' else normalize_query(obj.question)
+            obj.embedding = get_embedding(text)
+        super().save_model(request, obj, form, change)
+
+    def approve(self, request, queryset):
+        queryset.update(is_approved=True)
+    approve.short_description = "Tasdiqlash (bot GPT siz javob beradi)"
+
+    def unapprove(self, request, queryset):
+        queryset.update(is_approved=False)
+    unapprove.short_description = "Tasdiqni bekor qilish"
+
+
 # Dashboard statistika
 class DashboardAdmin(admin.AdminSite):
     site_header = "Eco Bot Admin"
@@ -0,0 +1,92 @@
+"""
+Semantik javob keshi
+
+Yangi savol embeddingi avval berilgan savolga ANSWER_CACHE_MAX_DISTANCE
+(kosinus masofa) dan yaqin bo'lsa va alifbo hamda indeks versiyasi bir xil
+bo'lsa, saqlangan javob GPT chaqirilmasdan qaytariladi. index_rules
+collection ni qayta qurganda versiya o'zgaradi va eski yozuvlar o'chadi.
+"""
+import threading
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+
+class AnswerCache:
+    """Alifbo bo'yicha ajratilgan, hajmi chegaralangan semantik kesh"""
+
+    def __init__(self, max_size: int, max_distance: float):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        # alphabet -> {'version': str, 'vectors': np.ndarray, 'items': list}
+        self._buckets = {}
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.saved_cost = Decimal('0')
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _bucket(self, alphabet: str, version: str) -> dict:
+        bucket = self._buckets.get(alphabet)
+        if bucket is None or bucket['version'] != version:
+            # Indeks yangilangan - eski javoblar endi ishonchli emas
+            bucket = {'version': version, 'vectors': None, 'items': []}
+            self._buckets[alphabet] = bucket
+        return bucket
+
+    def lookup(self, alphabet: str, version: str, embedding):
+        """Eng yaqin saqlangan javob (dict) yoki None"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            bucket = self._bucket(alphabet, version)
+            if bucket['vectors'] is None:
+                self.misses += 1
+                return None
+
+            similarities = bucket['vectors'] @ vector
+            best = int(np.argmax(similarities))
+            if 1.0 - float(similarities[best]) > self.max_distance:
+                self.misses += 1
+                return None
+
+            item = bucket['items'][best]
+            self.hits += 1
+            self.saved_tokens += item['total_tokens']
+            self.saved_cost += item['cost']
+            return item
+
+    def store(self, alphabet: str, version: str, embedding, item: dict):
+        vector = self._normalize(embedding)[np.newaxis, :]
+        with self._lock:
+            bucket = self._bucket(alphabet, version)
+            if bucket['vectors'] is None:
+                bucket['vectors'] = vector
+            else:
+                bucket['vectors'] = np.vstack([bucket['vectors'], vector])
+            bucket['items'].append(item)
+
+            # Eng eski yozuvlarni chiqarib tashlash
+            overflow = len(bucket['items']) - self.max_size
+            if overflow > 0:
+                bucket['vectors'] = bucket['vectors'][overflow:]
+                bucket['items'] = bucket['items'][overflow:]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'saved_tokens': self.saved_tokens,
+            'saved_cost': self.saved_cost,
+        }
+
+
+answer_cache = AnswerCache(settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_MAX_DISTANCE)
@@ -0,0 +1,128 @@
+"""
+Kunlik xarajat byudjeti va so'rov oldidan prompt byudjeti
+
+Xarajat faqat javob kelgandan keyin (usage dan) ma'lum bo'ladi, shuning
+uchun prompt tokenlari yuborishdan oldin tiktoken bilan sanaladi:
+kontekst REQUEST_MAX_PROMPT_TOKENS ga sig'adigan qilib qisqartiriladi va
+katta modelning taxminiy narxi kunlik qoldiq bilan solishtiriladi.
+
+Bugungi xarajat Conversation jadvalidan BUDGET_REFRESH_INTERVAL soniyada
+bir marta o'qiladi (bir nechta worker bitta DB ni bo'lishadi), unga shu
+jarayonning hali DB ga yozilmagan xarajati qo'shiladi: Conversation lar
+fonda yoziladi (bot/conversation_log.py), shuning uchun o'qish paytida
+navbatda turgan yozuvlar ham hisobga olinadi (tashlab yuborilganlaridan
+tashqari). DAILY_COST_LIMIT ning
+DAILY_COST_DOWNGRADE_SHARE ulushidan keyin murakkab savollar ham
+SIMPLE_MODEL ga yarim kontekst bilan yuboriladi, limit tugaganda esa
+pullik so'rovlar rad etiladi (FAQ, kesh va intentlar ishlayveradi).
+"""
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from bot.conversation_log import conversation_writer
+from bot.db import db_sync_to_async
+from bot.models import Conversation
+
+
+# Javob narxini oldindan baholash uchun kutilgan chiqish tokenlari
+EXPECTED_OUTPUT_TOKENS = 800
+
+
+def _today_start():
+    return timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@db_sync_to_async
+def _load_spent(since) -> Decimal:
+    return Conversation.objects.filter(created_at__gte=since).aggregate(cost=Sum('cost'))['cost'] or Decimal('0')
+
+
+def context_budget(fixed_tokens: int, downgraded: bool = False) -> int:
+    """
+    Kontekst uchun tokenlar: RAG_CONTEXT_TOKENS, lekin system prompt va savol
+    (fixed_tokens) bilan birga REQUEST_MAX_PROMPT_TOKENS dan oshmaydi
+    """
+    budget = min(settings.RAG_CONTEXT_TOKENS, settings.REQUEST_MAX_PROMPT_TOKENS - fixed_tokens)
+    if downgraded:
+        budget //= 2
+    return max(budget, 0)
+
+
+class DailyBudget:
+    """Bugungi xarajat va limit bo'yicha qaror: ok / downgrade / refuse"""
+
+    def __init__(self, limit: float, downgrade_share: float, refresh_interval: float, writer):
+        self.limit = Decimal(str(limit))
+        self.downgrade_share = Decimal(str(downgrade_share))
+        self.refresh_interval = refresh_interval
+        # Conversation yozuvchisi (written_cost - DB ga yetib borgan xarajat)
+        self.writer = writer
+        self._day = None
+        self._loaded_at = None
+        # DB dagi bugungi xarajat, shu jarayon xarajati (jami) va
+        # undan oxirgi yuklash paytida DB ga yozilgan qismi
+        self._stored = Decimal('0')
+        self._added = Decimal('0')
+        self._flushed = Decimal('0')
+        self.downgraded = 0
+        self.refused = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    @property
+    def spent(self) -> Decimal:
+        # Tashlangan yozuvlar DB ga yetmaydi - ular ayirilmasa navbatdagi qism (keyingi kunlarda ham) kamaymaydi
+        pending = self._added - self._flushed - self.writer.dropped_cost
+        return self._stored + max(pending, Decimal('0'))
+
+    async def refresh(self, force: bool = False):
+        """Bugungi xarajatni DB dan qayta o'qish (kun almashganda yoki refresh_interval o'tganda)"""
+        if not self.enabled:
+            return
+        day = _today_start()
+        if (not force and self._day == day
+                and time.monotonic() - self._loaded_at < self.refresh_interval):
+            return
+        self._day = day
+        self._loaded_at = time.monotonic()
+        # O'qishdan oldin: oraliqda yozilgan yozuv ikki marta sanalishi mumkin, lekin tushib qolmaydi
+        flushed = self.writer.written_cost
+        stored = await _load_spent(day)
+        self._stored = stored
+        self._flushed = flushed
+
+    def add(self, cost: Decimal):
+        self._added += cost
+
+    def mode(self, estimated_cost: Decimal = Decimal('0')) -> str:
+        """
+        'refuse' - limit tugagan; 'downgrade' - ulushdan o'tilgan yoki shu
+        so'rov (estimated_cost) limitdan oshiradi; aks holda 'ok'
+        """
+        if not self.enabled:
+            return 'ok'
+        spent = self.spent
+        if spent >= self.limit:
+            return 'refuse'
+        if spent >= self.limit * self.downgrade_share or spent + estimated_cost > self.limit:
+            return 'downgrade'
+        return 'ok'
+
+    def stats(self) -> dict:
+        return {
+            'limit': self.limit,
+            'spent': self.spent,
+            'mode': self.mode(),
+            'downgraded': self.downgraded,
+            'refused': self.refused,
+        }
+
+
+daily_budget = DailyBudget(settings.DAILY_COST_LIMIT, settings.DAILY_COST_DOWNGRADE_SHARE,
+                           settings.BUDGET_REFRESH_INTERVAL, conversation_writer)
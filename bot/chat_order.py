@@ -0,0 +1,57 @@
+"""
+Polling va webhook rejimlari uchun update processor: turli chatlarning
+update lari parallel qayta ishlanadi, bitta chatniki esa kelish tartibida
+(oldingi javob tugamaguncha keyingisi boshlanmaydi)
+
+Parallel update lar soni chat lock idan keyin cheklanadi: navbatini kutayotgan
+update joy egallamaydi, shuning uchun ko'p xabar yuborgan bitta chat boshqa
+chatlarni to'xtatib qo'ymaydi.
+
+Worker rejimida bu kafolatni bo'limlar (bot/worker_queue.py) beradi.
+"""
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+# BaseUpdateProcessor semafori do_process_update dan oldin olinadi (chat navbatida
+# kutayotgan update ham joy egallaydi) - u amalda cheklanmaydi, o'rniga o'zimizniki
+UNBOUNDED = 2 ** 31
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """chat_id bo'yicha asyncio.Lock (FIFO) - chat bo'lmagan update lar darhol bajariladi"""
+
+    def __init__(self, max_concurrent_updates: int):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        super().__init__(UNBOUNDED)
+        # Faqat bajarilayotgan update lar uchun semafor
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # chat_id -> [Lock, shu chatning kutayotgan/bajarilayotgan update lari soni]
+        self._chats = {}
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._running:
+                await coroutine
+            return
+
+        entry = self._chats.setdefault(chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._running:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,122 @@
+"""
+Conversation yozuvlarini fonda, guruhlab saqlash (write-behind)
+
+save_conversation() yozuvni navbatga qo'yadi va darhol qaytadi; fondagi
+task yozuvlarni CONVERSATION_LOG_BATCH_SIZE ta yig'ilganda yoki
+CONVERSATION_LOG_FLUSH_INTERVAL soniya o'tganda bitta bulk_create bilan
+yozadi. Bot to'xtaganda (post_shutdown) navbat to'liq yoziladi.
+
+Navbat to'lib qolganda (CONVERSATION_LOG_MAX_QUEUE):
+    yozuvchi CONVERSATION_LOG_PUT_TIMEOUT soniyagacha joy bo'shashini
+    kutadi (backpressure). Shu vaqt ichida ham joy bo'shamasa, yozuv
+    tashlab yuboriladi va `dropped` (narxi - `dropped_cost`) hisoblagichi
+    oshadi. Javob foydalanuvchiga oldin yuboriladi, shuning uchun bu kutish
+    unga ta'sir qilmaydi.
+"""
+import asyncio
+from decimal import Decimal
+
+from django.conf import settings
+
+from bot.db import db_sync_to_async
+from bot.models import Conversation
+
+
+@db_sync_to_async
+def bulk_save_conversations(conversations: list):
+    """Conversation larni bitta INSERT bilan saqlash"""
+    Conversation.objects.bulk_create(conversations)
+
+
+class ConversationWriter:
+    """Conversation yozuvlari uchun chegaralangan navbat va fondagi yozuvchi"""
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int, put_timeout: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self._queue = None
+        self._task = None
+        self.written = 0
+        # Saqlangan yozuvlar narxi (jami) - byudjet navbatdagi xarajatni DB dagisidan ajratadi
+        self.written_cost = Decimal('0')
+        self.dropped = 0
+        # Tashlangan yozuvlar narxi - ular DB ga hech qachon yetib bormaydi
+        self.dropped_cost = Decimal('0')
+        self.flushes = 0
+
+    def start(self):
+        """Fondagi yozuvchini ishga tushirish (bot event loop ichida)"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, conversation: Conversation):
+        """Yozuvni navbatga qo'yish"""
+        if self._task is None:
+            # Yozuvchi ishga tushmagan (masalan, management command dan chaqirilganda)
+            await bulk_save_conversations([conversation])
+            self.written += 1
+            self.written_cost += Decimal(conversation.cost)
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.put(conversation), self.put_timeout)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            self.dropped_cost += Decimal(conversation.cost)
+            print(f"Conversation navbati to'la, yozuv tashlandi (jami: {self.dropped})")
+
+    async def close(self):
+        """Navbatdagi barcha yozuvlarni saqlab, yozuvchini to'xtatish"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stop = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: list):
+        try:
+            await bulk_save_conversations(batch)
+            self.written += len(batch)
+            self.written_cost += sum((Decimal(conversation.cost) for conversation in batch), Decimal('0'))
+            self.flushes += 1
+        except Exception as e:
+            self.dropped += len(batch)
+            self.dropped_cost += sum((Decimal(conversation.cost) for conversation in batch), Decimal('0'))
+            print(f"Conversation larni saqlashda xatolik ({len(batch)} ta): {e}")
+
+
+conversation_writer = ConversationWriter(
+    batch_size=settings.CONVERSATION_LOG_BATCH_SIZE,
+    flush_interval=settings.CONVERSATION_LOG_FLUSH_INTERVAL,
+    max_queue=settings.CONVERSATION_LOG_MAX_QUEUE,
+    put_timeout=settings.CONVERSATION_LOG_PUT_TIMEOUT,
+)
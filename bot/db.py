@@ -0,0 +1,92 @@
+"""
+DB bilan ishlash uchun alohida thread pool
+
+Oddiy @sync_to_async (thread_sensitive=True) barcha ORM chaqiruvlarini bitta
+thread orqali ketma-ket o'tkazadi. @db_sync_to_async esa ularni DB_POOL_SIZE
+o'lchamli pool da bajaradi; har bir thread o'z doimiy ulanishini saqlaydi
+(CONN_MAX_AGE / CONN_HEALTH_CHECKS).
+"""
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.DB_POOL_SIZE,
+    thread_name_prefix="db"
+)
+
+
+class DBMetrics:
+    """Har bir DB funksiyasi uchun navbatda kutish va bajarilish vaqtlari"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name: str, wait: float, run: float):
+        with self._lock:
+            item = self._stats.setdefault(name, {
+                'calls': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'run_total': 0.0
+            })
+            item['calls'] += 1
+            item['wait_total'] += wait
+            item['wait_max'] = max(item['wait_max'], wait)
+            item['run_total'] += run
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: dict(item) for name, item in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+db_metrics = DBMetrics()
+
+
+def db_sync_to_async(func):
+    """
+    @sync_to_async o'rniga: funksiyani db_executor da bajarish va
+    navbatda kutish vaqtini db_metrics ga yozish
+    """
+    def run(submitted_at, *args, **kwargs):
+        started = time.perf_counter()
+        # Eskirgan yoki uzilgan ulanishlarni yopish (CONN_MAX_AGE ga rioya qilish)
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db_metrics.record(func.__name__, started - submitted_at, time.perf_counter() - started)
+
+    runner = sync_to_async(run, thread_sensitive=False, executor=db_executor)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await runner(time.perf_counter(), *args, **kwargs)
+
+    return wrapper
+
+
+def format_db_metrics() -> str:
+    """DB metrikalarini admin uchun matn ko'rinishida tayyorlash"""
+    snapshot = db_metrics.snapshot()
+    if not snapshot:
+        return "DB chaqiruvlari hali yo'q"
+
+    lines = [f"🗄 DB pool: {settings.DB_POOL_SIZE} thread\n"]
+    for name, item in sorted(snapshot.items(), key=lambda kv: -kv[1]['wait_total']):
+        calls = item['calls']
+        lines.append(
+            f"{name}: {calls} ta, "
+            f"kutish o'rt. {item['wait_total'] / calls * 1000:.1f} ms "
+            f"(max {item['wait_max'] * 1000:.1f} ms), "
+            f"bajarilish o'rt. {item['run_total'] / calls * 1000:.1f} ms"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,125 @@
+"""
+Tasdiqlangan FAQ javoblari: retrieval va GPT dan oldingi tez yo'l
+
+build_faq buyrug'i Conversation tarixidagi savollarni embedding bo'yicha
+klasterlab FaqEntry takliflarini yaratadi, admin ularni Django admin da
+tasdiqlaydi. Tasdiqlangan yozuvlar alifbo bo'yicha xotiradagi matritsaga
+yuklanadi (FAQ_RELOAD_INTERVAL soniyada bir marta yangilanadi) va savol
+embeddingi eng yaqin yozuvga FAQ_MIN_SIMILARITY dan yaqin bo'lsa, javob
+token sarflamasdan qaytariladi.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from bot.db import db_sync_to_async
+from bot.models import FaqEntry
+
+
+def _normalize_rows(embeddings) -> np.ndarray:
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def cluster_questions(embeddings, threshold: float, min_size: int) -> list:
+    """
+    Kosinus o'xshashlik bo'yicha ochko'z (leader) klasterlash
+
+    Returns:
+        [(markaziy element indeksi, [a'zolar indekslari]), ...] - kattalari oldin
+    """
+    matrix = _normalize_rows(embeddings)
+    unassigned = np.ones(len(matrix), dtype=bool)
+    clusters = []
+    for leader in range(len(matrix)):
+        if not unassigned[leader]:
+            continue
+        candidates = np.flatnonzero(unassigned)
+        members = candidates[matrix[candidates] @ matrix[leader] >= threshold]
+        unassigned[members] = False
+        if len(members) < min_size:
+            continue
+        # Markaz - klasterdagi boshqa savollarga o'rtacha eng yaqin savol
+        block = matrix[members]
+        center = members[int(np.argmax((block @ block.T).mean(axis=1)))]
+        clusters.append((int(center), members.tolist()))
+    clusters.sort(key=lambda cluster: len(cluster[1]), reverse=True)
+    return clusters
+
+
+@db_sync_to_async
+def _load_approved() -> list:
+    return list(FaqEntry.objects.filter(is_approved=True).values('id', 'question', 'answer', 'alphabet', 'embedding'))
+
+
+class FaqIndex:
+    """Alifbo bo'yicha tasdiqlangan FAQ yozuvlari matritsasi"""
+
+    def __init__(self, min_similarity: float, reload_interval: float):
+        self.min_similarity = min_similarity
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        # alphabet -> (matritsa, yozuvlar)
+        self._buckets = {}
+        self._loaded_at = None
+        self.hits = 0
+        self.misses = 0
+
+    async def refresh(self, force: bool = False):
+        """Tasdiqlangan yozuvlarni DB dan qayta yuklash (reload_interval o'tgan bo'lsa)"""
+        if not force and self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reload_interval:
+            return
+        self._loaded_at = time.monotonic()
+        entries = await _load_approved()
+
+        grouped = {}
+        for entry in entries:
+            grouped.setdefault(entry['alphabet'], []).append(entry)
+        buckets = {
+            alphabet: (_normalize_rows([entry['embedding'] for entry in items]), items)
+            for alphabet, items in grouped.items()
+        }
+        with self._lock:
+            self._buckets = buckets
+
+    def lookup(self, alphabet: str, embedding):
+        """Eng yaqin tasdiqlangan yozuv (dict) yoki None"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        with self._lock:
+            bucket = self._buckets.get(alphabet)
+            if bucket is None:
+                self.misses += 1
+                return None
+
+            matrix, entries = bucket
+            if matrix.shape[1] != len(vector):
+                # Embedding modeli o'zgargan - build_faq qayta ishga tushirilishi kerak
+                self.misses += 1
+                return None
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if float(similarities[best]) < self.min_similarity:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entries[best]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'entries': sum(len(entries) for _, entries in self._buckets.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+faq_index = FaqIndex(settings.FAQ_MIN_SIMILARITY, settings.FAQ_RELOAD_INTERVAL)
@@ -1,5 +1,7 @@
 import os
 import sys
+import asyncio
+import time
 import django
 
 # Django setup
@@ -9,22 +11,39 @@ django.setup()
 
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from openai import OpenAI
+from openai import AsyncOpenAI
 from django.conf import settings
 from decimal import Decimal
 from datetime import datetime, timedelta
 from django.db.models import Sum, Count
 from django.utils import timezone
-from asgiref.sync import sync_to_async
 
 from bot.models import TelegramUser, Conversation, BotAdmin
-from rag.vectordb import get_context, search
-
-
-# OpenAI client
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-# System prompt
+from bot.db import db_sync_to_async, format_db_metrics
+from bot.user_cache import get_user_id
+from bot.conversation_log import conversation_writer
+from bot.streaming import StreamingReply, may_be_sentinel
+from bot.answer_cache import answer_cache
+from bot.chat_order import ChatOrderedUpdateProcessor
+from bot.budget import EXPECTED_OUTPUT_TOKENS, context_budget, daily_budget
+from bot.pricing import cached_prompt_tokens, calculate_cost
+from bot.faq import faq_index
+from bot.intents import detect_alphabet, intent_router
+from rag.embeddings import aget_embedding
+from rag.vectordb import aget_context, aget_index_version, query_executor, retrieval_cache, warm_up
+from rag.lexical import is_identifier_query
+from rag.tokens import count_message_tokens, load_encoding
+from rag.translit import normalize_query
+
+
+# OpenAI client (asinxron - event loop ni bloklamaydi)
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+# Bir vaqtda tayyorlanadigan javoblar sonini cheklash
+answer_semaphore = asyncio.Semaphore(settings.ANSWER_CONCURRENCY)
+
+# System prompt - o'zgarmas qism. Kontekst alohida xabarda undan keyin keladi,
+# shuning uchun so'rovlar bir xil uzun prefiksga ega bo'ladi (provider prompt caching)
 SYSTEM_PROMPT_LATIN = """Sen Ekologik ekspertiza markazi haqida ma'lumot beruvchi rasmiy yordamchi botsan.
 
 SENING VAZIFANG:
@@ -45,9 +64,6 @@ MUHIM:
 - Hech qachon o'ylab topib javob BERMANG
 - Kontekstdan tashqariga CHIQMANG
 - Shunchaki kontekstdagi ma'lumotni ANIQ va TO'LIQ yetkazing
-
-KONTEKST (Rasmiy hujjatlardan):
-{context}
 """
 
 SYSTEM_PROMPT_CYRILLIC = """Сен Экологик экспертиза маркази ҳақида маълумот берувчи расмий ёрдамчи ботсан.
@@ -70,9 +86,6 @@ SYSTEM_PROMPT_CYRILLIC = """Сен Экологик экспертиза мар
 - Ҳеч қачон ўйлаб топиб жавоб БЕРМАНГ
 - Контекстдан ташқарига ЧИҚМАНГ
 - Шунчаки контекстдаги маълумотни АНИҚ ва ТЎЛИҚ етказинг
-
-КОНТЕКСТ (Расмий ҳужжатлардан):
-{context}
 """
 
 SYSTEM_PROMPT_RUSSIAN = """Ты официальный бот-помощник Центра государственной экологической экспертизы, предоставляющий информацию.
@@ -95,34 +108,50 @@ SYSTEM_PROMPT_RUSSIAN = """Ты официальный бот-помощник 
 - Никогда НЕ ВЫДУМЫВАЙТЕ ответы
 - НЕ ВЫХОДИТЕ за рамки контекста
 - Просто ТОЧНО и ПОЛНО передайте информацию из контекста
-
-КОНТЕКСТ (Из официальных документов):
-{context}
 """
 
+SYSTEM_PROMPTS = {
+    'latin': SYSTEM_PROMPT_LATIN,
+    'cyrillic': SYSTEM_PROMPT_CYRILLIC,
+    'russian': SYSTEM_PROMPT_RUSSIAN,
+}
+
+# Kontekst xabari: sarlavha va kontekst topilmaganda yoziladigan matn
+CONTEXT_MESSAGES = {
+    'latin': ("KONTEKST (Rasmiy hujjatlardan):", "Ma'lumot topilmadi"),
+    'cyrillic': ("КОНТЕКСТ (Расмий ҳужжатлардан):", "Маълумот топилмади"),
+    'russian': ("КОНТЕКСТ (Из официальных документов):", "Информация не найдена"),
+}
 
-def detect_alphabet(text: str) -> str:
-    """Matnning alifbosini aniqlash: 'latin', 'cyrillic' (o'zbek), 'russian'"""
-    cyrillic_count = 0
-    latin_count = 0
-    uzbek_specific = 0
 
-    # O'zbek kirilliga xos harflar
-    uzbek_chars = set('ўқғҳЎҚҒҲ')
+def build_messages(alphabet: str, rag_context: str, user_message: str) -> list:
+    """
+    GPT xabarlari: o'zgarmas system prompt -> kontekst -> savol
 
-    for char in text:
-        if char in uzbek_chars:
-            uzbek_specific += 1
-            cyrillic_count += 1
-        elif '\u0400' <= char <= '\u04FF':  # Cyrillic range
-            cyrillic_count += 1
-        elif 'a' <= char.lower() <= 'z':  # Latin range
-            latin_count += 1
+    Boshidagi qism so'rovdan so'rovga o'zgarmaydi, kontekst esa hujjat
+    tartibida yig'iladi - bir xil chunklar topilganda prefiks ham bir xil.
+    """
+    header, not_found = CONTEXT_MESSAGES[alphabet]
+    return [
+        {"role": "system", "content": SYSTEM_PROMPTS[alphabet]},
+        {"role": "system", "content": f"{header}\n{rag_context or not_found}"},
+        {"role": "user", "content": user_message},
+    ]
 
-    if cyrillic_count > latin_count:
-        # O'zbek kirilimi yoki rusmi?
-        return 'cyrillic' if uzbek_specific > 0 else 'russian'
-    return 'latin'
+
+# Model router: savolni arzon model bilan saralash (javob faqat bitta so'z)
+ROUTER_PROMPT = """Sen Davlat ekologik ekspertizasi markazi botiga kelgan savollarni saralaysan.
+Savol va rasmiy hujjatdan (Vazirlar Mahkamasining 541-son qarori) topilgan kontekst berilgan.
+
+Faqat bitta so'z bilan javob ber:
+OFF_TOPIC - savol ekologik ekspertiza va 541-son qaror mavzusiga umuman aloqador emas
+NOT_FOUND - mavzuga oid, lekin kontekstda javob yo'q
+SIMPLE - javob kontekstda bir joyda aniq yozilgan (muddat, summa, ta'rif, ro'yxat)
+COMPLEX - bir nechta bandni solishtirish, hisob-kitob yoki mulohaza kerak
+
+Ishonching komil bo'lmasa - COMPLEX."""
+
+ROUTES = {'OFF_TOPIC': 'off_topic', 'NOT_FOUND': 'not_found', 'SIMPLE': 'simple', 'COMPLEX': 'complex'}
 
 OFF_TOPIC_MESSAGE_LATIN = """Kechirasiz, men faqat O'zbekiston Respublikasi Vazirlar Mahkamasining 2020 yil 7 sentabrdagi 541-son qarori doirasida ma'lumot bera olaman.
 
@@ -148,6 +177,30 @@ bevosita murojaat qilishingiz mumkin:
 
 Mutaxassislar sizga to'liq ma'lumot va tushuntirish beradilar."""
 
+LIMIT_MESSAGE_LATIN = """Kechirasiz, bugun savollar juda ko'p bo'ldi va javob berish vaqtincha to'xtatildi.
+Iltimos, ertaga qayta urinib ko'ring yoki mutaxassislarga murojaat qiling:
+
+📞 Qisqa raqam: 1392
+☎️ Telefon: 71 203 03 04"""
+
+LIMIT_MESSAGE_CYRILLIC = """Кечирасиз, бугун саволлар жуда кўп бўлди ва жавоб бериш вақтинча тўхтатилди.
+Илтимос, эртага қайта уриниб кўринг ёки мутахассисларга мурожаат қилинг:
+
+📞 Қисқа рақам: 1392
+☎️ Телефон: 71 203 03 04"""
+
+LIMIT_MESSAGE_RUSSIAN = """Извините, сегодня поступило слишком много вопросов, и ответы временно приостановлены.
+Пожалуйста, попробуйте завтра или обратитесь к специалистам:
+
+📞 Короткий номер: 1392
+☎️ Телефон: 71 203 03 04"""
+
+LIMIT_MESSAGES = {
+    'latin': LIMIT_MESSAGE_LATIN,
+    'cyrillic': LIMIT_MESSAGE_CYRILLIC,
+    'russian': LIMIT_MESSAGE_RUSSIAN,
+}
+
 NOT_FOUND_MESSAGE_CYRILLIC = """Кечирасиз, ушбу савол Вазирлар Маҳкамасининг
 2020 йил 7 сентябрдаги 541-сон қарори доирасига кирмайди.
 
@@ -173,25 +226,11 @@ NOT_FOUND_MESSAGE_RUSSIAN = """Извините, данный вопрос не
 Специалисты предоставят вам полную информацию и разъяснения."""
 
 
-@sync_to_async
-def get_or_create_user(telegram_user) -> TelegramUser:
-    """Telegram user ni olish yoki yaratish"""
-    user, created = TelegramUser.objects.get_or_create(
-        telegram_id=telegram_user.id,
-        defaults={
-            'username': telegram_user.username,
-            'first_name': telegram_user.first_name,
-            'last_name': telegram_user.last_name
-        }
-    )
-    return user
-
-
-@sync_to_async
-def save_conversation(user, question, answer, input_tokens, output_tokens, total_tokens, cost, status, source_chunks):
-    """Conversation ni saqlash"""
-    return Conversation.objects.create(
-        user=user,
+async def save_conversation(user_id, question, answer, input_tokens, output_tokens, total_tokens, cost, status, source_chunks,
+                            route='', model='', latency_ms=None, cached_tokens=0):
+    """Conversation ni saqlash (fondagi navbat orqali, bulk_create bilan)"""
+    await conversation_writer.put(Conversation(
+        user_id=user_id,
         question=question,
         answer=answer,
         input_tokens=input_tokens,
@@ -199,17 +238,21 @@ def save_conversation(user, question, answer, input_tokens, output_tokens, total
         total_tokens=total_tokens,
         cost=cost,
         status=status,
-        source_chunks=source_chunks
-    )
+        source_chunks=source_chunks,
+        route=route,
+        model=model,
+        latency_ms=latency_ms,
+        cached_tokens=cached_tokens
+    ))
 
 
-@sync_to_async
+@db_sync_to_async
 def check_is_admin(telegram_id: int) -> bool:
     """Admin ekanligini tekshirish"""
     return BotAdmin.objects.filter(telegram_id=telegram_id, is_active=True).exists()
 
 
-@sync_to_async
+@db_sync_to_async
 def get_total_stats():
     """Umumiy statistika olish"""
     total_users = TelegramUser.objects.count()
@@ -223,7 +266,7 @@ def get_total_stats():
     return total_users, total_conversations, answered, not_found, stats_data
 
 
-@sync_to_async
+@db_sync_to_async
 def get_today_stats():
     """Bugungi statistika olish"""
     today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -238,13 +281,13 @@ def get_today_stats():
     return total, answered, not_found, stats_data
 
 
-@sync_to_async
+@db_sync_to_async
 def get_unanswered_convs():
     """Javob berilmagan savollar"""
     return list(Conversation.objects.filter(status='not_found').order_by('-created_at')[:10].select_related('user'))
 
 
-@sync_to_async
+@db_sync_to_async
 def get_costs_stats():
     """Xarajatlar statistikasi"""
     today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -261,10 +304,240 @@ def get_costs_stats():
     return today_cost, week_cost, month_cost, total_cost
 
 
+async def _stream_completion(request: dict, on_delta) -> tuple:
+    """GPT javobini stream qilib o'qish; har bir yangi bo'lakda on_delta(matn) chaqiriladi"""
+    stream = await client.chat.completions.create(
+        **request,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    answer = ""
+    usage = None
+    async for chunk in stream:
+        if chunk.usage:
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            answer += chunk.choices[0].delta.content
+            await on_delta(answer)
+    return answer, usage
+
+
+async def classify_question(user_message: str, rag_context: str) -> tuple:
+    """
+    Savolni arzon model bilan saralash
+
+    Returns:
+        (route, usage) - route: off_topic / not_found / simple / complex;
+        xatolik yoki tushunarsiz javobda - complex (katta model javob beradi)
+    """
+    try:
+        response = await client.chat.completions.create(
+            model=settings.ROUTER_MODEL,
+            messages=[
+                {"role": "system", "content": ROUTER_PROMPT},
+                {"role": "system", "content": f"KONTEKST:\n{rag_context or '-'}"},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=0,
+            max_tokens=5,
+            prompt_cache_key="router"
+        )
+    except Exception as e:
+        print(f"Router xatoligi: {e}")
+        return 'complex', None
+
+    words = (response.choices[0].message.content or "").strip().upper().split()
+    label = words[0].strip(".,:;!\"'") if words else ""
+    return ROUTES.get(label, 'complex'), response.usage
+
+
+async def generate_answer(user_message: str, alphabet: str, on_delta=None) -> dict:
+    """
+    RAG + GPT orqali javob tayyorlash
+
+    Bir vaqtda ishlaydigan javoblar soni ANSWER_CONCURRENCY bilan cheklanadi.
+    on_delta berilsa, GPT javobi stream qilinadi va har bir yangi bo'lakda
+    on_delta(shu paytgacha kelgan matn) chaqiriladi.
+
+    MODEL_ROUTING yoqilgan bo'lsa, savol avval ROUTER_MODEL bilan saralanadi:
+    mavzudan tashqari / javobsiz savollar katta modelsiz rad etiladi, oddiy
+    savollarga SIMPLE_MODEL, murakkablariga ANSWER_MODEL javob beradi.
+
+    Prompt tokenlari yuborishdan oldin sanaladi (bot/budget.py): kontekst
+    REQUEST_MAX_PROMPT_TOKENS ga sig'diriladi, kunlik limitga yaqinlashganda
+    SIMPLE_MODEL ishlatiladi, limit tugaganda GPT chaqirilmaydi.
+
+    Returns:
+        {answer, status, input_tokens, output_tokens, total_tokens, cached_tokens, cost, source_chunks, route, model}
+    """
+    # RAG tili (alifboga qarab)
+    rag_lang = "ru" if alphabet == "russian" else "uz"
+
+    # Semantik kesh: yaqin savolga avval javob berilgan bo'lsa, GPT chaqirilmaydi.
+    # Raqamli savollar ("12-band", "541-son") embeddingda deyarli bir xil - ular keshlanmaydi
+    # va qidiruv BM25 orqali embedding so'ramasdan bajariladi.
+    index_version = await aget_index_version(rag_lang)
+    question_embedding = None
+    cached_answer = None
+    if not is_identifier_query(user_message):
+        # Kirill va lotindagi bir xil savol bitta embedding (va kesh yozuvi) ga tushadi
+        embedding_text = user_message if rag_lang == "ru" else normalize_query(user_message)
+        question_embedding = await aget_embedding(embedding_text)
+
+        # Admin tasdiqlagan FAQ javobi - retrieval va GPT siz
+        await faq_index.refresh()
+        faq = faq_index.lookup(alphabet, question_embedding)
+        if faq is not None:
+            return {
+                'answer': faq['answer'],
+                'status': 'answered',
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'total_tokens': 0,
+                'cached_tokens': 0,
+                'cost': Decimal('0'),
+                'source_chunks': f"FAQ #{faq['id']}: {faq['question']}",
+                'route': 'faq',
+                'model': '',
+            }
+
+        cached_answer = answer_cache.lookup(alphabet, index_version, question_embedding)
+    if cached_answer is not None:
+        return {
+            **cached_answer,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'total_tokens': 0,
+            'cached_tokens': 0,
+            'cost': Decimal('0'),
+            'source_chunks': "Javob keshdan olindi",
+            'route': 'cache',
+            'model': '',
+        }
+
+    # Kunlik limit tugagan bo'lsa pullik so'rov yuborilmaydi
+    await daily_budget.refresh()
+    budget_mode = daily_budget.mode()
+    if budget_mode == 'refuse':
+        daily_budget.refused += 1
+        return {
+            'answer': LIMIT_MESSAGES[alphabet],
+            'status': 'not_found',
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'total_tokens': 0,
+            'cached_tokens': 0,
+            'cost': Decimal('0'),
+            'source_chunks': f"Kunlik limit tugagan (${daily_budget.spent:.4f} / ${daily_budget.limit})",
+            'route': 'budget',
+            'model': '',
+        }
+
+    async with answer_semaphore:
+        # RAG dan kontekst olish: system prompt va savoldan qolgan token byudjeti doirasida
+        fixed_tokens = count_message_tokens(build_messages(alphabet, "", user_message))
+        rag_context = await aget_context(
+            user_message, n_results=settings.RAG_N_RESULTS, lang=rag_lang,
+            max_tokens=context_budget(fixed_tokens, downgraded=budget_mode == 'downgrade')
+        )
+        source_chunks = rag_context if rag_context else "Kontekst topilmadi"
+
+        route, route_usage = 'complex', None
+        if settings.MODEL_ROUTING:
+            route, route_usage = await classify_question(user_message, rag_context)
+
+        if route in ('off_topic', 'not_found'):
+            # Rad etish uchun katta model chaqirilmaydi - sentinel quyida tayyor xabarga aylanadi
+            model = settings.ROUTER_MODEL
+            answer = "MAVZU_TASHQARI" if route == 'off_topic' else "JAVOB_TOPILMADI"
+            usage = None
+        else:
+            model = settings.SIMPLE_MODEL if route == 'simple' else settings.ANSWER_MODEL
+            messages = build_messages(alphabet, rag_context, user_message)
+            if model != settings.SIMPLE_MODEL:
+                # Taxminiy narx kunlik qoldiqqa sig'masa - arzon model
+                estimated = calculate_cost(model, count_message_tokens(messages), EXPECTED_OUTPUT_TOKENS)
+                if daily_budget.mode(estimated) != 'ok':
+                    daily_budget.downgraded += 1
+                    model = settings.SIMPLE_MODEL
+            request = dict(
+                model=model,
+                messages=messages,
+                # Bir alifbodagi so'rovlar provider tomonida bitta kesh ga yo'naltiriladi
+                prompt_cache_key=f"answer:{alphabet}",
+                temperature=0.1,     # Minimal randomness - maksimal aniqlik
+                max_tokens=4000,     # Ko'proq joy javob uchun
+                top_p=0.95,          # Eng yuqori ehtimollik
+                frequency_penalty=0.2,  # Takrorlanishni kamaytirish
+                presence_penalty=0.0    # Faqat kontekstga asoslangan javob
+            )
+
+            if on_delta is None:
+                response = await client.chat.completions.create(**request)
+                answer = response.choices[0].message.content
+                usage = response.usage
+            else:
+                answer, usage = await _stream_completion(request, on_delta)
+
+    # Token va narx hisoblash (router + javob modeli)
+    input_tokens = 0
+    cached_tokens = 0
+    output_tokens = 0
+    cost = Decimal('0')
+    for used_model, used in ((settings.ROUTER_MODEL, route_usage), (model, usage)):
+        if used is not None:
+            cached_prompt = cached_prompt_tokens(used)
+            input_tokens += used.prompt_tokens
+            cached_tokens += cached_prompt
+            output_tokens += used.completion_tokens
+            cost += calculate_cost(used_model, used.prompt_tokens, used.completion_tokens, cached_prompt)
+    total_tokens = input_tokens + output_tokens
+    daily_budget.add(cost)
+
+    # Status aniqlash
+    off_topic_messages = {
+        'russian': OFF_TOPIC_MESSAGE_RUSSIAN,
+        'cyrillic': OFF_TOPIC_MESSAGE_CYRILLIC,
+        'latin': OFF_TOPIC_MESSAGE_LATIN,
+    }
+    not_found_messages = {
+        'russian': NOT_FOUND_MESSAGE_RUSSIAN,
+        'cyrillic': NOT_FOUND_MESSAGE_CYRILLIC,
+        'latin': NOT_FOUND_MESSAGE_LATIN,
+    }
+
+    if "MAVZU_TASHQARI" in answer or "МАВЗУ_ТАШҚАРИ" in answer:
+        status = 'not_found'
+        answer = off_topic_messages[alphabet]
+    elif "JAVOB_TOPILMADI" in answer or "ЖАВОБ_ТОПИЛМАДИ" in answer:
+        status = 'not_found'
+        answer = not_found_messages[alphabet]
+    else:
+        status = 'answered'
+
+    result = {
+        'answer': answer,
+        'status': status,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'total_tokens': total_tokens,
+        'cached_tokens': cached_tokens,
+        'cost': cost,
+        'source_chunks': source_chunks,
+        'route': route,
+        'model': model,
+    }
+    # Faqat ANSWER_MODEL javobi keshlanadi - arzon model (router yoki byudjet tufayli) javobi
+    # keyingi o'xshash savollarga katta model o'rniga berilmasligi kerak
+    if question_embedding is not None and route == 'complex' and model == settings.ANSWER_MODEL:
+        answer_cache.store(alphabet, index_version, question_embedding, result)
+    return result
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start buyrug'i"""
     # User ni saqlash
-    await get_or_create_user(update.effective_user)
+    await get_user_id(update.effective_user)
 
     await update.message.reply_text(
         "Ассалому алайкум! \n\n"
@@ -283,11 +556,32 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def answer_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Foydalanuvchi savoliga javob berish"""
     user_message = update.message.text
-    user = await get_or_create_user(update.effective_user)
+    user_id = await get_user_id(update.effective_user)
 
     # Alifboni aniqlash
     alphabet = detect_alphabet(user_message)
 
+    # Salomlashuv, bot haqida savol, rahmat, aloqa - GPT siz, kutish xabarisiz javob
+    routed = intent_router.answer(user_message, alphabet)
+    if routed is not None:
+        bot_answer, intents = routed
+        await update.message.reply_text(bot_answer)
+
+        # DB ga saqlash
+        await save_conversation(
+            user_id=user_id,
+            question=user_message,
+            answer=bot_answer,
+            input_tokens=0,
+            output_tokens=0,
+            total_tokens=0,
+            cost=Decimal('0'),
+            status='answered',
+            source_chunks=f"Intent ({', '.join(intents)}) - to'g'ridan-to'g'ri javob",
+            route='intent'
+        )
+        return
+
     # Kutish xabarini tilga qarab yuborish
     waiting_messages = {
         'latin': "⏳ Iltimos kuting, javob tayyorlanmoqda...",
@@ -297,143 +591,40 @@ async def answer_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     waiting_message = await update.message.reply_text(waiting_messages[alphabet])
 
     try:
+        started = time.perf_counter()
+        if settings.STREAM_ANSWERS:
+            streamer = StreamingReply(waiting_message, update.message, settings.STREAM_EDIT_INTERVAL)
 
-        # Salomlashuvlarni aniqlash
-        greetings_latin = ["salom", "assalom", "hayrli kun", "xayrli kun", "hello"]
-        greetings_cyrillic = ["салом", "ассалом", "хайрли кун"]
-        greetings_russian = ["привет", "здравствуйте", "добрый день", "доброе утро", "добрый вечер", "здравствуй"]
-
-        user_lower = user_message.lower().strip()
-        is_greeting = any(q in user_lower for q in (greetings_cyrillic + greetings_latin + greetings_russian))
-
-        # Bot haqida savollarni to'g'ridan-to'g'ri qayta ishlash
-        bot_questions_cyrillic = ["сен кимсан", "бот ҳақида", "нимага ёрдам", "нима қила оласан", "сиз кимсиз", "нима билесиз"]
-        bot_questions_latin = ["sen kimsan", "bot haqida", "nimaga yordam", "nima qila olasan", "siz kimsiz", "nima bilasiz"]
-        bot_questions_russian = ["кто ты", "что ты умеешь", "что ты можешь", "чем помочь", "о боте", "что за бот"]
-
-        is_bot_question = any(q in user_lower for q in (bot_questions_cyrillic + bot_questions_latin + bot_questions_russian))
-
-        if is_greeting or is_bot_question:
-            # Salomlashuvga javob + bot taqdimoti
-            if alphabet == 'russian':
-                greeting_text = "Здравствуйте! 😊\n\n" if is_greeting else ""
-                bot_answer = f"""{greeting_text}Я официальный бот Центра государственной экологической экспертизы.
-
-Я могу предоставить вам информацию по следующим темам:
-✅ Полномочия и задачи Центра
-✅ Содержание и требования Постановления №541
-✅ Процесс экологической экспертизы
-✅ Перечень необходимых документов
-✅ Сроки и оплата
-✅ Контактная информация
-
-Задавайте ваш вопрос! 😊"""
-            elif alphabet == 'cyrillic':
-                greeting_text = "Ваалайкум ассалом! 😊\n\n" if is_greeting else ""
-                bot_answer = f"""{greeting_text}Мен Давлат экологик экспертизаси марказининг расмий ботиман.
-
-Мен сизга қуйидаги мавзулар бўйича маълумот бера оламан:
-✅ Марказнинг ваколатлари ва вазифалари
-✅ 541-сон қарор мазмуни ва талаблари
-✅ Экологик экспертиза жараёни
-✅ Керакли ҳужжатлар рўйхати
-✅ Муддатлар ва тўловлар
-✅ Алоқа маълумотлари
-
-Саволингизни беринг! 😊"""
-            else:
-                greeting_text = "Vaalaykum assalom! 😊\n\n" if is_greeting else ""
-                bot_answer = f"""{greeting_text}Men Davlat ekologik ekspertizasi markazining rasmiy botiman.
-
-Men sizga quyidagi mavzular bo'yicha ma'lumot bera olaman:
-✅ Markazning vakolatlari va vazifalari
-✅ 541-son qaror mazmuni va talablari
-✅ Ekologik ekspertiza jarayoni
-✅ Kerakli hujjatlar ro'yxati
-✅ Muddatlar va to'lovlar
-✅ Aloqa ma'lumotlari
-
-Savolingizni bering! 😊"""
+            async def on_delta(text):
+                # MAVZU_TASHQARI / JAVOB_TOPILMADI bo'lishi mumkin bo'lgan boshlanish ko'rsatilmaydi
+                if not may_be_sentinel(text):
+                    await streamer.update(text)
 
+            result = await generate_answer(user_message, alphabet, on_delta=on_delta)
+        else:
+            result = await generate_answer(user_message, alphabet)
+        latency_ms = int((time.perf_counter() - started) * 1000)
+
+        answer = result['answer']
+        status = result['status']
+        input_tokens = result['input_tokens']
+        output_tokens = result['output_tokens']
+        total_tokens = result['total_tokens']
+        cost = result['cost']
+        source_chunks = result['source_chunks']
+
+        if settings.STREAM_ANSWERS:
+            # Kutish xabari yakuniy javobga aylanadi (sentinel bo'lsa - tayyor xabarga)
+            await streamer.finish(answer)
+        else:
             # Kutish xabarini o'chirish
             await waiting_message.delete()
-            await update.message.reply_text(bot_answer)
-
-            # DB ga saqlash
-            await save_conversation(
-                user=user,
-                question=user_message,
-                answer=bot_answer,
-                input_tokens=0,
-                output_tokens=0,
-                total_tokens=0,
-                cost=Decimal('0'),
-                status='answered',
-                source_chunks="Salomlashuv yoki bot haqida savol - to'g'ridan-to'g'ri javob"
-            )
-            return
 
-        # RAG dan kontekst olish (alifboga qarab tilni tanlash)
-        rag_lang = "ru" if alphabet == "russian" else "uz"
-        rag_context = get_context(user_message, n_results=10, lang=rag_lang)
-        source_chunks = rag_context if rag_context else "Kontekst topilmadi"
-
-        # System prompt tayyorlash (alifboga qarab)
-        if alphabet == 'russian':
-            system_prompt = SYSTEM_PROMPT_RUSSIAN.format(context=rag_context if rag_context else "Информация не найдена")
-        elif alphabet == 'cyrillic':
-            system_prompt = SYSTEM_PROMPT_CYRILLIC.format(context=rag_context if rag_context else "Маълумот топилмади")
-        else:
-            system_prompt = SYSTEM_PROMPT_LATIN.format(context=rag_context if rag_context else "Ma'lumot topilmadi")
-
-        # GPT ga yuborish (yaxshilangan model va parametrlar)
-        response = client.chat.completions.create(
-            model="gpt-4o",      # Eng aniq model
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.1,     # Minimal randomness - maksimal aniqlik
-            max_tokens=4000,     # Ko'proq joy javob uchun
-            top_p=0.95,          # Eng yuqori ehtimollik
-            frequency_penalty=0.2,  # Takrorlanishni kamaytirish
-            presence_penalty=0.0    # Faqat kontekstga asoslangan javob
-        )
-
-        answer = response.choices[0].message.content
-
-        # Token va narx hisoblash (GPT-4o narxlari)
-        usage = response.usage
-        input_tokens = usage.prompt_tokens
-        output_tokens = usage.completion_tokens
-        total_tokens = usage.total_tokens
-        # GPT-4o: $2.50 per 1M input tokens, $10.00 per 1M output tokens
-        cost = Decimal(str((input_tokens * 2.50 / 1_000_000) + (output_tokens * 10.00 / 1_000_000)))
-
-        # Status aniqlash
-        off_topic_messages = {
-            'russian': OFF_TOPIC_MESSAGE_RUSSIAN,
-            'cyrillic': OFF_TOPIC_MESSAGE_CYRILLIC,
-            'latin': OFF_TOPIC_MESSAGE_LATIN,
-        }
-        not_found_messages = {
-            'russian': NOT_FOUND_MESSAGE_RUSSIAN,
-            'cyrillic': NOT_FOUND_MESSAGE_CYRILLIC,
-            'latin': NOT_FOUND_MESSAGE_LATIN,
-        }
-
-        if "MAVZU_TASHQARI" in answer or "МАВЗУ_ТАШҚАРИ" in answer:
-            status = 'not_found'
-            answer = off_topic_messages[alphabet]
-        elif "JAVOB_TOPILMADI" in answer or "ЖАВОБ_ТОПИЛМАДИ" in answer:
-            status = 'not_found'
-            answer = not_found_messages[alphabet]
-        else:
-            status = 'answered'
+            await update.message.reply_text(answer)
 
-        # DB ga saqlash
+        # DB ga saqlash (javob yuborilgandan keyin)
         await save_conversation(
-            user=user,
+            user_id=user_id,
             question=user_message,
             answer=answer,
             input_tokens=input_tokens,
@@ -441,15 +632,15 @@ Savolingizni bering! 😊"""
             total_tokens=total_tokens,
             cost=cost,
             status=status,
-            source_chunks=source_chunks[:1000]
+            source_chunks=source_chunks[:1000],
+            route=result['route'],
+            model=result['model'],
+            latency_ms=latency_ms,
+            cached_tokens=result['cached_tokens']
         )
 
-        print(f"User: {user.telegram_id}, Tokens: {total_tokens}, Cost: ${cost:.6f}, Status: {status}")
-
-        # Kutish xabarini o'chirish
-        await waiting_message.delete()
-
-        await update.message.reply_text(answer)
+        print(f"User: {update.effective_user.id}, Route: {result['route']}, Tokens: {total_tokens}, "
+              f"Cost: ${cost:.6f}, Status: {status}, {latency_ms} ms")
 
     except Exception as e:
         print(f"Xatolik: {e}")
@@ -460,9 +651,14 @@ Savolingizni bering! 😊"""
         except:
             pass
 
+        await update.message.reply_text(
+            "Kechirasiz, texnik xatolik yuz berdi. Iltimos, keyinroq urinib ko'ring yoki mutaxassis bilan bog'laning:\n"
+            "+998999999999"
+        )
+
         # Xatolikni ham saqlash
         await save_conversation(
-            user=user,
+            user_id=user_id,
             question=user_message,
             answer=f"Xatolik: {str(e)}",
             input_tokens=0,
@@ -473,11 +669,6 @@ Savolingizni bering! 😊"""
             source_chunks=""
         )
 
-        await update.message.reply_text(
-            "Kechirasiz, texnik xatolik yuz berdi. Iltimos, keyinroq urinib ko'ring yoki mutaxassis bilan bog'laning:\n"
-            "+998999999999"
-        )
-
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Umumiy statistika"""
@@ -486,6 +677,7 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     total_users, total_conversations, answered, not_found, stats_data = await get_total_stats()
+    faq_stats = faq_index.stats()
 
     message = f"""📊 Umumiy statistika:
 
@@ -495,7 +687,10 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 ❌ Javob topilmagan: {not_found}
 
 🔢 Jami tokenlar: {stats_data['total_tokens'] or 0}
-💰 Jami xarajat: ${stats_data['total_cost'] or 0:.4f}"""
+💰 Jami xarajat: ${stats_data['total_cost'] or 0:.4f}
+
+📚 FAQ (bot ishga tushgandan beri, {faq_stats['entries']} ta tasdiqlangan):
+🎯 Topildi: {faq_stats['hits']} / {faq_stats['hits'] + faq_stats['misses']} ({faq_stats['hit_rate']:.1%})"""
 
     await update.message.reply_text(message)
 
@@ -549,19 +744,78 @@ async def costs(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     today_cost, week_cost, month_cost, total_cost = await get_costs_stats()
 
+    cache_stats = answer_cache.stats()
+    budget_stats = daily_budget.stats()
+    if daily_budget.enabled:
+        budget_line = (f"🧮 Kunlik limit: ${budget_stats['spent']:.4f} / ${budget_stats['limit']} ({budget_stats['mode']}), "
+                       f"arzon modelga: {budget_stats['downgraded']}, rad etildi: {budget_stats['refused']}")
+    else:
+        budget_line = "🧮 Kunlik limit: o'rnatilmagan"
+
     message = f"""💰 Xarajatlar hisoboti:
 
 📅 Bugun: ${today_cost:.4f}
 📅 Bu hafta: ${week_cost:.4f}
 📅 Bu oy: ${month_cost:.4f}
-📅 Jami: ${total_cost:.4f}"""
+📅 Jami: ${total_cost:.4f}
+{budget_line}
+
+⚡ Javob keshi (bot ishga tushgandan beri):
+🎯 Topildi: {cache_stats['hits']} / {cache_stats['hits'] + cache_stats['misses']} ({cache_stats['hit_rate']:.1%})
+🔢 Tejalgan tokenlar: {cache_stats['saved_tokens']}
+💵 Tejalgan xarajat: ${cache_stats['saved_cost']:.4f}"""
 
     await update.message.reply_text(message)
 
 
-def main():
-    """Bot ishga tushirish"""
-    app = Application.builder().token(settings.BOT_TOKEN).build()
+async def dbstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """DB pool metrikalari (navbatda kutish vaqti)"""
+    if not await check_is_admin(update.effective_user.id):
+        await update.message.reply_text("Bu buyruq faqat adminlar uchun!")
+        return
+
+    await update.message.reply_text(format_db_metrics())
+
+
+async def on_startup(app: Application):
+    """Bot event loop ichida fondagi xizmatlarni ishga tushirish"""
+    conversation_writer.start()
+    loop = asyncio.get_running_loop()
+    # tiktoken lug'ati birinchi marta tarmoqdan yuklanishi mumkin - event loop da emas
+    await loop.run_in_executor(query_executor, load_encoding)
+    await loop.run_in_executor(query_executor, warm_up)
+
+
+async def on_shutdown(app: Application):
+    """To'xtashdan oldin navbatdagi Conversation larni saqlash"""
+    await conversation_writer.close()
+    retrieval_cache.flush()
+    print(f"Conversation lar saqlandi: {conversation_writer.written}, tashlandi: {conversation_writer.dropped}")
+
+
+def build_application(polling: bool = True) -> Application:
+    """
+    Handlerlar ulangan PTB Application yaratish
+
+    polling=False bo'lsa Updater yaratilmaydi - update lar webhook orqali
+    (bot/webhook.py) update_queue ga qo'yiladi.
+    """
+    # Turli chatlarning update lari parallel (bitta chatniki - tartib bilan),
+    # GPT chaqiruvlari esa answer_semaphore bilan cheklanadi.
+    # 256 - PTB ning concurrent_updates(True) dagi standart qiymati
+    builder = (
+        Application.builder()
+        .token(settings.BOT_TOKEN)
+        .concurrent_updates(ChatOrderedUpdateProcessor(256))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if settings.TELEGRAM_API_BASE_URL:
+        # Masalan, mahalliy soxta Telegram (manage.py fake_telegram)
+        builder = builder.base_url(settings.TELEGRAM_API_BASE_URL)
+    if not polling:
+        builder = builder.updater(None)
+    app = builder.build()
 
     # User handlerlar
     app.add_handler(CommandHandler("start", start))
@@ -572,6 +826,14 @@ def main():
     app.add_handler(CommandHandler("today", today))
     app.add_handler(CommandHandler("unanswered", unanswered))
     app.add_handler(CommandHandler("costs", costs))
+    app.add_handler(CommandHandler("dbstats", dbstats))
+
+    return app
+
+
+def main():
+    """Bot ishga tushirish (long polling)"""
+    app = build_application()
 
     print("Bot ishlamoqda...")
     app.run_polling()
@@ -0,0 +1,139 @@
+"""
+Intent router: LLM siz javob beriladigan xabarlar (salomlashuv, bot haqida,
+rahmat, aloqa ma'lumotlari) va alifboni aniqlash
+
+Kalit so'zlar va javoblar INTENTS_PATH (bot/intents.json) faylidan bir
+marta o'qiladi va bitta regex (prefiks daraxti) ga kompilyatsiya qilinadi -
+xabar bir marta ko'rib chiqiladi. Alifbo str.translate bilan belgilarni
+sinflarga ajratib, ularni sanash orqali aniqlanadi. Yangi intent qo'shish
+uchun faylga yozuv qo'shish kifoya.
+
+Fayl formati:
+    {"intents": [{"name": ..., "keywords": [...], "answers": {"latin": ..., "cyrillic": ..., "russian": ...},
+                  "max_words": 4, "max_extra_words": 2, "follow_up": "about_bot"}, ...]}
+
+max_words - xabar shundan uzun bo'lsa intent hisoblanmaydi (savol ichidagi
+"rahmat" uni yutib yubormasligi uchun); max_extra_words - xabarda kalit
+so'zdan tashqari shundan ko'p so'z bo'lsa intent hisoblanmaydi (xabar asosan
+kalit so'zning o'zi bo'lishi kerak: "telefon raqamingiz?" - ha, "ariza uchun
+telefon raqam kerakmi?" - yo'q); follow_up - javobdan keyin qo'shiladigan
+boshqa intent javobi.
+"""
+import json
+import re
+
+from django.conf import settings
+
+from rag.lexical import APOSTROPHES
+
+
+# O'zbek kirilliga xos harflar -> \x01, boshqa kirill -> \x02, lotin -> \x03, qolganlari o'zgarmaydi
+UZBEK_CYRILLIC = 'ўқғҳЎҚҒҲ'
+_SCRIPT_TABLE = {c: None for c in range(1, 4)}
+_SCRIPT_TABLE.update({c: '\x02' for c in range(0x0400, 0x0500)})
+_SCRIPT_TABLE.update({ord(c): '\x01' for c in UZBEK_CYRILLIC})
+_SCRIPT_TABLE.update({ord(c): '\x03' for c in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'})
+SCRIPT_TABLE = str.maketrans(_SCRIPT_TABLE)
+
+
+def detect_alphabet(text: str) -> str:
+    """Matnning alifbosini aniqlash: 'latin', 'cyrillic' (o'zbek), 'russian'"""
+    marks = text.translate(SCRIPT_TABLE)
+    uzbek_specific = marks.count('\x01')
+    cyrillic_count = uzbek_specific + marks.count('\x02')
+    latin_count = marks.count('\x03')
+
+    if cyrillic_count > latin_count:
+        # O'zbek kirilimi yoki rusmi?
+        return 'cyrillic' if uzbek_specific > 0 else 'russian'
+    return 'latin'
+
+
+# Kalit so'zdagi tutuq belgisi xabardagi istalgan yozilishiga mos keladi
+APOSTROPHE_CLASS = "['‘’ʻʼ`´]"
+
+
+def _keyword_regex(keywords) -> str:
+    """
+    Kalit so'zlardan prefiks daraxti (trie) ko'rinishidagi regex:
+    umumiy boshlanishlar bir marta tekshiriladi, uzunroq moslik afzal
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node) -> str:
+        branches = [
+            (APOSTROPHE_CLASS if char == "'" else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class IntentRouter:
+    """Barcha kalit so'zlar uchun bitta regex; xabardagi moslik -> intentlar"""
+
+    def __init__(self, intents: list):
+        self.intents = {intent['name']: intent for intent in intents}
+        self._order = {intent['name']: i for i, intent in enumerate(intents)}
+        # kalit so'z -> intent nomlari
+        self._keywords = {}
+        for intent in intents:
+            for keyword in intent['keywords']:
+                keyword = keyword.lower().translate(APOSTROPHES)
+                self._keywords.setdefault(keyword, []).append(intent['name'])
+        self._pattern = re.compile(_keyword_regex(self._keywords)) if self._keywords else None
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)['intents'])
+
+    def match(self, text: str) -> list:
+        """Xabarga mos intent nomlari (fayldagi tartibda)"""
+        if self._pattern is None:
+            return []
+        text = text.lower()
+        found = set()
+        words = None
+        for keyword in self._pattern.findall(text):
+            for name in self._keywords[keyword.translate(APOSTROPHES)]:
+                intent = self.intents[name]
+                max_words = intent.get('max_words')
+                max_extra_words = intent.get('max_extra_words')
+                if max_words is not None or max_extra_words is not None:
+                    if words is None:
+                        words = len(text.split())
+                    if max_words is not None and words > max_words:
+                        continue
+                    if max_extra_words is not None and words - len(keyword.split()) > max_extra_words:
+                        continue
+                found.add(name)
+        return sorted(found, key=self._order.get)
+
+    def answer(self, text: str, alphabet: str):
+        """(javob matni, intent nomlari) yoki intent topilmasa None"""
+        names = self.match(text)
+        if not names:
+            return None
+
+        parts = []
+        for name in names:
+            intent = self.intents[name]
+            parts.append(intent['answers'][alphabet])
+            follow_up = intent.get('follow_up')
+            if follow_up and follow_up not in names:
+                parts.append(self.intents[follow_up]['answers'][alphabet])
+                names = names + [follow_up]
+        return "\n\n".join(parts), names
+
+
+intent_router = IntentRouter.load(settings.INTENTS_PATH)
@@ -0,0 +1,176 @@
+"""
+Javob pipeline i uchun throughput benchmark
+
+OpenAI va Chroma o'rniga berilgan kechikish bilan ishlaydigan soxta
+obyektlar qo'yiladi, so'ng generate_answer() turli sondagi parallel
+foydalanuvchilar bilan chaqiriladi. --blocking rejimi eski (sinxron)
+pipeline ni taqlid qiladi: kechikish event loop ichida time.sleep bilan.
+
+Misol:
+    python manage.py bench_answers --users 1,4,16,64 --requests 64
+"""
+import asyncio
+import os
+import random
+import string
+import tempfile
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bot import handlers
+from rag import embeddings, vectordb
+from rag.embedding_cache import EmbeddingCache
+from rag.retrieval_cache import RetrievalCache
+
+
+# Odatiy savollar - raqamli (identifikator) savollar embedding va keshlarni chetlab o'tadi
+QUESTIONS = [
+    "Ekspertiza xulosasi necha kunda beriladi?",
+    "Loyiha hujjatlarini ekspertizaga topshirish tartibi qanday?",
+    "Arizaga qaysi hujjatlar ilova qilinadi?",
+    "Ekspertiza xizmati narxi qanday belgilanadi?",
+    "Salbiy xulosa ustidan qayerga shikoyat qilinadi?",
+    "Takroriy ekspertiza qachon o'tkaziladi?",
+]
+
+
+def _tag(number: int) -> str:
+    """Savolni noyob qiladigan harfli belgi (raqamlar savolni identifikatorga aylantirmasligi uchun)"""
+    letters = ""
+    while True:
+        number, rest = divmod(number, len(string.ascii_lowercase))
+        letters += string.ascii_lowercase[rest]
+        if not number:
+            return letters
+
+
+def _fake_usage():
+    return SimpleNamespace(prompt_tokens=3000, completion_tokens=400, total_tokens=3400)
+
+
+class _FakeCompletions:
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def create(self, **kwargs):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content="Javob matni")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=_fake_usage())
+
+
+class _FakeEmbeddings:
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def create(self, model, input):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        # Tasodifiy vektorlar - javob keshi ishlamasligi uchun
+        texts = input if isinstance(input, list) else [input]
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=[random.random() for _ in range(8)])
+            for i in range(len(texts))
+        ])
+
+
+class _FakeCollection:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def query(self, query_embeddings, n_results):
+        time.sleep(self.latency)
+        count = len(query_embeddings)
+        return {
+            'ids': [[f"chunk-{i}" for i in range(n_results)]] * count,
+            'documents': [[f"chunk {i}" for i in range(n_results)]] * count,
+            'distances': [[0.1] * n_results] * count,
+            'metadatas': [[{'chunk_index': i} for i in range(n_results)]] * count,
+        }
+
+
+class Command(BaseCommand):
+    help = "Javob pipeline throughput ini parallel foydalanuvchilar soniga qarab o'lchash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=str, default='1,2,4,8,16,32,64',
+                            help="Parallel foydalanuvchilar soni (vergul bilan)")
+        parser.add_argument('--requests', type=int, default=64,
+                            help="Har bir bosqichdagi so'rovlar soni")
+        parser.add_argument('--llm-latency', type=float, default=0.5,
+                            help="Soxta GPT javobi kechikishi (soniya)")
+        parser.add_argument('--embed-latency', type=float, default=0.05,
+                            help="Soxta embedding kechikishi (soniya)")
+        parser.add_argument('--chroma-latency', type=float, default=0.01,
+                            help="Soxta Chroma so'rovi kechikishi (soniya)")
+        parser.add_argument('--blocking', action='store_true',
+                            help="Eski sinxron pipeline ni taqlid qilish")
+
+    def handle(self, *args, **options):
+        blocking = options['blocking']
+        handlers.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=_FakeCompletions(options['llm_latency'], blocking))
+        )
+        embeddings.async_client = SimpleNamespace(
+            embeddings=_FakeEmbeddings(options['embed_latency'], blocking)
+        )
+        fake_collection = _FakeCollection(options['chroma_latency'])
+        vectordb.get_collection = lambda lang="uz": fake_collection
+        vectordb.get_index_version = lambda lang="uz": "bench"
+
+        # Keshlar vaqtinchalik fayllarda - ishlab turgan bot keshlari bench yozuvlari bilan to'lmaydi
+        tmp = tempfile.TemporaryDirectory()
+        embeddings.embedding_cache = EmbeddingCache(
+            os.path.join(tmp.name, 'embeddings.sqlite3'), settings.EMBEDDING_CACHE_SIZE
+        )
+        vectordb.retrieval_cache = RetrievalCache(
+            os.path.join(tmp.name, 'retrievals.sqlite3'), settings.RETRIEVAL_CACHE_SIZE
+        )
+        self._asked = 0
+
+        mode = "blocking" if blocking else "async"
+        self.stdout.write(f"Rejim: {mode}, so'rovlar: {options['requests']}")
+        self.stdout.write(f"{'users':>6} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+
+        try:
+            for users in [int(u) for u in options['users'].split(',')]:
+                rps, p50, p95 = asyncio.run(self._run(users, options['requests']))
+                self.stdout.write(f"{users:>6} {rps:>10.2f} {p50:>10.1f} {p95:>10.1f}")
+        finally:
+            tmp.cleanup()
+
+    async def _run(self, users: int, total: int):
+        # Har bir event loop uchun semafor qayta yaratiladi
+        handlers.answer_semaphore = asyncio.Semaphore(handlers.settings.ANSWER_CONCURRENCY)
+        queue = asyncio.Queue()
+        for _ in range(total):
+            # Har safar yangi matn - embedding va qidiruv keshlari ishlamasligi uchun
+            question = QUESTIONS[self._asked % len(QUESTIONS)]
+            queue.put_nowait(f"{question} ({_tag(self._asked)})")
+            self._asked += 1
+        latencies = []
+
+        async def user_loop():
+            while not queue.empty():
+                question = queue.get_nowait()
+                started = time.perf_counter()
+                await handlers.generate_answer(question, 'latin')
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user_loop() for _ in range(users)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+        return total / elapsed, p50, p95
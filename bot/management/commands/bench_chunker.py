@@ -0,0 +1,171 @@
+"""
+Chunker benchmark: eski (join/split) va oqimli (deque) implementatsiya
+
+Sintetik docx (standart 50 MB matn) yaratiladi, so'ng har bir variant
+alohida jarayonda ishga tushirilib vaqt, Python obyektlari uchun eng
+yuqori xotira (tracemalloc) va jarayonning eng yuqori RSS i o'lchanadi.
+
+Misol:
+    python manage.py bench_chunker --size-mb 50
+"""
+import io
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from xml.sax.saxutils import escape
+
+from docx import Document
+from django.core.management.base import BaseCommand
+
+from rag.chunker import iter_chunks, iter_paragraphs
+
+
+def _legacy_load_docx(file_path: str) -> str:
+    doc = Document(file_path)
+    text = ""
+    for paragraph in doc.paragraphs:
+        text += paragraph.text + "\n"
+    return text
+
+
+def _legacy_chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> list:
+    paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
+
+    chunks = []
+    current_chunk = []
+    current_length = 0
+
+    for para in paragraphs:
+        words = para.split()
+        para_length = len(words)
+
+        if para_length > chunk_size:
+            if current_chunk:
+                chunks.append(' '.join(current_chunk))
+                current_chunk = []
+                current_length = 0
+
+            for i in range(0, para_length, chunk_size - overlap):
+                chunk_words = words[i:i + chunk_size]
+                chunks.append(' '.join(chunk_words))
+        else:
+            if current_length + para_length > chunk_size:
+                chunks.append(' '.join(current_chunk))
+
+                overlap_words = ' '.join(current_chunk).split()[-overlap:] if overlap > 0 else []
+                current_chunk = overlap_words + [para]
+                current_length = len(overlap_words) + para_length
+            else:
+                current_chunk.append(para)
+                current_length += para_length
+
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+
+    return chunks
+
+
+def make_synthetic_docx(path: str, size_mb: float, seed: int = 0):
+    """Taxminan size_mb MB matnli docx (document.xml to'g'ridan-to'g'ri yoziladi - python-docx bilan sekin)"""
+    rng = random.Random(seed)
+    vocabulary = [
+        "chiqindi", "ekologik", "talab", "korxona", "hudud", "ruxsatnoma", "moddasi",
+        "atrof-muhit", "nazorat", "jarima", "suv", "havo", "tuproq", "belgilangan",
+        "tartibda", "amalga", "oshiriladi", "qonun", "hujjat", "muhofaza",
+    ]
+
+    template = io.BytesIO()
+    Document().save(template)
+    template.seek(0)
+
+    target = size_mb * 1024 * 1024
+    body = io.StringIO()
+    written = 0
+    article = 0
+    while written < target:
+        article += 1
+        words = rng.choices(vocabulary, k=rng.choice([15, 40, 80, 150, 700]))
+        text = f"{article}-modda. " + " ".join(words)
+        body.write(f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>')
+        written += len(text) + 1
+
+    with zipfile.ZipFile(template) as source, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as out:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == 'word/document.xml':
+                xml = data.decode('utf-8')
+                head, tail = xml.split('<w:body>', 1)
+                data = f"{head}<w:body>{body.getvalue()}{tail}".encode('utf-8')
+            out.writestr(item, data)
+
+
+def _run(variant: str, path: str) -> dict:
+    """Bitta variantni o'lchash (alohida jarayonda chaqiriladi)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = 0
+    total = 0
+    if variant == 'legacy':
+        for chunk in _legacy_chunk_text(_legacy_load_docx(path)):
+            count += 1
+            total += len(chunk)
+    else:
+        # Chunk lar ro'yxatga yig'ilmaydi - embedding bosqichiga birma-bir uzatiladi
+        for chunk in iter_chunks(iter_paragraphs(path)):
+            count += 1
+            total += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'time': elapsed,
+        'peak_py': peak,
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'chunks': count,
+        'chars': total,
+    }
+
+
+class Command(BaseCommand):
+    help = "Eski va oqimli chunker ni sintetik docx da solishtirish"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=float, default=50, help="Sintetik matn hajmi (MB)")
+        parser.add_argument('--file', type=str, default='', help="Tayyor docx (berilsa sintetik yaratilmaydi)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        path = options['file']
+        tmp_dir = None
+        if not path:
+            tmp_dir = tempfile.TemporaryDirectory()
+            path = os.path.join(tmp_dir.name, 'synthetic.docx')
+            self.stdout.write(f"Sintetik docx yaratilmoqda ({options['size_mb']} MB matn)...")
+            make_synthetic_docx(path, options['size_mb'], options['seed'])
+        self.stdout.write(f"Fayl: {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB docx)")
+
+        # Har bir variant toza jarayonda - RSS o'lchovi bir-biriga ta'sir qilmasin
+        context = multiprocessing.get_context('spawn')
+        results = {}
+        try:
+            for variant in ('legacy', 'streaming'):
+                with context.Pool(1) as pool:
+                    results[variant] = pool.apply(_run, (variant, path))
+        finally:
+            if tmp_dir is not None:
+                tmp_dir.cleanup()
+
+        self.stdout.write(f"{'variant':>10} {'time s':>8} {'py peak MB':>11} {'max RSS MB':>11} {'chunks':>8}")
+        for variant, r in results.items():
+            self.stdout.write(
+                f"{variant:>10} {r['time']:>8.2f} {r['peak_py'] / 2**20:>11.1f} "
+                f"{r['max_rss'] / 2**20:>11.1f} {r['chunks']:>8}"
+            )
+        if (results['legacy']['chunks'], results['legacy']['chars']) != \
+                (results['streaming']['chunks'], results['streaming']['chars']):
+            self.stdout.write(self.style.WARNING("Natijalar farq qiladi!"))
@@ -0,0 +1,103 @@
+"""
+Intent router microbenchmark: eski (har bir xabarda ro'yxatlar + any() +
+belgi bo'yicha sikl) va kompilyatsiya qilingan router, ns/xabar
+
+Misol:
+    python manage.py bench_intents --messages 20000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from bot.intents import detect_alphabet, intent_router
+
+
+SAMPLES = [
+    "Assalomu alaykum",
+    "Салом, сен кимсан?",
+    "Здравствуйте! Что ты умеешь?",
+    "Rahmat",
+    "Ekologik ekspertiza xulosasini olish uchun qanday hujjatlar kerak va muddati qancha?",
+    "Экологик экспертиза хулосасини олиш учун қандай ҳужжатлар керак?",
+    "Какие документы нужны для получения заключения экологической экспертизы?",
+    "541-son qarorning 12-bandi nima haqida?",
+    "III toifadagi obyektlar uchun ekspertiza to'lovi qancha?",
+    "Телефон рақамингиз қанақа?",
+]
+
+
+def _legacy_detect_alphabet(text: str) -> str:
+    cyrillic_count = 0
+    latin_count = 0
+    uzbek_specific = 0
+
+    uzbek_chars = set('ўқғҳЎҚҒҲ')
+
+    for char in text:
+        if char in uzbek_chars:
+            uzbek_specific += 1
+            cyrillic_count += 1
+        elif 'Ѐ' <= char <= 'ӿ':
+            cyrillic_count += 1
+        elif 'a' <= char.lower() <= 'z':
+            latin_count += 1
+
+    if cyrillic_count > latin_count:
+        return 'cyrillic' if uzbek_specific > 0 else 'russian'
+    return 'latin'
+
+
+def _legacy_route(user_message: str) -> tuple:
+    greetings_latin = ["salom", "assalom", "hayrli kun", "xayrli kun", "hello"]
+    greetings_cyrillic = ["салом", "ассалом", "хайрли кун"]
+    greetings_russian = ["привет", "здравствуйте", "добрый день", "доброе утро", "добрый вечер", "здравствуй"]
+
+    user_lower = user_message.lower().strip()
+    is_greeting = any(q in user_lower for q in (greetings_cyrillic + greetings_latin + greetings_russian))
+
+    bot_questions_cyrillic = ["сен кимсан", "бот ҳақида", "нимага ёрдам", "нима қила оласан", "сиз кимсиз", "нима билесиз"]
+    bot_questions_latin = ["sen kimsan", "bot haqida", "nimaga yordam", "nima qila olasan", "siz kimsiz", "nima bilasiz"]
+    bot_questions_russian = ["кто ты", "что ты умеешь", "что ты можешь", "чем помочь", "о боте", "что за бот"]
+
+    is_bot_question = any(q in user_lower for q in (bot_questions_cyrillic + bot_questions_latin + bot_questions_russian))
+    return is_greeting, is_bot_question
+
+
+def _new_route(user_message: str) -> tuple:
+    names = intent_router.match(user_message)
+    return 'greeting' in names, 'about_bot' in names
+
+
+class Command(BaseCommand):
+    help = "Alifboni aniqlash va intent router tezligini eski implementatsiya bilan solishtirish (ns/xabar)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=20000, help="O'lchanadigan xabarlar soni")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        messages = [rng.choice(SAMPLES) for _ in range(options['messages'])]
+
+        # Natijalar eski implementatsiya bilan bir xil bo'lishi kerak
+        for message in SAMPLES:
+            assert detect_alphabet(message) == _legacy_detect_alphabet(message), message
+            assert _new_route(message) == _legacy_route(message), message
+
+        self.stdout.write(f"{'stage':>16} {'legacy ns':>12} {'router ns':>12} {'speedup':>8}")
+        for stage, legacy, new in [
+            ('detect_alphabet', _legacy_detect_alphabet, detect_alphabet),
+            ('route', _legacy_route, _new_route),
+        ]:
+            legacy_ns = self._measure(legacy, messages)
+            new_ns = self._measure(new, messages)
+            self.stdout.write(f"{stage:>16} {legacy_ns:>12.0f} {new_ns:>12.0f} {legacy_ns / new_ns:>7.1f}x")
+
+    def _measure(self, function, messages) -> float:
+        for message in messages[:100]:
+            function(message)  # isitish
+        started = time.perf_counter_ns()
+        for message in messages:
+            function(message)
+        return (time.perf_counter_ns() - started) / len(messages)
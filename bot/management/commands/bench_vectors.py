@@ -0,0 +1,112 @@
+"""
+Vektor qidiruv backendlari microbenchmark: Chroma (PersistentClient) va NumPy
+
+Har bir korpus hajmi uchun tasodifiy normallashtirilgan vektorlar
+yaratiladi va bitta so'rovning kechikishi (p50/p95) o'lchanadi.
+Chroma ga yozish sekin, shuning uchun u --chroma-max gacha o'lchanadi;
+NumPy matritsasi --max-gb dan oshsa o'tkazib yuboriladi.
+
+Misol:
+    python manage.py bench_vectors --sizes 100,1000,10000,100000,1000000 --dim 256
+"""
+import statistics
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from rag.numpy_index import NumpyIndex, DTYPES, quantize
+
+
+def _random_vectors(rng, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _percentiles(samples: list) -> tuple:
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+class Command(BaseCommand):
+    help = "Chroma va NumPy vektor backendlarida bitta so'rov kechikishini solishtirish"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='100,1000,10000,100000,1000000',
+                            help="Korpus hajmlari (vergul bilan)")
+        parser.add_argument('--dim', type=int, default=1536, help="Vektor o'lchami")
+        parser.add_argument('--queries', type=int, default=50, help="Har bir o'lchov uchun so'rovlar soni")
+        parser.add_argument('--n-results', type=int, default=8)
+        parser.add_argument('--dtypes', type=str, default=','.join(DTYPES))
+        parser.add_argument('--chroma-max', type=int, default=20000,
+                            help="Chroma shu hajmgacha o'lchanadi (yozish sekin)")
+        parser.add_argument('--max-gb', type=float, default=2.0,
+                            help="NumPy matritsasi uchun xotira chegarasi (GB)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        dim = options['dim']
+        queries = _random_vectors(rng, options['queries'], dim)
+        dtypes = options['dtypes'].split(',')
+
+        self.stdout.write(f"{'size':>9} {'backend':>14} {'p50 ms':>9} {'p95 ms':>9} {'MB':>8}")
+        for size in [int(s) for s in options['sizes'].split(',')]:
+            if size <= options['chroma_max']:
+                self._row(size, 'chroma', *self._bench_chroma(rng, size, dim, queries, options['n_results']))
+            for dtype in dtypes:
+                itemsize = np.dtype(dtype).itemsize
+                megabytes = size * dim * itemsize / 2**20
+                if megabytes > options['max_gb'] * 1024:
+                    self.stdout.write(f"{size:>9} {'numpy-' + dtype:>14} {'-':>9} {'-':>9} {megabytes:>8.0f}  (--max-gb)")
+                    continue
+                index = self._make_numpy_index(rng, size, dim, dtype)
+                p50, p95 = self._measure(lambda q: index.top_k(q, options['n_results']), queries)
+                self._row(size, 'numpy-' + dtype, p50, p95, index.matrix.nbytes / 2**20)
+                del index
+
+    def _row(self, size, backend, p50, p95, megabytes):
+        self.stdout.write(f"{size:>9} {backend:>14} {p50 * 1000:>9.3f} {p95 * 1000:>9.3f} {megabytes:>8.1f}")
+
+    def _measure(self, query, queries) -> tuple:
+        query(queries[0])  # isitish
+        samples = []
+        for q in queries:
+            started = time.perf_counter()
+            query(q)
+            samples.append(time.perf_counter() - started)
+        return _percentiles(samples)
+
+    def _make_numpy_index(self, rng, size: int, dim: int, dtype: str) -> NumpyIndex:
+        """Katta korpusni bloklab yaratish - float32 nusxasi butunlay xotirada turmaydi"""
+        matrix = np.empty((size, dim), dtype=dtype)
+        scales = np.empty(size, dtype=np.float32) if dtype == 'int8' else None
+        block = 50000
+        for start in range(0, size, block):
+            part, part_scales = quantize(_random_vectors(rng, min(block, size - start), dim), dtype)
+            matrix[start:start + len(part)] = part
+            if scales is not None:
+                scales[start:start + len(part)] = part_scales
+        ids = [str(i) for i in range(size)]
+        return NumpyIndex(ids, ids, [{}] * size, matrix, scales)
+
+    def _bench_chroma(self, rng, size: int, dim: int, queries, n_results: int) -> tuple:
+        with tempfile.TemporaryDirectory() as path:
+            chroma = chromadb.PersistentClient(path=path)
+            collection = chroma.create_collection(name="bench")
+            batch = chroma.get_max_batch_size()
+            for start in range(0, size, batch):
+                count = min(batch, size - start)
+                collection.add(
+                    ids=[str(i) for i in range(start, start + count)],
+                    embeddings=_random_vectors(rng, count, dim),
+                    documents=[f"chunk {i}" for i in range(start, start + count)],
+                )
+            p50, p95 = self._measure(
+                lambda q: collection.query(query_embeddings=[q.tolist()], n_results=n_results),
+                queries
+            )
+            return p50, p95, size * dim * 4 / 2**20
@@ -0,0 +1,121 @@
+"""
+Worker rejimi uchun scale-out benchmark
+
+Har bir bosqichda N ta `runbot --mode worker` jarayoni soxta Bot API ga
+ulangan holda ishga tushiriladi, barcha bo'limlar ijaraga olingach
+UpdateQueue ga --messages ta update yoziladi va navbat bo'shaguncha
+ketgan vaqt o'lchanadi.
+
+Misol:
+    python manage.py bench_workers --workers 1,2,4 --messages 1000 --chats 200
+
+Standart matn salomlashuv ("salom") - OpenAI chaqirilmaydi. Oxirida faqat
+benchmark yozgan UpdateQueue qatorlari hamda sinov chatlari (1000 dan
+boshlab) uchun yaratilgan TelegramUser va Conversation yozuvlari o'chiriladi.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from http.server import ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bot.management.commands.fake_telegram import (
+    FIRST_CHAT_ID, FakeBotAPI, _make_handler, cleanup_test_rows, make_update, snapshot_test_rows
+)
+from bot.models import UpdateQueue, PartitionLease, BotWorker
+from bot.worker_queue import partition_for
+
+
+class Command(BaseCommand):
+    help = "Worker rejimi throughput ini 1 dan N gacha workerlar bilan o'lchash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=str, default='1,2,4', help="Workerlar soni (vergul bilan)")
+        parser.add_argument('--messages', type=int, default=500, help="Har bir bosqichdagi update lar soni")
+        parser.add_argument('--chats', type=int, default=100, help='Turli chatlar soni')
+        parser.add_argument('--text', type=str, default='salom', help='Xabar matni')
+        parser.add_argument('--api-port', type=int, default=8081, help='Soxta Bot API porti')
+        parser.add_argument('--timeout', type=float, default=120, help="Har bir bosqich uchun chegara (soniya)")
+
+    def handle(self, *args, **options):
+        if UpdateQueue.objects.exists():
+            raise CommandError("UpdateQueue bo'sh emas - benchmark ishlayotgan tizimda ishga tushirilmasin")
+        test_ids = range(FIRST_CHAT_ID, FIRST_CHAT_ID + options['chats'])
+        existing_users, last_conversation = snapshot_test_rows(test_ids)
+
+        api = FakeBotAPI()
+        server = ThreadingHTTPServer(('127.0.0.1', options['api_port']), _make_handler(api))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        self.stdout.write(f"{'workers':>8} {'updates/s':>10} {'time s':>8}")
+        try:
+            for workers in [int(w) for w in options['workers'].split(',')]:
+                rate, elapsed = self._run(workers, options)
+                self.stdout.write(f"{workers:>8} {rate:>10.1f} {elapsed:>8.2f}")
+        finally:
+            server.shutdown()
+            users, conversations = cleanup_test_rows(test_ids, existing_users, last_conversation)
+            self.stdout.write(f"Sinov yozuvlari o'chirildi: {users} foydalanuvchi, {conversations} yozuv")
+
+    def _run(self, workers: int, options):
+        env = dict(os.environ)
+        env['TELEGRAM_API_BASE_URL'] = f"http://127.0.0.1:{options['api_port']}/bot"
+        created_ids = []
+        processes = [
+            subprocess.Popen(
+                [sys.executable, 'manage.py', 'runbot', '--mode', 'worker'],
+                cwd=settings.BASE_DIR,
+                env=env,
+                stdout=subprocess.DEVNULL,
+            )
+            for _ in range(workers)
+        ]
+        try:
+            self._wait_for_leases(workers, options['timeout'])
+
+            total = options['messages']
+            rows = []
+            for i in range(total):
+                chat_id = FIRST_CHAT_ID + i % options['chats']
+                rows.append(UpdateQueue(
+                    partition=partition_for(chat_id),
+                    chat_id=chat_id,
+                    payload=make_update(i + 1, chat_id, options['text'])
+                ))
+
+            started = time.perf_counter()
+            created_ids = [row.pk for row in UpdateQueue.objects.bulk_create(rows)]
+            deadline = started + options['timeout']
+            while UpdateQueue.objects.filter(pk__in=created_ids).exists() and time.perf_counter() < deadline:
+                time.sleep(0.05)
+            elapsed = time.perf_counter() - started
+            return total / elapsed, elapsed
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+            # Faqat shu bosqich yozgan (qayta ishlanmay qolgan) update lar
+            UpdateQueue.objects.filter(pk__in=created_ids).delete()
+
+    def _wait_for_leases(self, workers: int, timeout: float):
+        """Barcha workerlar ro'yxatdan o'tib, bo'limlar ular orasida taqsimlanguncha kutish"""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            now = timezone.now()
+            live = BotWorker.objects.filter(last_seen__gte=now - timedelta(seconds=settings.BOT_QUEUE_LEASE_TTL))
+            owners = set(
+                PartitionLease.objects.filter(expires_at__gte=now).exclude(owner='')
+                .values_list('owner', flat=True)
+            )
+            owned = PartitionLease.objects.filter(expires_at__gte=now).exclude(owner='').count()
+            if live.count() >= workers and len(owners) >= workers and owned == settings.BOT_QUEUE_PARTITIONS:
+                return
+            time.sleep(0.2)
+        raise CommandError("Workerlar bo'limlarni o'z vaqtida taqsimlab olmadi")
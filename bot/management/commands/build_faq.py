@@ -0,0 +1,128 @@
+"""
+Conversation tarixidan FAQ takliflarini yaratish
+
+Javob berilgan savollar embedding bo'yicha alifbo ichida klasterlanadi;
+har bir katta klasterning markaziy savoli va uning javobi tasdiqlanmagan
+FaqEntry sifatida saqlanadi. Admin ularni Django admin da ko'rib chiqib
+tasdiqlaydi. Mavjud yozuvga yaqin klaster yangi yozuv yaratmaydi - faqat
+cluster_size yangilanadi.
+
+Misol:
+    python manage.py build_faq --days 90 --top 20
+    python manage.py build_faq --dry-run
+    python manage.py build_faq --reembed   # UZ_CORPUS_SCRIPT o'zgargandan keyin
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bot.faq import cluster_questions
+from bot.intents import detect_alphabet
+from bot.models import Conversation, FaqEntry
+from rag.embeddings import get_embeddings
+from rag.translit import normalize_query
+
+
+class Command(BaseCommand):
+    help = "Javob berilgan savollarni klasterlab FAQ takliflarini yaratish"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Oxirgi necha kunlik savollar")
+        parser.add_argument('--limit', type=int, default=20000, help="Ko'rib chiqiladigan savollar soni")
+        parser.add_argument('--threshold', type=float, default=settings.FAQ_CLUSTER_THRESHOLD,
+                            help="Klasterga qo'shish uchun kosinus o'xshashlik")
+        parser.add_argument('--min-size', type=int, default=settings.FAQ_MIN_CLUSTER_SIZE,
+                            help="Taklif qilinadigan klasterning eng kichik hajmi")
+        parser.add_argument('--top', type=int, default=20, help="Har bir alifbo uchun eng ko'pi bilan takliflar")
+        parser.add_argument('--dry-run', action='store_true', help="Faqat ko'rsatish, saqlamaslik")
+        parser.add_argument('--reembed', action='store_true',
+                            help="Mavjud FAQ savollari embeddinglarini joriy normallashtirish bilan qayta hisoblash")
+
+    def handle(self, *args, **options):
+        if options['reembed']:
+            self._reembed()
+            return
+
+        since = timezone.now() - timedelta(days=options['days'])
+        # Faqat GPT bergan javoblar - intent, kesh va FAQ javoblari qayta klasterlanmaydi
+        conversations = list(
+            Conversation.objects.filter(status='answered', created_at__gte=since, total_tokens__gt=0)
+            .order_by('-created_at')
+            .values('question', 'answer')[:options['limit']]
+        )
+        self.stdout.write(f"Savollar: {len(conversations)}")
+
+        grouped = {}
+        for conversation in conversations:
+            grouped.setdefault(detect_alphabet(conversation['question']), []).append(conversation)
+
+        for alphabet, items in grouped.items():
+            self._propose(alphabet, items, options)
+
+    @staticmethod
+    def _embed(alphabet: str, questions: list) -> list:
+        texts = [question if alphabet == 'russian' else normalize_query(question) for question in questions]
+        step = settings.EMBEDDING_BATCH_MAX_INPUTS
+        embeddings = []
+        for start in range(0, len(texts), step):
+            embeddings.extend(get_embeddings(texts[start:start + step]))
+        return embeddings
+
+    def _reembed(self):
+        grouped = {}
+        for entry in FaqEntry.objects.all():
+            grouped.setdefault(entry.alphabet, []).append(entry)
+
+        for alphabet, entries in grouped.items():
+            embeddings = self._embed(alphabet, [entry.question for entry in entries])
+            for entry, embedding in zip(entries, embeddings):
+                entry.embedding = embedding
+            FaqEntry.objects.bulk_update(entries, ['embedding'])
+            self.stdout.write(self.style.SUCCESS(f"{alphabet}: {len(entries)} ta FAQ embeddingi yangilandi"))
+
+    def _propose(self, alphabet: str, items: list, options):
+        embeddings = self._embed(alphabet, [item['question'] for item in items])
+
+        clusters = cluster_questions(embeddings, options['threshold'], options['min_size'])[:options['top']]
+        self.stdout.write(f"{alphabet}: {len(items)} ta savol, {len(clusters)} ta klaster")
+
+        existing = list(FaqEntry.objects.filter(alphabet=alphabet))
+        existing_matrix = None
+        if existing:
+            existing_matrix = np.asarray([entry.embedding for entry in existing], dtype=np.float32)
+            existing_matrix /= np.linalg.norm(existing_matrix, axis=1, keepdims=True)
+
+        for center, members in clusters:
+            item = items[center]
+            self.stdout.write(f"  [{len(members)}] {item['question'][:100]}")
+            if options['dry_run']:
+                continue
+
+            embedding = embeddings[center]
+            duplicate = None
+            if existing_matrix is not None:
+                vector = np.asarray(embedding, dtype=np.float32)
+                similarities = existing_matrix @ (vector / np.linalg.norm(vector))
+                best = int(np.argmax(similarities))
+                if similarities[best] >= options['threshold']:
+                    duplicate = existing[best]
+
+            if duplicate is not None:
+                duplicate.cluster_size = len(members)
+                duplicate.save(update_fields=['cluster_size'])
+                continue
+            FaqEntry.objects.create(
+                question=item['question'],
+                answer=item['answer'],
+                alphabet=alphabet,
+                embedding=embedding,
+                cluster_size=len(members),
+            )
+
+        if not options['dry_run'] and clusters:
+            self.stdout.write(self.style.SUCCESS(
+                f"{alphabet}: takliflar saqlandi - Django admin da (FAQ) tasdiqlang"
+            ))
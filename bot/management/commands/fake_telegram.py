@@ -0,0 +1,237 @@
+"""
+Webhook rejimini sinash uchun mahalliy soxta Telegram
+
+Uch qismdan iborat:
+  1. Soxta Bot API server (--api-port): sendMessage, editMessageText,
+     deleteMessage va boshqa chaqiruvlarni qabul qilib, yozib boradi.
+  2. Bot: `runbot --mode webhook --workers N` soxta API ga ulangan holda
+     ishga tushiriladi (--workers 0 bo'lsa bot alohida ishga tushirilishi
+     kutiladi, TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot bilan).
+  3. Drayver: webhook ga soxta Update larni POST qiladi va bot javoblarini
+     kutadi.
+
+Misol:
+    python manage.py fake_telegram --workers 4 --messages 200 --chats 50
+
+Standart matn salomlashuv ("salom") - OpenAI chaqirilmaydi. BOT_WEBHOOK_SECRET
+sozlanmagan bo'lsa, ishga tushirilgan bot uchun tasodifiy secret yaratiladi.
+Bir nechta worker `--unordered` bilan ishga tushiriladi (chat tartibi
+kafolatlanmaydi). Sinov chatlari (1000 dan boshlab) uchun yaratilgan
+TelegramUser va Conversation yozuvlari oxirida o'chiriladi.
+"""
+import asyncio
+import json
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bot.models import Conversation, TelegramUser
+
+
+# Sinov chatlarining telegram_id lari shu qiymatdan boshlanadi
+FIRST_CHAT_ID = 1000
+
+
+def snapshot_test_rows(test_ids) -> tuple:
+    """Sinovdan oldingi holat: mavjud foydalanuvchilar va oxirgi Conversation pk si"""
+    existing_users = set(TelegramUser.objects.filter(telegram_id__in=test_ids).values_list('pk', flat=True))
+    last_conversation = Conversation.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    return existing_users, last_conversation
+
+
+def cleanup_test_rows(test_ids, existing_users: set, last_conversation: int) -> tuple:
+    """Faqat sinov yaratgan yozuvlarni o'chirish (oldin bor bo'lgan foydalanuvchilar qoladi)"""
+    conversations, _ = Conversation.objects.filter(
+        pk__gt=last_conversation, user__telegram_id__in=test_ids
+    ).delete()
+    users, _ = TelegramUser.objects.filter(telegram_id__in=test_ids).exclude(pk__in=existing_users).delete()
+    return users, conversations
+
+
+class FakeBotAPI:
+    """Bot API chaqiruvlarini yozib boruvchi soxta server holati"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.message_id = 0
+
+    def record(self, method: str, params: dict) -> object:
+        with self.lock:
+            self.calls.append((time.perf_counter(), method, params))
+            if method == 'getMe':
+                return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+            if method in ('sendMessage', 'editMessageText'):
+                if method == 'sendMessage':
+                    self.message_id += 1
+                    message_id = self.message_id
+                else:
+                    message_id = int(params.get('message_id', 0))
+                return {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                    'text': params.get('text', ''),
+                }
+            return True
+
+    def count(self, method: str) -> int:
+        with self.lock:
+            return sum(1 for _, m, _ in self.calls if m == method)
+
+
+def _make_handler(api: FakeBotAPI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            # /bot<token>/<method>
+            method = self.path.rstrip('/').rsplit('/', 1)[-1]
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                params = json.loads(body or '{}')
+            else:
+                params = dict(parse_qsl(body))
+
+            payload = json.dumps({'ok': True, 'result': api.record(method, params)}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    """Shaxsiy chatdan kelgan matnli xabar uchun Update"""
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'Test', 'username': f'test_{chat_id}'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': user,
+            'text': text,
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = "Webhook rejimini soxta Telegram bilan sinash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--api-port', type=int, default=8081, help='Soxta Bot API porti')
+        parser.add_argument('--port', type=int, default=8000, help='Bot webhook porti')
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Ishga tushiriladigan uvicorn workerlar soni (0 - bot alohida)")
+        parser.add_argument('--messages', type=int, default=100, help="Yuboriladigan update lar soni")
+        parser.add_argument('--chats', type=int, default=20, help='Turli chatlar soni')
+        parser.add_argument('--text', type=str, default='salom', help='Xabar matni')
+        parser.add_argument('--timeout', type=float, default=60, help='Javoblarni kutish (soniya)')
+        parser.add_argument('--serve-only', action='store_true',
+                            help="Faqat soxta Bot API ni ishga tushirish")
+
+    def handle(self, *args, **options):
+        self.secret = settings.BOT_WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        test_ids = range(FIRST_CHAT_ID, FIRST_CHAT_ID + options['chats'])
+        existing_users, last_conversation = snapshot_test_rows(test_ids)
+
+        api = FakeBotAPI()
+        server = ThreadingHTTPServer(('127.0.0.1', options['api_port']), _make_handler(api))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.stdout.write(f"Soxta Bot API: http://127.0.0.1:{options['api_port']}/bot")
+
+        bot_process = None
+        try:
+            if options['serve_only']:
+                self.stdout.write("To'xtatish uchun Ctrl+C")
+                threading.Event().wait()
+                return
+
+            if options['workers'] > 0:
+                bot_process = self._spawn_bot(options)
+            asyncio.run(self._drive(api, options))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if bot_process is not None:
+                bot_process.terminate()
+                bot_process.wait()
+            server.shutdown()
+            users, conversations = cleanup_test_rows(test_ids, existing_users, last_conversation)
+            self.stdout.write(f"Sinov yozuvlari o'chirildi: {users} foydalanuvchi, {conversations} yozuv")
+
+    def _spawn_bot(self, options):
+        env = dict(os.environ)
+        env['TELEGRAM_API_BASE_URL'] = f"http://127.0.0.1:{options['api_port']}/bot"
+        env['BOT_WEBHOOK_SECRET'] = self.secret
+        return subprocess.Popen(
+            [sys.executable, 'manage.py', 'runbot', '--mode', 'webhook',
+             '--host', '127.0.0.1', '--port', str(options['port']),
+             '--workers', str(options['workers']), '--unordered'],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+
+    async def _wait_for_webhook(self, http, url: str, timeout: float):
+        """Webhook javob bera boshlaguncha kutish (503 - bot hali ishga tushmagan)"""
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            try:
+                response = await http.post(url, content=b'{}')
+                if response.status_code != 503:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+        raise TimeoutError(f"Webhook javob bermadi: {url}")
+
+    async def _drive(self, api: FakeBotAPI, options):
+        total = options['messages']
+        url = f"http://127.0.0.1:{options['port']}{settings.BOT_WEBHOOK_PATH}"
+        headers = {'X-Telegram-Bot-Api-Secret-Token': self.secret}
+
+        statuses = Counter()
+        async with httpx.AsyncClient(timeout=30) as http:
+            await self._wait_for_webhook(http, url, options['timeout'])
+            # Bir nechta workerlar bo'lsa, hammasi ishga tushishi uchun biroz kutamiz
+            await asyncio.sleep(1)
+
+            async def post(i):
+                update = make_update(i + 1, FIRST_CHAT_ID + i % options['chats'], options['text'])
+                response = await http.post(url, json=update, headers=headers)
+                statuses[response.status_code] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(post(i) for i in range(total)))
+        accepted = time.perf_counter() - started
+
+        # Har bir update kamida bitta sendMessage ga olib keladi
+        deadline = time.perf_counter() + options['timeout']
+        while api.count('sendMessage') < total and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+        methods = Counter(m for _, m, _ in api.calls)
+        self.stdout.write(f"Webhook javoblari: {dict(statuses)}")
+        self.stdout.write(f"Qabul qilish: {total / accepted:.1f} update/s")
+        self.stdout.write(f"Javob berilgan: {api.count('sendMessage')} / {total} ({elapsed:.2f} s, "
+                          f"{api.count('sendMessage') / elapsed:.1f} javob/s)")
+        self.stdout.write(f"Bot API chaqiruvlari: {dict(methods)}")
@@ -26,6 +26,16 @@ class Command(BaseCommand):
             action='store_true',
             help='Barcha tillarni indekslash (rules.docx + rules_ru.docx)'
         )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Hech narsani o'zgartirmasdan nechta chunk embed qilinishini ko'rsatish"
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="O'zgarishlardan qat'i nazar yangi versiyani to'liq qurish"
+        )
 
     def handle(self, *args, **options):
         if options['all']:
@@ -41,8 +51,9 @@ class Command(BaseCommand):
                     continue
                 self.stdout.write(f"Indekslash: {file_path} ({lang})")
                 try:
-                    index_rules(file_path, lang=lang)
-                    self.stdout.write(self.style.SUCCESS(f'{file_name} ({lang}) muvaffaqiyatli indekslandi!'))
+                    self._index(file_path, lang, options)
+                    if not options['dry_run']:
+                        self.stdout.write(self.style.SUCCESS(f'{file_name} ({lang}) muvaffaqiyatli indekslandi!'))
                 except Exception as e:
                     self.stdout.write(self.style.ERROR(f"Xatolik ({file_name}): {e}"))
         else:
@@ -57,7 +68,17 @@ class Command(BaseCommand):
             self.stdout.write(f"Indekslash boshlanmoqda: {file_path} ({lang})")
 
             try:
-                index_rules(file_path, lang=lang)
-                self.stdout.write(self.style.SUCCESS('Indekslash muvaffaqiyatli yakunlandi!'))
+                self._index(file_path, lang, options)
+                if not options['dry_run']:
+                    self.stdout.write(self.style.SUCCESS('Indekslash muvaffaqiyatli yakunlandi!'))
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"Xatolik: {e}"))
+
+    def _index(self, file_path: str, lang: str, options):
+        summary = index_rules(file_path, lang=lang, dry_run=options['dry_run'], full=options['full'])
+        if options['dry_run']:
+            self.stdout.write(
+                f"[dry-run] {summary['collection']}: {summary['added']} ta chunk embed qilinadi, "
+                f"{summary['removed']} ta o'chiriladi, {summary['unchanged']} ta o'zgarmaydi, "
+                f"boshqa fayllardan {summary['kept']} ta ko'chiriladi"
+            )
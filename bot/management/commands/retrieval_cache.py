@@ -0,0 +1,40 @@
+"""
+Qidiruv natijalari keshi statistikasi (barcha bot worker lar bo'yicha)
+
+Misol:
+    python manage.py retrieval_cache
+    python manage.py retrieval_cache --clear
+"""
+from django.core.management.base import BaseCommand
+
+from rag.vectordb import retrieval_cache, get_index_version, COLLECTIONS
+
+
+class Command(BaseCommand):
+    help = "Qidiruv keshining topilish foizi va versiyalar bo'yicha yozuvlar soni"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help="Keshni va hisoblagichlarni tozalash"
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            retrieval_cache.clear()
+            self.stdout.write(self.style.SUCCESS("Qidiruv keshi tozalandi"))
+            return
+
+        stats = retrieval_cache.shared_stats()
+        hits = stats['memory_hits'] + stats['disk_hits']
+        total = hits + stats['misses']
+        self.stdout.write(f"Topildi: {hits} / {total} ({stats['hit_ratio']:.1%})")
+        self.stdout.write(f"  xotiradan: {stats['memory_hits']}, SQLite dan: {stats['disk_hits']}")
+        self.stdout.write(f"Topilmadi: {stats['misses']}")
+
+        current = {get_index_version(lang) for lang in COLLECTIONS}
+        self.stdout.write("Yozuvlar:")
+        for lang, version, count in stats['versions']:
+            mark = "" if version in current else "  (eski)"
+            self.stdout.write(f"  {lang} {version}: {count}{mark}")
@@ -0,0 +1,66 @@
+"""
+Model router hisoboti: kunlar va yo'nalishlar (route) bo'yicha savollar
+soni, o'rtacha kechikish, provider keshidan olingan prompt tokenlari ulushi,
+haqiqiy xarajat va hamma savol ANSWER_MODEL ga keshsiz yuborilganda
+bo'ladigan taxminiy xarajat (shu tokenlar bo'yicha)
+
+Misol:
+    python manage.py route_report --days 7
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from bot.pricing import calculate_cost
+from bot.models import Conversation
+
+
+class Command(BaseCommand):
+    help = "Kunlik xarajat va kechikish: model router yo'nalishlari bo'yicha"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help="Oxirgi necha kun")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        rows = (
+            Conversation.objects.filter(created_at__gte=since)
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'route')
+            .annotate(
+                count=Count('id'),
+                latency=Avg('latency_ms'),
+                input_tokens=Sum('input_tokens'),
+                cached_tokens=Sum('cached_tokens'),
+                output_tokens=Sum('output_tokens'),
+                cost=Sum('cost'),
+            )
+            .order_by('day', 'route')
+        )
+
+        self.stdout.write(
+            f"{'kun':>10} {'route':>10} {'soni':>6} {'ms':>7} {'kesh %':>7} {'xarajat $':>10} {settings.ANSWER_MODEL + ' $':>10} {'tejaldi $':>10}"
+        )
+        totals = {}
+        for row in rows:
+            cost = row['cost'] or 0
+            baseline = calculate_cost(settings.ANSWER_MODEL, row['input_tokens'] or 0, row['output_tokens'] or 0)
+            latency = f"{row['latency']:.0f}" if row['latency'] is not None else "-"
+            # Prompt tokenlarining provider keshidan olingan ulushi
+            cached = (row['cached_tokens'] or 0) / row['input_tokens'] if row['input_tokens'] else 0
+            self.stdout.write(
+                f"{row['day']!s:>10} {row['route'] or '-':>10} {row['count']:>6} {latency:>7} {cached:>7.0%} "
+                f"{cost:>10.4f} {baseline:>10.4f} {baseline - cost:>10.4f}"
+            )
+            day = totals.setdefault(row['day'], [0, 0])
+            day[0] += cost
+            day[1] += baseline
+
+        self.stdout.write("")
+        for day, (cost, baseline) in totals.items():
+            share = (baseline - cost) / baseline if baseline else 0
+            self.stdout.write(f"{day!s:>10} jami: ${cost:.4f} (tejaldi ${baseline - cost:.4f}, {share:.0%})")
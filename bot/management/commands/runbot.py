@@ -1,10 +1,97 @@
-from django.core.management.base import BaseCommand
-from bot.handlers import main
+import asyncio
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from telegram import Bot
 
 
 class Command(BaseCommand):
     help = 'Telegram botni ishga tushirish'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            type=str,
+            default='polling',
+            choices=['polling', 'webhook', 'ingest', 'worker'],
+            help="polling (bitta jarayon), webhook (config/asgi.py, uvicorn), "
+                 "ingest (getUpdates -> DB navbati) yoki worker (DB navbatidan qayta ishlash)"
+        )
+        parser.add_argument('--host', type=str, default='0.0.0.0', help='Webhook: host')
+        parser.add_argument('--port', type=int, default=8000, help='Webhook: port')
+        parser.add_argument('--workers', type=int, default=1, help='Webhook: uvicorn workerlar soni')
+        parser.add_argument(
+            '--unordered',
+            action='store_true',
+            help="Webhook: BOT_QUEUE_ENABLED siz bir nechta worker (chat ichidagi tartib kafolatlanmaydi, "
+                 "faqat yuklama sinovlari uchun)"
+        )
+        parser.add_argument(
+            '--set-webhook',
+            action='store_true',
+            help="BOT_WEBHOOK_URL ni Telegram da ro'yxatdan o'tkazish"
+        )
+
     def handle(self, *args, **options):
+        if options['set_webhook']:
+            if not settings.BOT_WEBHOOK_URL:
+                raise CommandError("BOT_WEBHOOK_URL sozlanmagan")
+            if not settings.BOT_WEBHOOK_SECRET:
+                raise CommandError("BOT_WEBHOOK_SECRET sozlanmagan - webhook secret siz o'rnatilmaydi")
+            asyncio.run(self._set_webhook())
+            self.stdout.write(self.style.SUCCESS(f"Webhook o'rnatildi: {settings.BOT_WEBHOOK_URL}"))
+
+        if options['mode'] == 'webhook':
+            import uvicorn
+
+            if not settings.BOT_WEBHOOK_SECRET:
+                raise CommandError("BOT_WEBHOOK_SECRET sozlanmagan - webhook har qanday POST ni qabul qilardi")
+            if options['workers'] > 1 and not settings.BOT_QUEUE_ENABLED and not options['unordered']:
+                # Bitta chatning update lari turli workerlarga tushib, tartibsiz javob berilardi
+                raise CommandError(
+                    "Bir nechta webhook worker faqat BOT_QUEUE_ENABLED=True bilan ishlaydi "
+                    "(yoki --unordered)"
+                )
+
+            # Worker jarayonlari config/asgi.py ni qayta import qiladi; --workers 1 da esa
+            # ilova shu jarayonda yuklanadi va settings allaqachon o'qilgan
+            os.environ['BOT_WEBHOOK_ENABLED'] = 'True'
+            settings.BOT_WEBHOOK_ENABLED = True
+            self.stdout.write(self.style.SUCCESS(
+                f"Bot webhook rejimida ishga tushmoqda ({options['workers']} worker)..."
+            ))
+            uvicorn.run(
+                'config.asgi:application',
+                host=options['host'],
+                port=options['port'],
+                workers=options['workers'],
+                lifespan='on'
+            )
+            return
+
+        if options['mode'] == 'ingest':
+            from bot.worker_queue import run_ingest
+
+            run_ingest()
+            return
+
+        if options['mode'] == 'worker':
+            from bot.worker_queue import run_worker
+
+            self.stdout.write(self.style.SUCCESS('Worker ishga tushmoqda...'))
+            run_worker()
+            return
+
+        from bot.handlers import main
+
         self.stdout.write(self.style.SUCCESS('Bot ishga tushmoqda...'))
         main()
+
+    async def _set_webhook(self):
+        kwargs = {'base_url': settings.TELEGRAM_API_BASE_URL} if settings.TELEGRAM_API_BASE_URL else {}
+        async with Bot(settings.BOT_TOKEN, **kwargs) as bot:
+            await bot.set_webhook(
+                url=settings.BOT_WEBHOOK_URL,
+                secret_token=settings.BOT_WEBHOOK_SECRET
+            )
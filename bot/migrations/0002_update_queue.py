@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotWorker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker_id', models.CharField(max_length=128, unique=True)),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Bot Worker',
+                'verbose_name_plural': 'Bot Workers',
+            },
+        ),
+        migrations.CreateModel(
+            name='PartitionLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('partition', models.SmallIntegerField(unique=True)),
+                ('owner', models.CharField(blank=True, default='', max_length=128)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Partition Lease',
+                'verbose_name_plural': 'Partition Leases',
+            },
+        ),
+        migrations.CreateModel(
+            name='UpdateQueue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('partition', models.SmallIntegerField()),
+                ('chat_id', models.BigIntegerField()),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Update Queue',
+                'verbose_name_plural': 'Update Queue',
+                'indexes': [models.Index(fields=['partition', 'id'], name='bot_updateq_partiti_06c56e_idx')],
+            },
+        ),
+    ]
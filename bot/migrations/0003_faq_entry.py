@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0002_update_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaqEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('answer', models.TextField()),
+                ('alphabet', models.CharField(choices=[('latin', 'Lotin'), ('cyrillic', 'Kirill'), ('russian', 'Rus')], default='latin', max_length=10)),
+                ('embedding', models.JSONField()),
+                ('cluster_size', models.IntegerField(default=0)),
+                ('is_approved', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'FAQ',
+                'verbose_name_plural': 'FAQ',
+                'ordering': ['-cluster_size'],
+            },
+        ),
+    ]
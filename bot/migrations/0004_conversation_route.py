@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0003_faq_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='latency_ms',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='model',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='route',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0004_conversation_route'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='cached_tokens',
+            field=models.IntegerField(default=0),
+        ),
+    ]
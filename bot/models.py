@@ -28,9 +28,13 @@ class Conversation(models.Model):
     input_tokens = models.IntegerField(default=0)
     output_tokens = models.IntegerField(default=0)
     total_tokens = models.IntegerField(default=0)
+    cached_tokens = models.IntegerField(default=0)  # input_tokens ning provider keshidan olingan qismi
     cost = models.DecimalField(max_digits=10, decimal_places=6, default=0)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='answered')
     source_chunks = models.TextField(blank=True, null=True)  # RAG dan topilgan qismlar
+    route = models.CharField(max_length=20, blank=True, default='')  # simple / complex / off_topic / faq / ...
+    model = models.CharField(max_length=50, blank=True, default='')  # Javob bergan model
+    latency_ms = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -42,6 +46,31 @@ class Conversation(models.Model):
         return f"{self.user} - {self.question[:50]}"
 
 
+class FaqEntry(models.Model):
+    """Conversation tarixidan klasterlangan savol-javob; tasdiqlangandan keyin GPT siz beriladi"""
+    ALPHABET_CHOICES = [
+        ('latin', 'Lotin'),
+        ('cyrillic', 'Kirill'),
+        ('russian', 'Rus'),
+    ]
+
+    question = models.TextField()
+    answer = models.TextField()
+    alphabet = models.CharField(max_length=10, choices=ALPHABET_CHOICES, default='latin')
+    embedding = models.JSONField()  # Savolning (normallashtirilgan) embeddingi
+    cluster_size = models.IntegerField(default=0)  # Klasterdagi savollar soni
+    is_approved = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "FAQ"
+        verbose_name_plural = "FAQ"
+        ordering = ['-cluster_size']
+
+    def __str__(self):
+        return self.question[:50]
+
+
 class BotAdmin(models.Model):
     telegram_id = models.BigIntegerField(unique=True)
     username = models.CharField(max_length=255, blank=True, null=True)
@@ -54,3 +83,46 @@ class BotAdmin(models.Model):
 
     def __str__(self):
         return f"{self.username or self.telegram_id}"
+
+
+class UpdateQueue(models.Model):
+    """Worker rejimi uchun Telegram update lari navbati (chat_id bo'yicha bo'limlarga ajratilgan)"""
+    partition = models.SmallIntegerField()
+    chat_id = models.BigIntegerField()
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Update Queue"
+        verbose_name_plural = "Update Queue"
+        indexes = [models.Index(fields=['partition', 'id'])]
+
+    def __str__(self):
+        return f"{self.partition}:{self.chat_id} #{self.id}"
+
+
+class PartitionLease(models.Model):
+    """Navbat bo'limini qaysi worker qayta ishlayotgani"""
+    partition = models.SmallIntegerField(unique=True)
+    owner = models.CharField(max_length=128, blank=True, default='')
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Partition Lease"
+        verbose_name_plural = "Partition Leases"
+
+    def __str__(self):
+        return f"{self.partition} - {self.owner or '-'}"
+
+
+class BotWorker(models.Model):
+    """Tirik worker jarayonlari (bo'limlarni teng taqsimlash uchun)"""
+    worker_id = models.CharField(max_length=128, unique=True)
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Bot Worker"
+        verbose_name_plural = "Bot Workers"
+
+    def __str__(self):
+        return self.worker_id
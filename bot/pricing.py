@@ -0,0 +1,32 @@
+"""
+OpenAI modellari narxlari va so'rov xarajatini hisoblash
+
+Django ga bog'liq emas - eski main.py ham shu jadvaldan foydalanadi.
+"""
+from decimal import Decimal
+
+
+# Narxlar: $ / 1M token (kirish, keshdagi kirish, chiqish)
+MODEL_PRICES = {
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+}
+
+
+def calculate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> Decimal:
+    """
+    Model narxi bo'yicha so'rov xarajati (noma'lum model - gpt-4o narxida)
+
+    cached_tokens - input_tokens ning provider keshidan olingan (arzonroq) qismi
+    """
+    input_price, cached_price, output_price = MODEL_PRICES.get(model, MODEL_PRICES['gpt-4o'])
+    return Decimal(str(
+        ((input_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+         + output_tokens * output_price) / 1_000_000
+    ))
+
+
+def cached_prompt_tokens(usage) -> int:
+    """usage dagi provider keshidan olingan prompt tokenlari"""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return (getattr(details, 'cached_tokens', None) or 0) if details else 0
@@ -0,0 +1,94 @@
+"""
+Javobni bo'laklab (stream) ko'rsatish
+
+GPT javobi kelishi bilan "⏳ Iltimos kuting" xabari STREAM_EDIT_INTERVAL
+soniyada bir martadan ko'p bo'lmagan tezlikda tahrirlanadi (Telegram edit
+limitlari). Matn 4096 belgidan oshsa, davomi yangi xabarlarda chiqadi.
+"""
+import asyncio
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+SENTINELS = ("MAVZU_TASHQARI", "МАВЗУ_ТАШҚАРИ", "JAVOB_TOPILMADI", "ЖАВОБ_ТОПИЛМАДИ")
+
+
+def may_be_sentinel(text: str) -> bool:
+    """
+    Javob boshi MAVZU_TASHQARI / JAVOB_TOPILMADI bo'lishi mumkinmi
+
+    True bo'lsa matn hali foydalanuvchiga ko'rsatilmaydi.
+    """
+    head = text.lstrip(" \n\"'«`*")
+    if not head:
+        return True
+    return any(s.startswith(head) or head.startswith(s) for s in SENTINELS)
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+    """Matnni Telegram limitiga sig'adigan qismlarga bo'lish (iloji bo'lsa qator oxiridan)"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+
+class StreamingReply:
+    """Kutish xabarini progressiv tahrirlab, kerak bo'lsa yangi xabarlar qo'shadi"""
+
+    def __init__(self, waiting_message, reply_to, interval: float):
+        self.reply_to = reply_to
+        self.interval = interval
+        self.messages = [waiting_message]
+        self.shown = [waiting_message.text]
+        self._next_edit = 0.0
+
+    async def update(self, text: str):
+        """Oraliq holat (rate-limit bilan)"""
+        if time.monotonic() < self._next_edit:
+            return
+        await self._render(text + " ▌")
+        self._next_edit = time.monotonic() + self.interval
+
+    async def finish(self, text: str):
+        """Yakuniy matnni ko'rsatish"""
+        await self._render(text, final=True)
+
+    async def _render(self, text: str, final: bool = False):
+        parts = split_message(text)
+        for i, part in enumerate(parts):
+            if i < len(self.messages):
+                if self.shown[i] == part:
+                    continue
+                try:
+                    await self.messages[i].edit_text(part)
+                except RetryAfter as e:
+                    if not final:
+                        # Oraliq tahrirni o'tkazib yuborib, limit tugashini kutish
+                        self._next_edit = time.monotonic() + e.retry_after
+                        return
+                    await asyncio.sleep(e.retry_after)
+                    await self.messages[i].edit_text(part)
+                except BadRequest:
+                    if final:
+                        raise
+                    continue
+                self.shown[i] = part
+            else:
+                message = await self.reply_to.reply_text(part)
+                self.messages.append(message)
+                self.shown.append(part)
+
+        # Javob qisqarib qolgan bo'lsa (masalan, sentinel xabariga almashtirilganda) ortiqcha xabarlarni o'chirish
+        if final:
+            while len(self.messages) > len(parts):
+                await self.messages.pop().delete()
+                self.shown.pop()
@@ -1,3 +1,907 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from telegram import Chat, Message, Update, User
+
+from bot import handlers
+from bot.answer_cache import AnswerCache
+from bot.budget import DailyBudget, context_budget
+from bot.chat_order import ChatOrderedUpdateProcessor
+from bot.conversation_log import ConversationWriter
+from bot.intents import IntentRouter
+from bot.models import Conversation, TelegramUser, UpdateQueue
+from bot.webhook import TelegramWebhookApp
+from bot.streaming import StreamingReply, may_be_sentinel, split_message
+from bot.management.commands.bench_answers import QUESTIONS, _tag
+from bot.worker_queue import QueueWorker, claim_partitions, ensure_partitions, heartbeat
+from rag import chunker, lexical, tokens, vectordb
+from rag.batching import MicroBatcher
+from rag.context import SEPARATOR, build_context
+from rag.embedding_cache import EmbeddingCache
+from rag.numpy_index import NumpyIndex
+from rag.retrieval_cache import RetrievalCache
+from rag.translit import normalize_query, to_cyrillic, to_latin
+
+
+def _update(update_id: int, chat_id: int) -> Update:
+    chat = Chat(chat_id, 'private')
+    return Update(update_id, message=Message(update_id, datetime.now(), chat, from_user=User(chat_id, 'u', False)))
+
+
+class ChatOrderedUpdateProcessorTests(SimpleTestCase):
+    async def test_same_chat_in_order_other_chats_parallel(self):
+        processor = ChatOrderedUpdateProcessor(256)
+        log = []
+
+        async def work(update_id, chat_id, delay):
+            log.append(('start', chat_id, update_id))
+            await asyncio.sleep(delay)
+            log.append(('end', chat_id, update_id))
+
+        plan = [(1, 0.05), (1, 0), (2, 0.01), (1, 0)]
+        await asyncio.gather(*(
+            processor.process_update(_update(i, chat_id), work(i, chat_id, delay))
+            for i, (chat_id, delay) in enumerate(plan)
+        ))
+
+        chat_1 = [(event, i) for event, chat_id, i in log if chat_id == 1]
+        self.assertEqual(chat_1, [('start', 0), ('end', 0), ('start', 1), ('end', 1), ('start', 3), ('end', 3)])
+        # 2-chat 1-chatning sekin update i tugashini kutmaydi
+        self.assertLess(log.index(('end', 2, 2)), log.index(('end', 1, 0)))
+        self.assertEqual(processor._chats, {})
+
+    async def test_flooding_chat_does_not_starve_other_chats(self):
+        processor = ChatOrderedUpdateProcessor(2)
+        finished = []
+
+        async def work(update_id, chat_id):
+            await asyncio.sleep(0.02)
+            finished.append((chat_id, update_id))
+
+        # 1-chat 20 ta xabar yubordi, keyin 2-chatdan bitta xabar keldi
+        updates = [(i, 1) for i in range(20)] + [(20, 2)]
+        tasks = [asyncio.ensure_future(processor.process_update(_update(i, chat_id), work(i, chat_id)))
+                 for i, chat_id in updates]
+        await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+        # 2-chat 1-chatning ikkinchi update i bilan birga tugaydi, navbat oxirida emas
+        self.assertLessEqual(finished.index((2, 20)), 2)
+        self.assertEqual([i for chat_id, i in finished if chat_id == 1], list(range(20)))
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'embeddings.sqlite3')
+
+    def test_disk_roundtrip(self):
+        EmbeddingCache(self.path).set("Ekspertiza  muddati", "m", [0.5, 0.25])
+        cache = EmbeddingCache(self.path)
+        self.assertIsNone(cache.get_memory("ekspertiza muddati", "m"))
+        self.assertEqual(cache.get("ekspertiza muddati", "m"), [0.5, 0.25])
+        self.assertEqual(cache.disk_hits, 1)
+
+    def test_locked_database_is_a_miss(self):
+        cache = EmbeddingCache(self.path)
+        cache._db.execute("PRAGMA busy_timeout = 0")
+        # Boshqa worker yozish qulfini ushlab turibdi
+        locker = sqlite3.connect(self.path)
+        self.addCleanup(locker.close)
+        locker.execute("BEGIN IMMEDIATE")
+
+        cache.set("savol", "m", [1.0])
+        self.assertEqual(cache.errors, 1)
+        # Diskka yozilmagan bo'lsa ham xotirada qoladi
+        self.assertEqual(cache.get_memory("savol", "m"), [1.0])
+
+        cache._db.close()
+        self.assertIsNone(cache.get("boshqa savol", "m"))
+        self.assertEqual((cache.errors, cache.misses), (2, 1))
+
+
+@override_settings(BOT_QUEUE_PARTITIONS=4)
+class PartitionHandoffTests(TransactionTestCase):
+    async def test_handoff_waits_for_in_flight_update_without_blocking_heartbeat(self):
+        started = asyncio.Event()
+        finish = asyncio.Event()
+        handled = []
+
+        class App:
+            bot = None
+
+            async def process_update(self, update):
+                handled.append(update.update_id)
+                started.set()
+                await finish.wait()
+
+        worker = QueueWorker(App())
+        worker.worker_id = 'a'
+        await ensure_partitions()
+        await worker._rebalance()
+        self.assertEqual(set(worker.consumers), {0, 1, 2, 3})
+
+        # 3-bo'limda bitta update bajarilmoqda, yana biri navbatda
+        for update_id in (1, 2):
+            worker.pending.add(update_id)
+            worker.consumers[3][0].put_nowait({'id': update_id, 'partition': 3, 'payload': {'update_id': update_id}})
+        await started.wait()
+
+        # Ikkinchi worker paydo bo'ldi - ulush 2 ta bo'lim
+        await heartbeat('b')
+        await asyncio.wait_for(worker._rebalance(), 1)
+        self.assertEqual(set(worker.consumers), {0, 1})
+        # Navbatdagi update yangi egaga qoldi, bajarilayotgani emas
+        self.assertEqual(worker.pending, {1})
+        while 2 in worker.releasing:
+            await asyncio.sleep(0.01)
+        self.assertEqual(worker.releasing, {3})
+
+        # Update bajarilayotganda ham heartbeat ijarani uzaytiradi - b faqat bo'sh bo'limni oladi
+        await asyncio.wait_for(worker._rebalance(), 1)
+        self.assertEqual(await claim_partitions('b', 2), {2})
+
+        finish.set()
+        await asyncio.gather(*worker._handoffs)
+        self.assertEqual(await claim_partitions('b', 1), {3})
+        self.assertEqual(handled, [1])
+
+    @override_settings(BOT_QUEUE_BATCH_SIZE=5, BOT_QUEUE_PARTITION_PREFETCH=2, BOT_QUEUE_POLL_INTERVAL=0.01)
+    async def test_hot_partition_does_not_starve_others(self):
+        finish = asyncio.Event()
+        handled = []
+
+        class App:
+            bot = None
+
+            async def process_update(self, update):
+                handled.append(update.update_id)
+                if update.update_id <= 20:
+                    await finish.wait()
+
+        # 0-bo'limda 20 ta update to'planib qolgan, 1-bo'limda bitta
+        await UpdateQueue.objects.abulk_create(
+            [UpdateQueue(id=i, partition=0, chat_id=4, payload={'update_id': i}) for i in range(1, 21)]
+            + [UpdateQueue(id=21, partition=1, chat_id=1, payload={'update_id': 21})]
+        )
+        worker = QueueWorker(App())
+        worker.worker_id = 'a'
+        task = asyncio.create_task(worker.run())
+        try:
+            for _ in range(200):
+                if 21 in handled:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(handled, [1, 21])
+            # Bajarilayotgan 1 ta + navbatda ko'pi bilan 2 ta
+            self.assertLessEqual(worker.consumers[0][0].qsize(), 2)
+            self.assertLessEqual(len([i for i in worker.pending if i <= 20]), 3)
+        finally:
+            worker.stop()
+            finish.set()
+            await asyncio.wait_for(task, 2)
+
+    async def test_stop_during_claim_releases_partitions(self):
+        worker = QueueWorker(SimpleNamespace(bot=None))
+        worker.worker_id = 'a'
+        await ensure_partitions()
+
+        async def claim_then_stop(worker_id, count):
+            claimed = await claim_partitions(worker_id, count)
+            worker.stop()
+            return claimed
+
+        with mock.patch('bot.worker_queue.claim_partitions', claim_then_stop):
+            await worker._rebalance()
+        self.assertEqual(worker.consumers, {})
+        self.assertEqual(await claim_partitions('b', 4), {0, 1, 2, 3})
+
+
+class IndexVersionTests(SimpleTestCase):
+    def setUp(self):
+        import chromadb
+        import docx
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.docx = docx
+        self.embedded = []
+
+        def embed(texts):
+            self.embedded.extend(texts)
+            return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+
+        client = chromadb.PersistentClient(path=self.tmp.name)
+        for name, value in (
+            ('client', client),
+            ('CHROMA_PATH', self.tmp.name),
+            ('_resolved', {}),
+            ('_collections', {}),
+            ('get_embeddings_batch', embed),
+            ('embedding_checkpoint', mock.Mock()),
+            ('retrieval_cache', RetrievalCache(os.path.join(self.tmp.name, 'retrieval.sqlite3'), 10)),
+        ):
+            patcher = mock.patch.object(vectordb, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Bir nechta add ga bo'linishini tekshirish uchun kichik partiya
+        patcher = mock.patch.object(client, 'get_max_batch_size', return_value=2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, name: str, paragraphs: list) -> str:
+        document = self.docx.Document()
+        for paragraph in paragraphs:
+            document.add_paragraph(paragraph)
+        path = os.path.join(self.tmp.name, name)
+        document.save(path)
+        return path
+
+    def _rows(self, collection_name: str = None) -> dict:
+        collection = vectordb.client.get_collection(collection_name) if collection_name else vectordb.get_collection()
+        stored = collection.get(include=['embeddings', 'metadatas'])
+        return {
+            chunk_id: (metadata['source'], [float(value) for value in embedding])
+            for chunk_id, metadata, embedding in zip(stored['ids'], stored['metadatas'], stored['embeddings'])
+        }
+
+    def test_other_sources_are_carried_without_reembedding(self):
+        rules = self._write('a.docx', [f"Modda {i}. " + f"alfa{i} " * 300 for i in range(5)])
+        decree = self._write('b.docx', [f"Modda {i}. " + f"beta{i} " * 300 for i in range(3)])
+
+        first = vectordb.index_rules(rules)
+        before = self._rows()
+        self.embedded.clear()
+        second = vectordb.index_rules(decree)
+        after = self._rows()
+
+        self.assertEqual(second['kept'], len(before))
+        # a.docx qatorlari embeddinglari bilan ko'chirildi, faqat b.docx embed qilindi
+        self.assertEqual({k: v for k, v in after.items() if v[0] == 'a.docx'}, before)
+        self.assertEqual(len(self.embedded), second['added'])
+        self.assertEqual(len(after), len(before) + second['added'])
+        self.assertNotEqual(first['collection'], second['collection'])
+        self.assertEqual(vectordb._read_alias('eco_rules')[0], second['collection'])
+        self.assertEqual(len(lexical.load_index(vectordb._lexical_path(second['collection'])).ids), len(after))
+
+    def test_alias_swap_keeps_old_version_and_drops_older(self):
+        paragraphs = [f"Modda {i}. " + f"alfa{i} " * 300 for i in range(5)]
+        rules = self._write('a.docx', paragraphs)
+        v1 = vectordb.index_rules(rules)['collection']
+        old_rows = self._rows(v1)
+
+        paragraphs[2] = "O'zgargan modda " + "x " * 300
+        self._write('a.docx', paragraphs)
+        v2 = vectordb.index_rules(rules)['collection']
+        # Eski versiya o'zgarmaydi - undan o'qiyotgan jarayonlar yarim yangilangan indeksni ko'rmaydi
+        self.assertEqual(self._rows(v1), old_rows)
+        self.assertEqual(vectordb.get_index_version(), f"{v2}:0")
+
+        paragraphs[3] = "Yana bir modda " + "y " * 300
+        self._write('a.docx', paragraphs)
+        v3 = vectordb.index_rules(rules)['collection']
+        self.assertEqual([name for _, name in vectordb._list_versions('eco_rules')], [v2, v3])
+        self.assertFalse(os.path.exists(vectordb._lexical_path(v1)))
+        self.assertTrue(os.path.exists(vectordb._lexical_path(v2)))
+
+
+def _baseline_chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> list:
+    """Streaming chunker dan oldingi chunk_text (ro'yxat bilan) - solishtirish uchun"""
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for para in [p.strip() for p in text.split('\n') if p.strip()]:
+        words = para.split()
+        if len(words) > chunk_size:
+            if current_chunk:
+                chunks.append(' '.join(current_chunk))
+                current_chunk = []
+                current_length = 0
+            for i in range(0, len(words), chunk_size - overlap):
+                chunks.append(' '.join(words[i:i + chunk_size]))
+        elif current_length + len(words) > chunk_size:
+            chunks.append(' '.join(current_chunk))
+            overlap_words = ' '.join(current_chunk).split()[-overlap:] if overlap > 0 else []
+            current_chunk = overlap_words + [para]
+            current_length = len(overlap_words) + len(words)
+        else:
+            current_chunk.append(para)
+            current_length += len(words)
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+
+class StreamingChunkerTests(SimpleTestCase):
+    def test_matches_baseline_on_rules_files(self):
+        import docx
+
+        for name in ('rules.docx', 'rules_ru.docx'):
+            path = os.path.join(settings.BASE_DIR, name)
+            if not os.path.exists(path):
+                continue
+            with self.subTest(name):
+                text = "".join(paragraph.text + "\n" for paragraph in docx.Document(path).paragraphs)
+                self.assertEqual(list(chunker.iter_chunks(chunker.iter_paragraphs(path))), _baseline_chunk_text(text))
+                self.assertEqual(chunker.chunk_text(chunker.load_docx(path)), _baseline_chunk_text(text))
+
+    def test_matches_baseline_on_edge_cases(self):
+        text = "\n".join([
+            "qisqa band",
+            "  ",
+            " ".join(f"uzun{i}" for i in range(23)),
+            "a b c d e f",
+            "g h i",
+            " ".join(f"s{i}" for i in range(9)),
+            "oxirgi",
+        ])
+        for chunk_size, overlap in ((10, 3), (10, 0), (6, 5), (500, 100)):
+            with self.subTest(chunk_size=chunk_size, overlap=overlap):
+                self.assertEqual(
+                    list(chunker.iter_chunks(iter(text.split('\n')), chunk_size, overlap)),
+                    _baseline_chunk_text(text, chunk_size, overlap)
+                )
+
+
+def _result(text: str, index=None, source='rules.docx', **metadata) -> dict:
+    return {'text': text, 'score': 0.0, 'metadata': {'source': source, 'chunk_index': index, **metadata}}
+
+
+class BuildContextTests(SimpleTestCase):
+    def test_default_budget_keeps_ten_word_chunks(self):
+        if settings.CHUNKER != 'words':
+            self.skipTest("CHUNKER='words' uchun")
+        for name in ('rules.docx', 'rules_ru.docx'):
+            path = os.path.join(settings.BASE_DIR, name)
+            if not os.path.exists(path):
+                continue
+            with self.subTest(name):
+                chunks = chunker.chunk_text(chunker.load_docx(path))
+                # Qo'shni bo'lmagan (birlashmaydigan) eng uzun chunklar - avval GPT ga 10 tasi yuborilardi
+                indices = sorted(range(0, len(chunks), 2), key=lambda i: -len(chunks[i]))[:10]
+                results = [_result(chunks[i], i, name) for i in indices]
+                context = build_context(results[:settings.RAG_N_RESULTS], settings.RAG_CONTEXT_TOKENS)
+                self.assertEqual(len(context.split(SEPARATOR)), 10)
+
+    def test_prompt_cap_keeps_word_chunks_in_downgrade(self):
+        if settings.CHUNKER != 'words':
+            self.skipTest("CHUNKER='words' uchun")
+        path = os.path.join(settings.BASE_DIR, 'rules.docx')
+        if not os.path.exists(path):
+            self.skipTest("rules.docx yo'q")
+        chunks = chunker.chunk_text(chunker.load_docx(path))
+        results = [_result(chunks[i], i) for i in range(0, len(chunks), 2)][:settings.RAG_N_RESULTS]
+
+        def blocks(downgraded: bool) -> int:
+            context = vectordb._join_results(results, context_budget(700, downgraded=downgraded))
+            return len(context.split(SEPARATOR))
+
+        self.assertEqual(blocks(False), 10)
+        self.assertGreaterEqual(blocks(True), 5)
+        # Kichik cheklovda ham eng relevant chunklar qoladi
+        with override_settings(REQUEST_MAX_PROMPT_TOKENS=4000):
+            self.assertEqual(blocks(True), settings.RAG_MIN_CONTEXT_CHUNKS)
+
+    def test_min_chunks_are_kept_over_budget(self):
+        results = [_result("birinchi", 1, tokens=80), _result("ikkinchi", 3, tokens=80), _result("uchinchi", 5, tokens=5)]
+        self.assertEqual(build_context(results, 50), "uchinchi")
+        self.assertEqual(build_context(results, 50, min_chunks=2), SEPARATOR.join(["birinchi", "ikkinchi"]))
+
+    def test_near_duplicates_are_dropped(self):
+        words = [f"soz{i}" for i in range(20)]
+        results = [
+            _result(" ".join(words), 0),
+            _result(" ".join(words[:19] + ["boshqa"]), 5, source='b.docx'),
+            _result("butunlay boshqa matn", 7),
+        ]
+        self.assertEqual(build_context(results, 1000), " ".join(words) + SEPARATOR + "butunlay boshqa matn")
+
+    def test_adjacent_chunks_are_merged_without_overlap(self):
+        results = [
+            _result("c d e f", 2),
+            _result("a b c d", 1),
+            _result("1-боб. Умумий қоидалар\nx y", 3, chapter_title="1-боб. Умумий қоидалар"),
+        ]
+        self.assertEqual(build_context(results, 1000), "a b c d e f\nx y")
+
+    def test_budget_skips_large_chunks_and_orders_by_position(self):
+        results = [
+            _result("birinchi", 9, tokens=60),
+            _result("juda katta", 1, tokens=50),
+            _result("kichik", 4, tokens=30),
+            _result("joylashuvsiz", None, tokens=10),
+        ]
+        self.assertEqual(build_context(results, 100), SEPARATOR.join(["kichik", "birinchi", "joylashuvsiz"]))
+
+
+class NumpyIndexTests(SimpleTestCase):
+    def test_top_k_agrees_with_chroma(self):
+        import chromadb
+        import numpy as np
+
+        rng = np.random.default_rng(17)
+        # OpenAI embeddinglari kabi birlik uzunlikdagi vektorlar
+        embeddings = rng.normal(size=(300, 32)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        ids = [f"c{i}" for i in range(len(embeddings))]
+        documents = [f"chunk {i}" for i in range(len(embeddings))]
+        metadatas = [{'chunk_index': i} for i in range(len(embeddings))]
+        queries = rng.normal(size=(20, 32))
+        queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).tolist()
+
+        with tempfile.TemporaryDirectory() as path:
+            collection = chromadb.PersistentClient(path=path).create_collection(name="agreement")
+            collection.add(ids=ids, embeddings=embeddings.tolist(), documents=documents, metadatas=metadatas)
+            with mock.patch.object(vectordb, 'get_collection', lambda lang="uz": collection), \
+                    override_settings(VECTOR_BACKEND='chroma'):
+                expected = vectordb._query_many("uz", queries, 10)
+
+        for dtype, min_recall in (('float32', 1.0), ('float16', 1.0), ('int8', 0.9)):
+            index = NumpyIndex.build(ids, embeddings, documents, metadatas, dtype)
+            with mock.patch.object(vectordb, 'get_numpy_index', lambda lang="uz": index), \
+                    override_settings(VECTOR_BACKEND='numpy'):
+                actual = vectordb._query_many("uz", queries, 10)
+            with self.subTest(dtype):
+                found = sum(
+                    len({r['id'] for r in a} & {r['id'] for r in e}) for a, e in zip(actual, expected)
+                )
+                self.assertGreaterEqual(found / (10 * len(queries)), min_recall)
+                if dtype == 'float32':
+                    for a, e in zip(actual, expected):
+                        self.assertEqual([r['id'] for r in a], [r['id'] for r in e])
+                        self.assertEqual([r['metadata'] for r in a], [r['metadata'] for r in e])
+                        # Bir xil shkala: l2 masofa kvadrati = 2 - 2 * kosinus
+                        for ra, re_ in zip(a, e):
+                            self.assertAlmostEqual(ra['score'], re_['score'], places=4)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    async def test_results_fan_out_per_key(self):
+        calls = []
+
+        async def handler(key, items):
+            calls.append((key, items))
+            await asyncio.sleep(0)
+            return [f"{key}:{item}" for item in items]
+
+        batcher = MicroBatcher(handler, 0.01, 3)
+        results = await asyncio.gather(*(
+            batcher.submit(key, item) for key, item in [('uz', 1), ('ru', 2), ('uz', 3), ('uz', 4), ('uz', 5)]
+        ))
+
+        self.assertEqual(results, ['uz:1', 'ru:2', 'uz:3', 'uz:4', 'uz:5'])
+        # 'uz' uchun max_size ga yetgan batch darhol, qolgani window tugaganda yuborildi
+        self.assertEqual(sorted(calls), [('ru', [2]), ('uz', [1, 3, 4]), ('uz', [5])])
+        self.assertEqual(batcher.stats(), {'batches': 3, 'items': 5, 'average': 5 / 3})
+
+    async def test_errors_fan_out_to_the_failed_batch_only(self):
+        async def handler(key, items):
+            if key == 'bad':
+                raise ValueError("API xatoligi")
+            if key == 'short':
+                return items[:1]
+            return items
+
+        batcher = MicroBatcher(handler, 0.01, 10)
+        results = await asyncio.gather(
+            batcher.submit('bad', 1), batcher.submit('ok', 2), batcher.submit('bad', 3),
+            batcher.submit('short', 4), batcher.submit('short', 5),
+            return_exceptions=True
+        )
+
+        self.assertIsInstance(results[0], ValueError)
+        self.assertIs(results[0], results[2])
+        self.assertEqual(results[1], 2)
+        # Natijalar yetishmasa hech kim abadiy kutib qolmaydi
+        self.assertIsInstance(results[3], RuntimeError)
+        self.assertIsInstance(results[4], RuntimeError)
+
+    async def test_cancelled_caller_does_not_break_the_batch(self):
+        async def handler(key, items):
+            await asyncio.sleep(0.01)
+            return items
+
+        batcher = MicroBatcher(handler, 0.01, 10)
+        cancelled = asyncio.ensure_future(batcher.submit('uz', 1))
+        kept = asyncio.ensure_future(batcher.submit('uz', 2))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        self.assertEqual(await kept, 2)
+
+
+class IdentifierQueryTests(SimpleTestCase):
+    def test_mostly_numbers_is_identifier_query(self):
+        self.assertTrue(lexical.is_identifier_query("541"))
+        self.assertTrue(lexical.is_identifier_query("541-son 12.1"))
+        self.assertTrue(lexical.is_identifier_query("savol 1697000000 3"))
+        self.assertFalse(lexical.is_identifier_query("541-son qarorning 12-bandi nima deydi?"))
+        self.assertFalse(lexical.is_identifier_query("Ekspertiza muddati qancha?"))
+        self.assertFalse(lexical.is_identifier_query(""))
+
+    def test_shortcut_only_when_lexical_found_something(self):
+        queries = ["541", "12.1", "Ekspertiza muddati qancha?"]
+        hits = [[{'id': 'a', 'text': '541-son', 'score': 1.0}], [], [{'id': 'b', 'text': 'muddat', 'score': 1.0}]]
+        self.assertEqual(vectordb._needs_vectors(queries, hits), [1, 2])
+
+    def test_bench_questions_take_the_full_pipeline(self):
+        for i in range(len(QUESTIONS) * 30):
+            question = f"{QUESTIONS[i % len(QUESTIONS)]} ({_tag(i)})"
+            self.assertFalse(lexical.is_identifier_query(question), question)
+        self.assertEqual(len({_tag(i) for i in range(1000)}), 1000)
+
+
+class RetrievalCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'retrievals.sqlite3')
+        self.cache = RetrievalCache(self.path)
+
+    def test_index_version_bump_invalidates(self):
+        self.cache.set("Ekspertiza muddati?", "uz", 3, "rules_v1:0", [("a", 0.5)])
+        self.assertEqual(self.cache.get("ekspertiza  muddati?", "uz", 3, "rules_v1:0"), [("a", 0.5)])
+        self.assertIsNone(self.cache.get("Ekspertiza muddati?", "uz", 3, "rules_v1:1"))
+
+        self.cache.set("Ekspertiza muddati?", "uz", 3, "rules_v2:0", [("b", 0.4)])
+        self.assertEqual(self.cache.prune("uz", "rules_v2:0"), 1)
+        fresh = RetrievalCache(self.path)
+        self.assertIsNone(fresh.get("Ekspertiza muddati?", "uz", 3, "rules_v1:0"))
+        self.assertEqual(fresh.get("Ekspertiza muddati?", "uz", 3, "rules_v2:0"), [("b", 0.4)])
+
+    def test_sqlite_errors_are_misses(self):
+        self.cache._db.close()
+        self.cache.set("savol", "uz", 3, "v", [("a", 1.0)])
+        self.assertEqual(self.cache.get("savol", "uz", 3, "v"), [("a", 1.0)])
+        self.assertIsNone(self.cache.get("boshqa savol", "uz", 3, "v"))
+        self.assertEqual((self.cache.errors, self.cache.misses), (2, 1))
+
+    @override_settings(RETRIEVAL_CACHE=True)
+    async def test_asearch_many_searches_again_after_version_bump(self):
+        version = ["rules_v1:0"]
+        searched = []
+
+        async def search_uncached(queries, n_results, lang):
+            searched.append((version[0], list(queries)))
+            return [[{'id': version[0], 'text': query, 'score': 0.1}] for query in queries]
+
+        def hydrate(lang, entries):
+            return [{'id': chunk_id, 'text': '', 'score': score} for chunk_id, score in entries]
+
+        async def stored():
+            # Kesh fonda (query_executor da) yoziladi
+            while not self.cache._memory:
+                await asyncio.sleep(0.01)
+
+        with mock.patch.object(vectordb, 'retrieval_cache', self.cache), \
+                mock.patch.object(vectordb, 'get_index_version', lambda lang="uz": version[0]), \
+                mock.patch.object(vectordb, '_asearch_many_uncached', search_uncached), \
+                mock.patch.object(vectordb, '_hydrate', hydrate):
+            await vectordb.asearch_many(["muddat"], 1, "ru")
+            await asyncio.wait_for(stored(), 1)
+            self.assertEqual((await vectordb.asearch_many(["muddat"], 1, "ru"))[0][0]['id'], "rules_v1:0")
+
+            version[0] = "rules_v2:0"
+            self.assertEqual((await vectordb.asearch_many(["muddat"], 1, "ru"))[0][0]['id'], "rules_v2:0")
+
+        self.assertEqual(searched, [("rules_v1:0", ["muddat"]), ("rules_v2:0", ["muddat"])])
+
+
+class TranslitTests(SimpleTestCase):
+    # rules.docx dagi so'zlar (kirill)
+    CORPUS_WORDS = [
+        "экспертизаси", "ўтказилади", "маълумот", "ёки", "йўриқнома", "ҳужжатлар", "қўмитаси",
+        "ғалла", "концепциясини", "ер", "аэропорт", "шунингдек", "чиқиндилар", "юзасидан", "таъсирни",
+    ]
+
+    def test_corpus_words_round_trip(self):
+        for word in self.CORPUS_WORDS:
+            self.assertEqual(to_cyrillic(to_latin(word)), word)
+            self.assertEqual(to_cyrillic(to_latin(word.capitalize())), word.capitalize())
+
+    def test_both_scripts_normalize_to_corpus_script(self):
+        pairs = [
+            ("Давлат экологик экспертизаси қанча муддатда ўтказилади?",
+             "Davlat ekologik ekspertizasi qancha muddatda o‘tkaziladi?"),
+            ("Атроф-муҳитга таъсирни баҳолаш учун қандай ҳужжатлар керак?",
+             "Atrof-muhitga ta'sirni baholash uchun qanday hujjatlar kerak?"),
+            ("541-сон қарорнинг 12-банди", "541-son qarorning 12-bandi"),
+        ]
+        for cyrillic, latin in pairs:
+            self.assertEqual(normalize_query(latin), normalize_query(cyrillic))
+            self.assertEqual(normalize_query(latin), " ".join(cyrillic.lower().split()))
+
+    @override_settings(UZ_CORPUS_SCRIPT='latin')
+    def test_latin_corpus(self):
+        self.assertEqual(normalize_query("Экспертиза  хулосаси"), "ekspertiza xulosasi")
+        self.assertEqual(normalize_query("Ekspertiza xulosasi"), "ekspertiza xulosasi")
+
+
+class IntentRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = IntentRouter.load(settings.INTENTS_PATH)
+
+    def test_canned_intents(self):
+        cases = {
+            "Assalomu alaykum": ['greeting'],
+            "Сен кимсан?": ['about_bot'],
+            "Katta rahmat!": ['thanks'],
+            "Спасибо большое": ['thanks'],
+            "Telefon raqamingiz?": ['contacts'],
+            "Markazning telefon raqami qanaqa?": ['contacts'],
+            "Murojaat qilish uchun telefon raqami": ['contacts'],
+            "Qanday bog‘lansam bo'ladi?": ['contacts'],
+            "Как связаться с вами?": ['contacts'],
+            "Контакты": ['contacts'],
+        }
+        for text, names in cases.items():
+            self.assertEqual(self.router.match(text), names, text)
+
+    def test_questions_are_not_swallowed(self):
+        for text in [
+            "Ekspertiza uchun ariza berishda telefon raqam kerakmi?",
+            "Arizada telefon raqam ko'rsatilmasa nima bo'ladi?",
+            "Аризада телефон рақам кўрсатилиши шартми?",
+            "Нужно ли указывать номер телефона в заявлении на экспертизу?",
+            "Rahmat, lekin ekspertiza muddati qancha bo'ladi?",
+            "Ekspertiza xulosasi necha kunda beriladi?",
+            "Telefonda murojaat qilsam ariza qabul qilinadimi?",
+        ]:
+            self.assertEqual(self.router.match(text), [], text)
+
+    def test_answer_appends_follow_up(self):
+        answer, names = self.router.answer("Salom", 'latin')
+        self.assertEqual(names, ['greeting', 'about_bot'])
+        self.assertTrue(answer.startswith("Vaalaykum assalom!"))
+
+
+class AnswerCachePolicyTests(SimpleTestCase):
+    def setUp(self):
+        self.requests = []
+
+        async def create(**request):
+            self.requests.append(request['model'])
+            usage = SimpleNamespace(prompt_tokens=100, completion_tokens=10, total_tokens=110)
+            message = SimpleNamespace(content=f"{request['model']} javobi")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+        async def version(lang="uz"):
+            return "rules_v1:0"
+
+        async def embedding(text):
+            return [1.0, 0.0]
+
+        async def context(*args, **kwargs):
+            return "kontekst"
+
+        async def refresh():
+            pass
+
+        self.route = 'complex'
+
+        async def classify(question, context):
+            return self.route, None
+
+        for name, value in {
+            'client': SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))),
+            'aget_index_version': version,
+            'aget_embedding': embedding,
+            'aget_context': context,
+            'classify_question': classify,
+            'faq_index': SimpleNamespace(refresh=refresh, lookup=lambda alphabet, embedding: None),
+            'answer_cache': AnswerCache(10, 0.05),
+            'daily_budget': DailyBudget(0, 0.8, 60, SimpleNamespace(written_cost=Decimal('0'), dropped_cost=Decimal('0'))),
+        }.items():
+            patcher = mock.patch.object(handlers, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @override_settings(MODEL_ROUTING=True, SIMPLE_MODEL='small', ANSWER_MODEL='big')
+    async def test_only_primary_model_answers_are_cached(self):
+        self.route = 'simple'
+        first = await handlers.generate_answer("Ekspertiza muddati qancha?", 'latin')
+        self.assertEqual((first['model'], first['route']), ('small', 'simple'))
+        self.assertGreater(first['cost'], 0)
+
+        # Arzon model javobi keshlanmagan - keyingi savol katta modelga boradi
+        self.route = 'complex'
+        second = await handlers.generate_answer("Ekspertiza muddati qancha?", 'latin')
+        self.assertEqual(second['model'], 'big')
+
+        third = await handlers.generate_answer("Ekspertiza muddati qancha?", 'latin')
+        self.assertEqual((third['route'], third['answer'], third['cost']), ('cache', "big javobi", Decimal('0')))
+        self.assertEqual(self.requests, ['small', 'big'])
+
+
+class BudgetAccountingTests(TransactionTestCase):
+    async def test_refresh_counts_spend_waiting_in_the_write_behind_queue(self):
+        user = await TelegramUser.objects.acreate(telegram_id=1)
+        writer = ConversationWriter(batch_size=100, flush_interval=60, max_queue=100, put_timeout=1)
+        writer.start()
+        budget = DailyBudget(1.0, 0.8, 60, writer)
+        await budget.refresh(force=True)
+        self.assertEqual(budget.spent, Decimal('0'))
+
+        async def answer(cost):
+            budget.add(Decimal(cost))
+            await writer.put(Conversation(user=user, question="savol", answer="javob", cost=Decimal(cost)))
+
+        # Boshqa worker ning xarajati faqat DB da
+        await Conversation.objects.acreate(user=user, question="savol", answer="javob", cost=Decimal('0.1'))
+        await answer('0.3')
+        await budget.refresh(force=True)
+        self.assertEqual(budget.spent, Decimal('0.4'))
+
+        # Navbat yozilgandan keyin xarajat ikki marta sanalmaydi
+        await writer.close()
+        self.assertEqual(budget.spent, Decimal('0.4'))
+        await budget.refresh(force=True)
+        self.assertEqual(budget.spent, Decimal('0.4'))
+        self.assertEqual(budget.mode(), 'ok')
+
+        budget.add(Decimal('0.45'))
+        self.assertEqual(budget.mode(), 'downgrade')
+        await budget.refresh(force=True)
+        self.assertEqual(budget.spent, Decimal('0.85'))
+        budget.add(Decimal('0.2'))
+        self.assertEqual(budget.mode(), 'refuse')
+
+    async def test_dropped_records_are_not_counted_as_pending(self):
+        user = await TelegramUser.objects.acreate(telegram_id=1)
+
+        def conversation(cost):
+            return Conversation(user=user, question="savol", answer="javob", cost=Decimal(cost))
+
+        # Navbatni hech kim o'qimaydi - ikkinchi yozuv sig'maydi va tashlanadi
+        full = ConversationWriter(batch_size=100, flush_interval=60, max_queue=1, put_timeout=0.01)
+        with mock.patch.object(full, '_run', asyncio.Event().wait):
+            full.start()
+        self.addCleanup(full._task.cancel)
+        budget = DailyBudget(1.0, 0.8, 60, full)
+        await budget.refresh(force=True)
+        for cost in ('0.3', '0.5'):
+            budget.add(Decimal(cost))
+            await full.put(conversation(cost))
+        self.assertEqual((full.dropped, full.dropped_cost), (1, Decimal('0.5')))
+        self.assertEqual(budget.spent, Decimal('0.3'))
+
+        # Guruh DB ga yozilmadi
+        failing = ConversationWriter(batch_size=100, flush_interval=60, max_queue=100, put_timeout=1)
+        failing.start()
+        budget = DailyBudget(1.0, 0.8, 60, failing)
+        await budget.refresh(force=True)
+        budget.add(Decimal('0.4'))
+        await failing.put(conversation('0.4'))
+        with mock.patch('bot.conversation_log.bulk_save_conversations',
+                        mock.AsyncMock(side_effect=RuntimeError("DB mavjud emas"))):
+            await failing.close()
+        self.assertEqual(failing.dropped_cost, Decimal('0.4'))
+        self.assertEqual(budget.spent, Decimal('0'))
+        await budget.refresh(force=True)
+        self.assertEqual(budget.spent, Decimal('0'))
+
+
+class TokenizerStartupTests(SimpleTestCase):
+    async def test_encoding_is_loaded_off_the_event_loop(self):
+        threads = []
+
+        def get_encoding(name):
+            threads.append(threading.current_thread())
+            raise OSError("internet yo'q")
+
+        with mock.patch.object(tokens, '_encoding', None), \
+                mock.patch.object(tokens.tiktoken, 'get_encoding', get_encoding), \
+                mock.patch.object(handlers, 'conversation_writer', mock.Mock()), \
+                mock.patch.object(handlers, 'warm_up', lambda: None):
+            await handlers.on_startup(None)
+            self.assertEqual(len(threads), 1)
+            self.assertIsNot(threads[0], threading.current_thread())
+            # Keyingi sanashlar lug'atni qayta yuklamaydi
+            self.assertEqual(tokens.count_tokens("abcd"), 3)
+            self.assertEqual(len(threads), 1)
+
+
+class StreamingTests(SimpleTestCase):
+    def test_split_message(self):
+        self.assertEqual(split_message("qisqa javob", 20), ["qisqa javob"])
+        # Iloji bo'lsa qator oxiridan bo'linadi
+        self.assertEqual(split_message("birinchi qator\nikkinchi qator", 20), ["birinchi qator", "ikkinchi qator"])
+        # Qator yo'q - aniq limitda
+        self.assertEqual(split_message("a" * 45, 20), ["a" * 20, "a" * 20, "a" * 5])
+
+        text = "\n".join(f"{i}. " + "so'z " * (i % 40) for i in range(400))
+        parts = split_message(text)
+        self.assertTrue(all(len(part) <= 4096 for part in parts))
+        self.assertGreater(len(parts), 1)
+        self.assertEqual("\n".join(parts), text)
+
+    def test_may_be_sentinel(self):
+        for text in ["", "  ", "MAV", "JAVOB_TOP", "ЖАВОБ", "«МАВЗУ_ТАШҚАРИ»", "**JAVOB_TOPILMADI** ..."]:
+            self.assertTrue(may_be_sentinel(text), text)
+        for text in ["Ekspertiza", "Javob: 20 kun", "MAVZU haqida", "Экспертиза хулосаси"]:
+            self.assertFalse(may_be_sentinel(text), text)
+
+    async def test_final_render_shrinks_to_the_answer(self):
+        class FakeMessage:
+            def __init__(self, text):
+                self.text = text
+                self.deleted = False
+
+            async def edit_text(self, text):
+                self.text = text
+
+            async def delete(self):
+                self.deleted = True
+
+        sent = []
+
+        class Chat:
+            async def reply_text(self, text):
+                sent.append(FakeMessage(text))
+                return sent[-1]
+
+        waiting = FakeMessage("⏳")
+        reply = StreamingReply(waiting, Chat(), interval=0)
+        await reply.update("a" * 5000)
+        self.assertEqual((len(waiting.text), len(sent)), (4096, 1))
+
+        await reply.finish("JAVOB_TOPILMADI o'rniga qisqa xabar")
+        self.assertEqual(waiting.text, "JAVOB_TOPILMADI o'rniga qisqa xabar")
+        self.assertTrue(sent[0].deleted)
+        self.assertEqual(reply.messages, [waiting])
+
+
+@override_settings(BOT_WEBHOOK_SECRET='maxfiy', BOT_QUEUE_ENABLED=False)
+class WebhookSecretTests(SimpleTestCase):
+    async def _post(self, app, headers):
+        sent = []
+        body = json.dumps(_update(7, 42).to_dict()).encode()
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'path': settings.BOT_WEBHOOK_PATH, 'method': 'POST', 'headers': headers}
+        await app(scope, receive, send)
+        return sent[0]['status']
+
+    async def test_requests_without_the_secret_are_rejected(self):
+        app = TelegramWebhookApp(django_app=None)
+        app.bot_app = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+
+        self.assertEqual(await self._post(app, []), 403)
+        self.assertEqual(await self._post(app, [(b'x-telegram-bot-api-secret-token', b'boshqa')]), 403)
+        self.assertEqual(await self._post(app, [(b'x-telegram-bot-api-secret-token', b'maxfiy')]), 200)
+        self.assertEqual(app.bot_app.update_queue.get_nowait().update_id, 7)
+
+        with override_settings(BOT_WEBHOOK_SECRET=''):
+            self.assertEqual(await self._post(app, [(b'x-telegram-bot-api-secret-token', b'')]), 403)
+
+    @override_settings(BOT_WEBHOOK_SECRET='')
+    async def test_bot_does_not_start_without_a_secret(self):
+        with self.assertRaises(ImproperlyConfigured):
+            await TelegramWebhookApp(django_app=None)._start_bot()
+
+    def test_runbot_refuses_unsafe_webhook_setups(self):
+        with override_settings(BOT_WEBHOOK_SECRET=''):
+            with self.assertRaisesMessage(CommandError, "BOT_WEBHOOK_SECRET"):
+                call_command('runbot', mode='webhook')
+            with override_settings(BOT_WEBHOOK_URL='https://example.uz/telegram/webhook/'):
+                with self.assertRaisesMessage(CommandError, "BOT_WEBHOOK_SECRET"):
+                    call_command('runbot', set_webhook=True, mode='webhook')
+        with self.assertRaisesMessage(CommandError, "BOT_QUEUE_ENABLED"):
+            call_command('runbot', mode='webhook', workers=4)
@@ -0,0 +1,113 @@
+"""
+TelegramUser identifikatsiya keshi
+
+Har bir xabarda get_or_create (SELECT, ba'zan INSERT) qilmaslik uchun
+telegram_id -> TelegramUser.pk moslik xotirada saqlanadi. Kesh LRU + TTL
+bilan chegaralangan (USER_CACHE_SIZE, USER_CACHE_TTL), shuning uchun
+foydalanuvchilar soni ko'paysa ham xotira o'smaydi. Username/ism
+o'zgarsa, DB fonda yangilanadi.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from bot.db import db_sync_to_async
+from bot.models import TelegramUser
+
+
+def _names(telegram_user) -> tuple:
+    return (telegram_user.username, telegram_user.first_name, telegram_user.last_name)
+
+
+@db_sync_to_async
+def get_or_create_user(telegram_user) -> TelegramUser:
+    """Telegram user ni olish yoki yaratish (o'zgargan ismlarni ham yangilaydi)"""
+    user, created = TelegramUser.objects.get_or_create(
+        telegram_id=telegram_user.id,
+        defaults={
+            'username': telegram_user.username,
+            'first_name': telegram_user.first_name,
+            'last_name': telegram_user.last_name
+        }
+    )
+    if not created and (user.username, user.first_name, user.last_name) != _names(telegram_user):
+        user.username, user.first_name, user.last_name = _names(telegram_user)
+        user.save(update_fields=['username', 'first_name', 'last_name'])
+    return user
+
+
+@db_sync_to_async
+def update_user_names(telegram_id: int, names: tuple):
+    """Username va ismlarni yangilash"""
+    username, first_name, last_name = names
+    TelegramUser.objects.filter(telegram_id=telegram_id).update(
+        username=username,
+        first_name=first_name,
+        last_name=last_name
+    )
+
+
+class UserIdentityCache:
+    """telegram_id -> (pk, ismlar, muddati) LRU keshi"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int):
+        """(pk, ismlar) yoki None"""
+        with self._lock:
+            item = self._items.get(telegram_id)
+            if item is None or item[2] < time.monotonic():
+                self.misses += 1
+                return None
+            self._items.move_to_end(telegram_id)
+            self.hits += 1
+            return item[0], item[1]
+
+    def set(self, telegram_id: int, pk: int, names: tuple):
+        with self._lock:
+            self._items[telegram_id] = (pk, names, time.monotonic() + self.ttl)
+            self._items.move_to_end(telegram_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+user_cache = UserIdentityCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+# Fondagi yangilash tasklari (GC tomonidan yo'qotilmasligi uchun)
+_background_tasks = set()
+
+
+async def get_user_id(telegram_user) -> int:
+    """
+    Telegram user uchun TelegramUser.pk ni olish
+
+    Keshda bo'lsa DB ga murojaat qilinmaydi; ismlar o'zgargan bo'lsa
+    ular fonda yangilanadi.
+    """
+    names = _names(telegram_user)
+    cached = user_cache.get(telegram_user.id)
+
+    if cached is None:
+        user = await get_or_create_user(telegram_user)
+        user_cache.set(telegram_user.id, user.pk, names)
+        return user.pk
+
+    pk, cached_names = cached
+    if cached_names != names:
+        user_cache.set(telegram_user.id, pk, names)
+        task = asyncio.create_task(update_user_names(telegram_user.id, names))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return pk
@@ -0,0 +1,130 @@
+"""
+Webhook rejimi: Telegram update larini ASGI orqali qabul qilish
+
+config/asgi.py BOT_WEBHOOK_ENABLED=True bo'lganda Django ilovasini
+TelegramWebhookApp bilan o'raydi. BOT_WEBHOOK_PATH ga kelgan POST
+so'rovlar Update ga aylantirilib PTB Application.update_queue ga
+qo'yiladi, qolgan so'rovlar (admin panel) Django ga uzatiladi.
+
+BOT_WEBHOOK_SECRET majburiy: Telegram uni X-Telegram-Bot-Api-Secret-Token
+sarlavhasida yuboradi, sarlavhasiz yoki noto'g'ri so'rovlar 403 oladi
+(aks holda URL ni bilgan har kim soxta update yubora olardi). Secret
+bo'sh bo'lsa bot ishga tushmaydi.
+
+Har bir uvicorn worker o'z Application ini ishga tushiradi. Bitta chatning
+ketma-ket update lari turli workerlarga tushishi mumkin, shuning uchun
+bir nechta worker faqat BOT_QUEUE_ENABLED=True bilan ishlatiladi - update lar
+UpdateQueue ga yoziladi va `runbot --mode worker` jarayonlari ularni chat
+bo'yicha tartibda qayta ishlaydi:
+    BOT_QUEUE_ENABLED=True python manage.py runbot --mode webhook --workers 4
+"""
+import hmac
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from telegram import Update
+
+
+class TelegramWebhookApp:
+    """Django ASGI ilovasi oldidagi webhook endpoint"""
+
+    def __init__(self, django_app):
+        self.django_app = django_app
+        self.bot_app = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] == settings.BOT_WEBHOOK_PATH:
+            await self._webhook(scope, receive, send)
+        else:
+            await self.django_app(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self._start_bot()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self._stop_bot()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _start_bot(self):
+        # handlers django.setup() ni chaqiradi, shuning uchun kech import qilinadi
+        from bot.handlers import build_application
+
+        if not settings.BOT_WEBHOOK_SECRET:
+            raise ImproperlyConfigured("BOT_WEBHOOK_SECRET sozlanmagan - webhook har qanday POST ni qabul qilardi")
+        self.bot_app = build_application(polling=False)
+        await self.bot_app.initialize()
+        if self.bot_app.post_init:
+            await self.bot_app.post_init(self.bot_app)
+        await self.bot_app.start()
+        print("Bot webhook rejimida ishlamoqda...")
+
+    async def _stop_bot(self):
+        if self.bot_app is None:
+            return
+        await self.bot_app.stop()
+        await self.bot_app.shutdown()
+        if self.bot_app.post_shutdown:
+            await self.bot_app.post_shutdown(self.bot_app)
+        self.bot_app = None
+
+    async def _webhook(self, scope, receive, send):
+        if scope['method'] != 'POST':
+            await _respond(send, 405)
+            return
+
+        if self.bot_app is None:
+            # Bot hali ishga tushmagan yoki to'xtatilgan
+            await _respond(send, 503)
+            return
+
+        headers = dict(scope['headers'])
+        token = headers.get(b'x-telegram-bot-api-secret-token', b'').decode()
+        if not settings.BOT_WEBHOOK_SECRET or not hmac.compare_digest(token, settings.BOT_WEBHOOK_SECRET):
+            await _respond(send, 403)
+            return
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        try:
+            update = Update.de_json(json.loads(body), self.bot_app.bot)
+        except (ValueError, TypeError):
+            update = None
+        if update is None:
+            await _respond(send, 400)
+            return
+
+        if settings.BOT_QUEUE_ENABLED:
+            # Worker rejimi: update umumiy navbatga yoziladi (bot/worker_queue.py)
+            from bot.worker_queue import enqueue_update
+
+            chat_id = update.effective_chat.id if update.effective_chat else 0
+            await enqueue_update(update.to_dict(), chat_id)
+        else:
+            # Javobni kutmasdan 200 qaytaramiz - update PTB tomonidan fonda qayta ishlanadi
+            await self.bot_app.update_queue.put(update)
+        await _respond(send, 200)
+
+
+async def _respond(send, status: int):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain')],
+    })
+    await send({'type': 'http.response.body', 'body': b''})
@@ -0,0 +1,328 @@
+"""
+Worker rejimi: bir nechta runbot jarayonlari umumiy update navbatidan ishlaydi
+
+Update lar (ingest jarayoni yoki webhook orqali) UpdateQueue jadvaliga
+chat_id % BOT_QUEUE_PARTITIONS bo'limi bilan yoziladi. Har bir worker
+bo'limlarning teng ulushini PartitionLease orqali ijaraga oladi
+(SELECT ... FOR UPDATE SKIP LOCKED) va har bir bo'limni alohida task da
+ketma-ket qayta ishlaydi, shuning uchun bitta foydalanuvchining xabarlari
+tartib bilan javob oladi, bo'limga tegishli keshlar esa shu jarayonda
+"issiq" qoladi.
+
+Ishga tushirish:
+    python manage.py runbot --mode ingest      # getUpdates -> navbat (bitta jarayon)
+    python manage.py runbot --mode worker      # istalgancha jarayon
+
+Ijaralar alohida heartbeat task ida uzaytiriladi. Bo'lim boshqa workerga
+berilganda navbatdagi update lar darhol qoldiriladi, ijara esa
+bajarilayotgan update tugagach bo'shatiladi - yangi ega chatning keyingi
+xabarini oldingisi tugamasdan boshlamaydi. Worker to'satdan to'xtasa,
+uning bo'limlari BOT_QUEUE_LEASE_TTL dan keyin boshqa workerlarga o'tadi;
+tugallanmagan update qayta ishlanadi (at-least-once).
+"""
+import asyncio
+import contextlib
+import math
+import os
+import signal
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from bot.db import db_sync_to_async
+from bot.models import UpdateQueue, PartitionLease, BotWorker
+
+
+def partition_for(chat_id: int) -> int:
+    """chat_id uchun navbat bo'limi"""
+    return chat_id % settings.BOT_QUEUE_PARTITIONS
+
+
+@db_sync_to_async
+def enqueue_update(payload: dict, chat_id: int):
+    """Update ni navbatga yozish"""
+    UpdateQueue.objects.create(partition=partition_for(chat_id), chat_id=chat_id, payload=payload)
+
+
+def _lease_ttl() -> timedelta:
+    return timedelta(seconds=settings.BOT_QUEUE_LEASE_TTL)
+
+
+@db_sync_to_async
+def ensure_partitions():
+    """Barcha bo'limlar uchun PartitionLease yozuvlari mavjudligini ta'minlash"""
+    PartitionLease.objects.bulk_create(
+        [PartitionLease(partition=p) for p in range(settings.BOT_QUEUE_PARTITIONS)],
+        ignore_conflicts=True
+    )
+
+
+@db_sync_to_async
+def heartbeat(worker_id: str) -> tuple:
+    """
+    Worker tirikligini belgilash va o'z ijaralarini uzaytirish
+
+    Returns:
+        (hozir egalik qilayotgan bo'limlar, bitta workerga to'g'ri keladigan ulush)
+    """
+    now = timezone.now()
+    BotWorker.objects.update_or_create(worker_id=worker_id, defaults={'last_seen': now})
+    live = BotWorker.objects.filter(last_seen__gte=now - _lease_ttl()).count()
+
+    # Muddati o'tgan ijaralar uzaytirilmaydi - ular boshqa workerga o'tgan bo'lishi mumkin
+    PartitionLease.objects.filter(owner=worker_id, expires_at__gte=now).update(expires_at=now + _lease_ttl())
+    owned = set(
+        PartitionLease.objects.filter(owner=worker_id, expires_at__gte=now)
+        .values_list('partition', flat=True)
+    )
+
+    share = math.ceil(settings.BOT_QUEUE_PARTITIONS / max(live, 1))
+    return owned, share
+
+
+@db_sync_to_async
+def claim_partitions(worker_id: str, count: int) -> set:
+    """Bo'sh yoki muddati o'tgan bo'limlardan count tasini ijaraga olish"""
+    now = timezone.now()
+    with transaction.atomic():
+        free = list(
+            PartitionLease.objects.select_for_update(skip_locked=True)
+            .filter(Q(owner='') | Q(expires_at__lt=now))
+            .order_by('partition')[:count]
+        )
+        PartitionLease.objects.filter(pk__in=[lease.pk for lease in free]).update(
+            owner=worker_id,
+            expires_at=now + _lease_ttl()
+        )
+    return {lease.partition for lease in free}
+
+
+@db_sync_to_async
+def release_partitions(worker_id: str, partitions: set):
+    """Bo'limlarni bo'shatish"""
+    PartitionLease.objects.filter(owner=worker_id, partition__in=partitions).update(owner='', expires_at=None)
+
+
+@db_sync_to_async
+def unregister_worker(worker_id: str):
+    PartitionLease.objects.filter(owner=worker_id).update(owner='', expires_at=None)
+    BotWorker.objects.filter(worker_id=worker_id).delete()
+
+
+@db_sync_to_async
+def fetch_updates(partitions: list, exclude_ids: list, limit: int, per_partition: int) -> list:
+    """Ijaradagi bo'limlardan hali olinmagan update larni id tartibida olish (har bo'limdan per_partition tadan ko'p emas)"""
+    return list(
+        UpdateQueue.objects.filter(partition__in=partitions)
+        .exclude(id__in=exclude_ids)
+        .annotate(rank=Window(RowNumber(), partition_by=F('partition'), order_by=F('id').asc()))
+        .filter(rank__lte=per_partition)
+        .order_by('id')
+        .values('id', 'partition', 'payload')[:limit]
+    )
+
+
+@db_sync_to_async
+def delete_update(update_id: int):
+    UpdateQueue.objects.filter(id=update_id).delete()
+
+
+class QueueWorker:
+    """Bitta worker jarayoni: bo'limlarni ijaraga oladi va update larni qayta ishlaydi"""
+
+    def __init__(self, app: Application):
+        self.app = app
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        # partition -> (asyncio.Queue, Task)
+        self.consumers = {}
+        # Olingan, lekin hali o'chirilmagan update id lari
+        self.pending = set()
+        # Bajarilayotgan update i tugashini kutib, bo'shatilayotgan bo'limlar
+        self.releasing = set()
+        self._handoffs = set()
+        self.processed = 0
+        self._stopping = asyncio.Event()
+        self._rebalance_lock = asyncio.Lock()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        await ensure_partitions()
+        # Ijaralar consumer lar ishidan mustaqil task da uzaytiriladi: uzun GPT javobi
+        # kutilayotganda ham bo'limlar boshqa workerga o'tib ketmaydi
+        heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+        prefetch = settings.BOT_QUEUE_PARTITION_PREFETCH
+        while not self._stopping.is_set():
+            rows = []
+            free_slots = settings.BOT_QUEUE_BATCH_SIZE - len(self.pending)
+            # Navbati to'lgan bo'limlar so'ralmaydi: bitta bo'limdagi to'planib qolgan
+            # update lar pending ni egallab, boshqa bo'limlarni kutdirib qo'ymaydi
+            partitions = [p for p, (queue, _) in self.consumers.items() if queue.qsize() < prefetch]
+            if partitions and free_slots > 0:
+                rows = await fetch_updates(partitions, list(self.pending), free_slots, prefetch)
+            added = 0
+            for row in rows:
+                consumer = self.consumers.get(row['partition'])
+                if consumer is None or consumer[0].qsize() >= prefetch:
+                    continue
+                self.pending.add(row['id'])
+                consumer[0].put_nowait(row)
+                added += 1
+
+            if not added:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), settings.BOT_QUEUE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+        # Bajarilayotgan update lar tugaguncha heartbeat ishlashda davom etadi. Lock boshlangan
+        # claim ni kutadi - undan keyin _rebalance yangi consumer ochmaydi
+        async with self._rebalance_lock:
+            consumers = [self._stop_consumer(p) for p in list(self.consumers)]
+        await asyncio.gather(*consumers, *self._handoffs)
+        async with self._rebalance_lock:
+            heartbeat_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await heartbeat_task
+        await unregister_worker(self.worker_id)
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                async with self._rebalance_lock:
+                    await self._rebalance()
+            except Exception as e:
+                print(f"Heartbeat xatoligi: {e}")
+            await asyncio.sleep(settings.BOT_QUEUE_LEASE_TTL / 3)
+
+    async def _rebalance(self):
+        """Ijaralarni uzaytirish va bo'limlarni qayta taqsimlash - consumer larni kutmaydi"""
+        owned, share = await heartbeat(self.worker_id)
+
+        # Boshqa workerga o'tib ketgan bo'limlar: olinmagan update lar yangi egasiga qoladi
+        for partition in set(self.consumers) - owned:
+            self._stop_consumer(partition)
+
+        if self._stopping.is_set():
+            return
+
+        active = owned - self.releasing
+        if len(active) > share:
+            # Yangi worker qo'shilgan - ortiqcha bo'limlarni berish
+            extra = set(sorted(active)[share:])
+            for partition in extra & set(self.consumers):
+                self._hand_off(partition)
+            active -= extra
+        elif len(active) < share:
+            claimed = await claim_partitions(self.worker_id, share - len(active))
+            if self._stopping.is_set():
+                # Claim paytida stop() chaqirildi - consumer ochilmaydi, bo'limlar darhol qaytariladi
+                await release_partitions(self.worker_id, claimed)
+                return
+            active |= claimed
+
+        for partition in active - set(self.consumers):
+            queue = asyncio.Queue()
+            self.consumers[partition] = (queue, asyncio.create_task(self._consume(queue)))
+
+    def _stop_consumer(self, partition: int) -> asyncio.Task:
+        """
+        Consumer ni to'xtatish: navbatdagi (boshlanmagan) update lar tashlanadi -
+        ular DB da qoladi va bo'limning keyingi egasi tomonidan olinadi;
+        bajarilayotgani tugaydi. Consumer task i qaytariladi.
+        """
+        queue, task = self.consumers.pop(partition)
+        while not queue.empty():
+            self.pending.discard(queue.get_nowait()['id'])
+        queue.put_nowait(None)
+        return task
+
+    def _hand_off(self, partition: int):
+        """Bo'limni bo'shatish: ijara bajarilayotgan update tugagach qaytariladi (shu vaqtgacha heartbeat uni uzaytiradi)"""
+        task = self._stop_consumer(partition)
+        self.releasing.add(partition)
+
+        async def release():
+            try:
+                await task
+                await release_partitions(self.worker_id, {partition})
+            finally:
+                self.releasing.discard(partition)
+
+        handoff = asyncio.create_task(release())
+        self._handoffs.add(handoff)
+        handoff.add_done_callback(self._handoffs.discard)
+
+    async def _consume(self, queue: asyncio.Queue):
+        while True:
+            row = await queue.get()
+            if row is None:
+                return
+            try:
+                update = Update.de_json(row['payload'], self.app.bot)
+                await self.app.process_update(update)
+            except Exception as e:
+                print(f"Update #{row['id']} ni qayta ishlashda xatolik: {e}")
+            await delete_update(row['id'])
+            self.pending.discard(row['id'])
+            self.processed += 1
+
+
+async def _run_until_signal(app: Application, main_coro_factory):
+    """Application ni ishga tushirib, SIGINT/SIGTERM kelguncha coroutine ni bajarish"""
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+    try:
+        await main_coro_factory()
+    finally:
+        await app.stop()
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+
+def run_worker():
+    """Worker jarayonini ishga tushirish (runbot --mode worker)"""
+    from bot.handlers import build_application
+
+    app = build_application(polling=False)
+    worker = QueueWorker(app)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        print(f"Worker ishlamoqda: {worker.worker_id}")
+        await worker.run()
+        print(f"Worker to'xtadi: {worker.processed} ta update qayta ishlandi")
+
+    asyncio.run(_run_until_signal(app, main))
+
+
+async def _enqueue(update: Update, context):
+    chat_id = update.effective_chat.id if update.effective_chat else 0
+    await enqueue_update(update.to_dict(), chat_id)
+
+
+def run_ingest():
+    """getUpdates orqali kelgan update larni navbatga yozish (runbot --mode ingest)"""
+    builder = Application.builder().token(settings.BOT_TOKEN)
+    if settings.TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(settings.TELEGRAM_API_BASE_URL)
+    # concurrent_updates o'chiq: bitta chat xabarlari navbatga kelish tartibida yoziladi
+    app = builder.build()
+    app.add_handler(TypeHandler(Update, _enqueue))
+
+    print("Ingest ishlamoqda: update lar navbatga yozilmoqda...")
+    app.run_polling()
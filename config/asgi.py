@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Webhook rejimi: Telegram update lari shu ASGI ilova orqali qabul qilinadi
+if settings.BOT_WEBHOOK_ENABLED:
+    from bot.webhook import TelegramWebhookApp
+
+    application = TelegramWebhookApp(application)
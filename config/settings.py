@@ -36,6 +36,121 @@ ALLOWED_HOSTS = ['localhost', '127.0.0.1']
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
+# Webhook rejimi (bot/webhook.py): update lar config/asgi.py orqali qabul qilinadi
+BOT_WEBHOOK_ENABLED = os.getenv('BOT_WEBHOOK_ENABLED', 'False') == 'True'
+BOT_WEBHOOK_URL = os.getenv('BOT_WEBHOOK_URL')  # https://example.uz/telegram/webhook/
+BOT_WEBHOOK_PATH = os.getenv('BOT_WEBHOOK_PATH', '/telegram/webhook/')
+BOT_WEBHOOK_SECRET = os.getenv('BOT_WEBHOOK_SECRET', '')
+# Telegram Bot API manzili (test uchun: http://127.0.0.1:8081/bot)
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+
+# Worker rejimi (bot/worker_queue.py): update lar DB navbati orqali bir nechta workerga taqsimlanadi
+BOT_QUEUE_ENABLED = os.getenv('BOT_QUEUE_ENABLED', 'False') == 'True'
+BOT_QUEUE_PARTITIONS = int(os.getenv('BOT_QUEUE_PARTITIONS', '64'))
+BOT_QUEUE_LEASE_TTL = int(os.getenv('BOT_QUEUE_LEASE_TTL', '30'))
+BOT_QUEUE_BATCH_SIZE = int(os.getenv('BOT_QUEUE_BATCH_SIZE', '100'))
+# Bitta bo'lim navbatida kutib turadigan update lar chegarasi - "issiq" bo'lim boshqalarini siqib chiqarmaydi
+BOT_QUEUE_PARTITION_PREFETCH = int(os.getenv('BOT_QUEUE_PARTITION_PREFETCH', '4'))
+BOT_QUEUE_POLL_INTERVAL = float(os.getenv('BOT_QUEUE_POLL_INTERVAL', '0.2'))
+
+# Bir vaqtda tayyorlanayotgan javoblar (RAG + GPT) soni
+ANSWER_CONCURRENCY = int(os.getenv('ANSWER_CONCURRENCY', '16'))
+
+# GPT javobini bo'laklab ko'rsatish (bot/streaming.py, standart - o'chiq); Telegram edit limiti uchun oraliq
+STREAM_ANSWERS = os.getenv('STREAM_ANSWERS', 'False') == 'True'
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.5'))
+
+# telegram_id -> TelegramUser.pk keshi (bot/user_cache.py)
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '100000'))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '3600'))
+
+# Conversation larni guruhlab saqlash (bot/conversation_log.py)
+CONVERSATION_LOG_BATCH_SIZE = int(os.getenv('CONVERSATION_LOG_BATCH_SIZE', '50'))
+CONVERSATION_LOG_FLUSH_INTERVAL = float(os.getenv('CONVERSATION_LOG_FLUSH_INTERVAL', '2'))
+CONVERSATION_LOG_MAX_QUEUE = int(os.getenv('CONVERSATION_LOG_MAX_QUEUE', '5000'))
+CONVERSATION_LOG_PUT_TIMEOUT = float(os.getenv('CONVERSATION_LOG_PUT_TIMEOUT', '5'))
+
+# Savol embeddinglari keshi (rag/embedding_cache.py)
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', str(BASE_DIR / 'embedding_cache.sqlite3'))
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '10000'))
+
+# Indekslashda bulk embedding: batch hajmi (token va inputlar), parallel so'rovlar, qayta urinishlar
+EMBEDDING_BATCH_TOKENS = int(os.getenv('EMBEDDING_BATCH_TOKENS', '100000'))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv('EMBEDDING_BATCH_MAX_INPUTS', '2048'))
+EMBEDDING_CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY', '4'))
+EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', '6'))
+EMBEDDING_RETRY_BASE_DELAY = float(os.getenv('EMBEDDING_RETRY_BASE_DELAY', '1'))
+EMBEDDING_CHECKPOINT_PATH = os.getenv('EMBEDDING_CHECKPOINT_PATH', str(BASE_DIR / 'embedding_checkpoint.sqlite3'))
+
+# Chunker: 'words' (standart, 500/100 so'z) yoki 'structured' (bob/modda/band, tokenlar bo'yicha)
+CHUNKER = os.getenv('CHUNKER', 'words')
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '500'))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '50'))
+# Qidiruvdan olinadigan nomzod chunklar soni va GPT ga yuboriladigan kontekst byudjeti (token).
+# Standart qiymatlar chunker ga bog'liq: 'words' chunklari ~500 so'z (2300 tokengacha) - byudjetga
+# avvalgidek 10 tasi sig'adi; 'structured' chunklari CHUNK_MAX_TOKENS dan oshmaydi
+RAG_N_RESULTS = int(os.getenv('RAG_N_RESULTS', '10' if CHUNKER == 'words' else '8'))
+RAG_CONTEXT_TOKENS = int(os.getenv('RAG_CONTEXT_TOKENS', '24000' if CHUNKER == 'words' else '2500'))
+# Byudjet (REQUEST_MAX_PROMPT_TOKENS, downgrade) qanchalik kichik bo'lmasin, kontekstga kiradigan eng relevant chunklar soni
+RAG_MIN_CONTEXT_CHUNKS = int(os.getenv('RAG_MIN_CONTEXT_CHUNKS', '3'))
+# rules.docx alifbosi: o'zbekcha savollar shu alifboga o'tkaziladi (rag/translit.py) - 'cyrillic' yoki 'latin'
+UZ_CORPUS_SCRIPT = os.getenv('UZ_CORPUS_SCRIPT', 'cyrillic')
+
+# Intent router kalit so'zlari va javoblari (bot/intents.py)
+INTENTS_PATH = os.getenv('INTENTS_PATH', str(BASE_DIR / 'bot' / 'intents.json'))
+
+# Qidiruv natijalari keshi (rag/retrieval_cache.py; standart o'chiq): xotiradagi yozuvlar soni va umumiy SQLite fayl
+RETRIEVAL_CACHE = os.getenv('RETRIEVAL_CACHE', 'False') == 'True'
+RETRIEVAL_CACHE_PATH = os.getenv('RETRIEVAL_CACHE_PATH', str(BASE_DIR / 'retrieval_cache.sqlite3'))
+RETRIEVAL_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', '10000'))
+
+# Micro-batching: shu oraliqda (ms) kelgan embedding/qidiruv so'rovlari bitta batch ga yig'iladi
+RAG_BATCH_WINDOW_MS = float(os.getenv('RAG_BATCH_WINDOW_MS', '5'))
+RAG_BATCH_MAX = int(os.getenv('RAG_BATCH_MAX', '32'))
+
+# Vektor qidiruv backendi: 'chroma' yoki 'numpy' (rag/numpy_index.py, float32/float16/int8)
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+VECTOR_DTYPE = os.getenv('VECTOR_DTYPE', 'float32')
+VECTOR_MMAP = os.getenv('VECTOR_MMAP', 'True') == 'True'
+
+# Gibrid qidiruv (BM25 + vektor, rag/lexical.py; standart o'chiq): RRF konstantasi va "raqamli savol" chegarasi
+RAG_HYBRID = os.getenv('RAG_HYBRID', 'False') == 'True'
+RAG_RRF_K = int(os.getenv('RAG_RRF_K', '60'))
+LEXICAL_QUERY_MIN_SHARE = float(os.getenv('LEXICAL_QUERY_MIN_SHARE', '0.5'))
+
+# Model router (standart o'chiq): arzon model savolni saralaydi (off_topic / not_found / simple / complex),
+# faqat murakkab savollar ANSWER_MODEL ga yuboriladi
+MODEL_ROUTING = os.getenv('MODEL_ROUTING', 'False') == 'True'
+ROUTER_MODEL = os.getenv('ROUTER_MODEL', 'gpt-4o-mini')
+SIMPLE_MODEL = os.getenv('SIMPLE_MODEL', 'gpt-4o-mini')
+ANSWER_MODEL = os.getenv('ANSWER_MODEL', 'gpt-4o')
+
+# Xarajat byudjeti (bot/budget.py): bitta so'rov promptining eng ko'p tokeni (standart - to'liq kontekst
+# va system prompt + 4096 belgilik savol uchun ~3000 token), kunlik limit ($, 0 - cheklanmagan),
+# arzon modelga o'tish ulushi va DB dan qayta o'qish oralig'i (soniya)
+REQUEST_MAX_PROMPT_TOKENS = int(os.getenv('REQUEST_MAX_PROMPT_TOKENS', str(RAG_CONTEXT_TOKENS + 3000)))
+DAILY_COST_LIMIT = float(os.getenv('DAILY_COST_LIMIT', '0'))
+DAILY_COST_DOWNGRADE_SHARE = float(os.getenv('DAILY_COST_DOWNGRADE_SHARE', '0.8'))
+BUDGET_REFRESH_INTERVAL = float(os.getenv('BUDGET_REFRESH_INTERVAL', '60'))
+
+# Semantik javob keshi (bot/answer_cache.py): kosinus masofa chegarasi
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '2000'))
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv('ANSWER_CACHE_MAX_DISTANCE', '0.05'))
+
+# Tasdiqlangan FAQ tez yo'li (bot/faq.py): kosinus o'xshashlik chegarasi, DB dan qayta yuklash oralig'i (soniya)
+FAQ_MIN_SIMILARITY = float(os.getenv('FAQ_MIN_SIMILARITY', '0.93'))
+FAQ_RELOAD_INTERVAL = float(os.getenv('FAQ_RELOAD_INTERVAL', '60'))
+# build_faq: klasterga qo'shish chegarasi va taklif qilinadigan klasterning eng kichik hajmi
+FAQ_CLUSTER_THRESHOLD = float(os.getenv('FAQ_CLUSTER_THRESHOLD', '0.9'))
+FAQ_MIN_CLUSTER_SIZE = int(os.getenv('FAQ_MIN_CLUSTER_SIZE', '5'))
+
+# Indeks alias ini qayta tekshirish oralig'i (soniya) va saqlanadigan versiyalar soni
+INDEX_VERSION_TTL = float(os.getenv('INDEX_VERSION_TTL', '5'))
+INDEX_KEEP_VERSIONS = int(os.getenv('INDEX_KEEP_VERSIONS', '2'))
+
+# Chroma so'rovlari uchun thread pool hajmi
+CHROMA_MAX_WORKERS = int(os.getenv('CHROMA_MAX_WORKERS', '4'))
+
 
 # Application definition
 
@@ -90,9 +205,16 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Har bir DB thread o'z ulanishini qayta ishlatadi
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Bot ORM chaqiruvlari uchun thread pool hajmi (bot/db.py).
+# Postgres max_connections dan kichik bo'lishi kerak: har bir thread bitta ulanish ochadi.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
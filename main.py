@@ -5,11 +5,14 @@ from docx import Document
 from dotenv import load_dotenv
 import os
 
+from bot.pricing import calculate_cost
+
 # .env fayldan o'qish
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+MODEL = "gpt-4o-mini"
 
 # OpenAI client
 client = OpenAI(api_key=OPENAI_API_KEY)
@@ -55,7 +58,7 @@ async def answer_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # GPT ga yuborish
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=MODEL,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": user_message}
@@ -72,8 +75,8 @@ async def answer_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
         output_tokens = usage.completion_tokens
         total_tokens = usage.total_tokens
 
-        # Narx hisoblash (GPT-4o-mini)
-        cost = (input_tokens * 0.15 / 1_000_000) + (output_tokens * 0.60 / 1_000_000)
+        # Narx hisoblash (bot/pricing.py dagi jadval bo'yicha)
+        cost = calculate_cost(MODEL, input_tokens, output_tokens)
 
         print(f"Input: {input_tokens}, Output: {output_tokens}, Total: {total_tokens}, Cost: ${cost:.6f}")
 
@@ -0,0 +1,74 @@
+"""
+Micro-batching: bir necha millisekund ichida kelgan so'rovlarni bitta batch ga yig'ish
+
+Trafik keskin oshganda (masalan, qarordagi o'zgarishlar haqida xabardan
+keyin) har bir savol uchun alohida embedding va qidiruv so'rovi o'rniga
+RAG_BATCH_WINDOW_MS ichida kelgan so'rovlar bitta chaqiruvda bajariladi.
+"""
+import asyncio
+
+
+class MicroBatcher:
+    """
+    handler(key, items) -> results: bir xil key li elementlar uchun bitta chaqiruv
+
+    Batch window tugaganda yoki max_size ga yetganda yuboriladi.
+    """
+
+    def __init__(self, handler, window: float, max_size: int):
+        self.handler = handler
+        self.window = window
+        self.max_size = max_size
+        # key -> [(item, future), ...]
+        self._pending = {}
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, key, item):
+        if self.window <= 0:
+            return (await self.handler(key, [item]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = []
+            loop.call_later(self.window, self._flush, key, batch)
+        batch.append((item, future))
+        if len(batch) >= self.max_size:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key, batch):
+        # Batch allaqachon yuborilgan bo'lishi mumkin (max_size ga yetganda)
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        task = asyncio.ensure_future(self._run(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.handler(key, [item for item, _ in batch])
+            if len(results) != len(batch):
+                # Aks holda javobsiz qolgan so'rovlar abadiy kutadi
+                raise RuntimeError(f"Batch handler {len(batch)} ta element uchun {len(results)} ta natija qaytardi")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'average': self.items / self.batches if self.batches else 0,
+        }
@@ -0,0 +1,157 @@
+"""
+Katta korpuslar uchun bulk embedding
+
+Matnlar token byudjeti (EMBEDDING_BATCH_TOKENS) va inputlar soni
+(EMBEDDING_BATCH_MAX_INPUTS) bo'yicha batch larga bo'linadi, batch lar
+EMBEDDING_CONCURRENCY tagacha parallel yuboriladi, vaqtinchalik xatolarda
+(rate limit, timeout, 5xx) eksponensial kutish bilan qayta uriniladi.
+
+Tayyor bo'lgan har bir batch checkpoint fayliga yoziladi, shuning uchun
+to'xtab qolgan `index_rules --all` qayta ishga tushirilganda allaqachon
+olingan embeddinglar qayta so'ralmaydi.
+"""
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+from django.conf import settings
+
+from .tokens import count_tokens
+
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class EmbeddingCheckpoint:
+    """Olingan embeddinglar (model + aniq matn bo'yicha) SQLite faylida"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoint (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        with self._lock:
+            # SQLite parametrlar limiti uchun bo'laklab
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM checkpoint WHERE key IN ({','.join('?' * len(part))})",
+                    part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def set_many(self, items: list):
+        """items: [(key, vector), ...]"""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO checkpoint (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items]
+            )
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoint")
+            self._db.commit()
+
+
+def make_batches(texts: list, max_tokens: int, max_inputs: int) -> list:
+    """Matn indekslarini token byudjeti va inputlar soni bo'yicha batch larga ajratish"""
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _embed_with_retry(client, model: str, texts: list) -> list:
+    """Bitta batch ni yuborish, vaqtinchalik xatolarda qayta urinish"""
+    delay = settings.EMBEDDING_RETRY_BASE_DELAY
+    for attempt in range(settings.EMBEDDING_MAX_RETRIES + 1):
+        try:
+            response = client.embeddings.create(model=model, input=texts)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except RETRYABLE_ERRORS as e:
+            if attempt == settings.EMBEDDING_MAX_RETRIES:
+                raise
+            wait = delay * (2 ** attempt) * (1 + random.random())
+            print(f"Embedding xatoligi ({type(e).__name__}), {wait:.1f} s dan keyin qayta urinish...")
+            time.sleep(wait)
+
+
+def embed_bulk(client, model: str, texts: list, checkpoint: EmbeddingCheckpoint = None) -> list:
+    """
+    Ko'p matnlar uchun embedding olish
+
+    Returns:
+        texts bilan bir xil tartibdagi embeddinglar ro'yxati
+    """
+    started = time.perf_counter()
+    keys = [EmbeddingCheckpoint.make_key(text, model) for text in texts]
+    done = checkpoint.get_many(keys) if checkpoint else {}
+
+    missing = [i for i, key in enumerate(keys) if key not in done]
+    missing_texts = [texts[i] for i in missing]
+    batches = [
+        [missing[j] for j in batch]
+        for batch in make_batches(
+            missing_texts, settings.EMBEDDING_BATCH_TOKENS, settings.EMBEDDING_BATCH_MAX_INPUTS
+        )
+    ]
+    if done:
+        print(f"Checkpoint: {len(texts) - len(missing)} ta embedding tayyor, {len(missing)} ta qoldi")
+
+    embedded = 0
+    with ThreadPoolExecutor(max_workers=settings.EMBEDDING_CONCURRENCY) as executor:
+        futures = {
+            executor.submit(_embed_with_retry, client, model, [texts[i] for i in batch]): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            vectors = future.result()
+            items = [(keys[i], vector) for i, vector in zip(batch, vectors)]
+            done.update(items)
+            if checkpoint:
+                checkpoint.set_many(items)
+            embedded += len(batch)
+            if len(batches) > 1:
+                elapsed = time.perf_counter() - started
+                print(f"Embedding: {embedded}/{len(missing)} ({embedded / elapsed:.1f} embedding/s)")
+
+    elapsed = time.perf_counter() - started
+    if missing:
+        print(f"{len(missing)} ta embedding {elapsed:.2f} s da olindi "
+              f"({len(missing) / elapsed:.1f} embedding/s, {len(batches)} ta so'rov)")
+    return [done[key] for key in keys]
@@ -1,40 +1,90 @@
+from collections import deque
 from docx import Document
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from django.conf import settings
+import hashlib
+import os
 import re
 
+from .tokens import count_tokens, split_by_tokens
 
-def load_docx(file_path: str) -> str:
-    """Word fayldan matnni o'qish"""
-    doc = Document(file_path)
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
 
+def _decimal_numbering(doc) -> dict:
+    """Raqamli (1, 2, 3...) Word ro'yxatlari: numId -> boshlang'ich raqam"""
+    try:
+        numbering = doc.part.numbering_part.element
+    except NotImplementedError:
+        # Hujjatda ro'yxatlar yo'q
+        return {}
 
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> list:
+    result = {}
+    for num in numbering.findall(qn('w:num')):
+        abstract_id = num.find(qn('w:abstractNumId')).get(qn('w:val'))
+        level = f'w:abstractNum[@w:abstractNumId="{abstract_id}"]/w:lvl[@w:ilvl="0"]'
+        if numbering.xpath(f'{level}/w:numFmt/@w:val') == ['decimal']:
+            start = numbering.xpath(f'{level}/w:start/@w:val')
+            result[num.get(qn('w:numId'))] = int(start[0]) if start else 1
+    return result
+
+
+def iter_docx_lines(file_path: str):
     """
-    Matnni bo'laklarga bo'lish
+    Word fayl qatorlarini birma-bir berish: (matn, ro'yxat raqami yoki None)
 
-    Args:
-        text: Bo'laklarga bo'linadigan matn
-        chunk_size: Har bir bo'lak uzunligi (so'zlarda) - optimal: 500
-        overlap: Bo'laklar orasidagi overlap (so'zlarda) - optimal: 100
+    Word avtomatik raqamlagan bandlarning raqami matnda bo'lmaydi, shuning
+    uchun ular har bir ro'yxat bo'yicha sanab chiqiladi.
+    """
+    doc = Document(file_path)
+    numbering = _decimal_numbering(doc)
+    counters = {}
 
-    Returns:
-        Bo'laklar ro'yxati
+    # doc.paragraphs butun ro'yxatni quradi - body elementlarini generator bilan aylanamiz
+    for element in doc.element.body.iterchildren(qn('w:p')):
+        number = None
+        num_pr = element.pPr.numPr if element.pPr is not None else None
+        if num_pr is not None and num_pr.numId is not None and (num_pr.ilvl is None or num_pr.ilvl.val == 0):
+            num_id = str(num_pr.numId.val)
+            if num_id in numbering:
+                counters[num_id] = counters.get(num_id, numbering[num_id] - 1) + 1
+                number = counters[num_id]
 
-    Optimallashtirilgan parametrlar:
-    - 500 so'zlik chunks: yaxshiroq semantic coherence
-    - 100 so'zlik overlap: kontekst davomiyligini saqlash
+        # Qator uzilishlari (w:br) ham paragraf chegarasi hisoblanadi
+        for line in Paragraph(element, doc).text.split('\n'):
+            line = line.strip()
+            if line:
+                yield line, number
+                number = None
+
+
+def iter_paragraphs(file_path: str):
+    """Word fayl paragraflarini birma-bir berish (bo'sh paragraflarsiz)"""
+    for line, _ in iter_docx_lines(file_path):
+        yield line
+
+
+def load_docx(file_path: str) -> str:
+    """Word fayldan matnni o'qish"""
+    return "\n".join(iter_paragraphs(file_path))
+
+
+def iter_chunks(paragraphs, chunk_size: int = 500, overlap: int = 100):
     """
-    # Matnni paragraphlarga bo'lish
-    paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
+    Paragraflar oqimini bo'laklarga bo'lish (generator)
 
-    chunks = []
+    chunk_text() bilan bir xil natija beradi, lekin overlap so'zlari
+    oxirgi `overlap` ta so'zni saqlaydigan deque da yuritiladi - har bir
+    chunk da butun matnni qayta join/split qilish shart emas.
+    """
     current_chunk = []
     current_length = 0
+    # Joriy chunk ning oxirgi overlap ta so'zi
+    tail = deque(maxlen=overlap if overlap > 0 else 0)
 
     for para in paragraphs:
+        para = para.strip()
+        if not para:
+            continue
         words = para.split()
         para_length = len(words)
 
@@ -42,54 +92,234 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> list:
         if para_length > chunk_size:
             # Avvalgi chunk ni saqlash
             if current_chunk:
-                chunks.append(' '.join(current_chunk))
+                yield ' '.join(current_chunk)
                 current_chunk = []
                 current_length = 0
+                tail.clear()
 
             # Katta paragrafni bo'lish
             for i in range(0, para_length, chunk_size - overlap):
-                chunk_words = words[i:i + chunk_size]
-                chunks.append(' '.join(chunk_words))
+                yield ' '.join(words[i:i + chunk_size])
         else:
             # Chunk ga sig'adimi tekshirish
             if current_length + para_length > chunk_size:
-                # Chunk ni saqlash
-                chunks.append(' '.join(current_chunk))
+                yield ' '.join(current_chunk)
 
                 # Overlap qo'shish
-                overlap_words = ' '.join(current_chunk).split()[-overlap:] if overlap > 0 else []
-                current_chunk = overlap_words + [para]
-                current_length = len(overlap_words) + para_length
-            else:
-                current_chunk.append(para)
-                current_length += para_length
+                current_chunk = list(tail)
+                current_length = len(current_chunk)
+
+            current_chunk.append(para)
+            current_length += para_length
+            tail.extend(words)
 
     # Oxirgi chunk
     if current_chunk:
-        chunks.append(' '.join(current_chunk))
+        yield ' '.join(current_chunk)
 
-    return chunks
 
-
-def process_rules_file(file_path: str) -> list:
+def chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> list:
     """
-    Rules faylni o'qish va bo'laklarga bo'lish
+    Matnni bo'laklarga bo'lish
+
+    Args:
+        text: Bo'laklarga bo'linadigan matn
+        chunk_size: Har bir bo'lak uzunligi (so'zlarda) - optimal: 500
+        overlap: Bo'laklar orasidagi overlap (so'zlarda) - optimal: 100
 
     Returns:
-        [{'id': 0, 'text': '...', 'metadata': {...}}, ...]
+        Bo'laklar ro'yxati
+
+    Optimallashtirilgan parametrlar:
+    - 500 so'zlik chunks: yaxshiroq semantic coherence
+    - 100 so'zlik overlap: kontekst davomiyligini saqlash
+    """
+    return list(iter_chunks(text.split('\n'), chunk_size, overlap))
+
+
+# Qaror tuzilmasi: ilova > bob > modda > band
+APPENDIX_RE = re.compile(r'^(?:(\d+)\s*[-–]\s*)?(?:илова|ilova|приложение)(?:\s*№\s*(\d+))?\.?$', re.IGNORECASE)
+CHAPTER_RE = re.compile(r'^(?:(\d+)\s*[-–]\s*(?:боб|bob)|глава\s+(\d+))\b\.?\s*(.*)$', re.IGNORECASE)
+ARTICLE_RE = re.compile(r'^(?:(\d+)\s*[-–]\s*(?:модда|modda)|статья\s+(\d+))\b\.?\s*(.*)$', re.IGNORECASE)
+PUNKT_RE = re.compile(r'^(\d+(?:\.\d+)*)\.\s+\S')
+
+
+def iter_sections(lines):
+    """
+    (matn, ro'yxat raqami) qatorlarini bandlarga ajratish
+
+    Har bir band - raqamli qator va undan keyingi raqamsiz qatorlar
+    (а), б) kichik bandlar, davom etuvchi matn). Sarlavhalar (ilova, bob,
+    modda) bandni yopadi va keyingi bandlar metadata siga yoziladi.
+
+    Yields:
+        {'paragraphs': [...], 'punkt': '12' | None, 'appendix': .., 'chapter': .., ...}
     """
-    text = load_docx(file_path)
-    chunks = chunk_text(text)
+    position = {'appendix': None, 'chapter': None, 'chapter_title': None, 'article': None}
+    section = {'paragraphs': [], 'punkt': None, **position}
+
+    def start(punkt=None):
+        return {'paragraphs': [], 'punkt': punkt, **position}
+
+    for text, auto_number in lines:
+        appendix = APPENDIX_RE.match(text)
+        chapter = CHAPTER_RE.match(text)
+        article = ARTICLE_RE.match(text)
+        punkt = PUNKT_RE.match(text)
+
+        if appendix or chapter or article:
+            if section['paragraphs']:
+                yield section
+            if appendix:
+                position.update(
+                    appendix=appendix.group(1) or appendix.group(2) or text,
+                    chapter=None, chapter_title=None, article=None
+                )
+            elif chapter:
+                position.update(
+                    chapter=int(chapter.group(1) or chapter.group(2)),
+                    chapter_title=text, article=None
+                )
+            else:
+                position.update(article=int(article.group(1) or article.group(2)))
+            section = start()
+            # Bob sarlavhasi har bir chunk boshiga qo'yiladi, qolganlari matnda qoladi
+            if not chapter:
+                section['paragraphs'].append(text)
+        elif punkt or auto_number is not None:
+            if section['paragraphs']:
+                yield section
+            if punkt:
+                section = start(punkt.group(1))
+                section['paragraphs'].append(text)
+            else:
+                # Raqam matnda yo'q - GPT band raqamini ko'rsata olishi uchun qo'shamiz
+                section = start(str(auto_number))
+                section['paragraphs'].append(f"{auto_number}. {text}")
+        else:
+            section['paragraphs'].append(text)
+
+    if section['paragraphs']:
+        yield section
+
+
+def _chunk_metadata(sections: list, tokens: int) -> dict:
+    first = sections[0]
+    metadata = {
+        'appendix': first['appendix'],
+        'chapter': first['chapter'],
+        'chapter_title': first['chapter_title'],
+        'article': first['article'],
+        'punkt_from': next((s['punkt'] for s in sections if s['punkt']), None),
+        'punkt_to': next((s['punkt'] for s in reversed(sections) if s['punkt']), None),
+        'tokens': tokens,
+    }
+    # Chroma metadata da None qiymatlar saqlanmaydi
+    return {key: value for key, value in metadata.items() if value is not None}
+
+
+def iter_structured_chunks(lines, max_tokens: int = 500, overlap: int = 50):
+    """
+    Tuzilmaga asoslangan chunker (tokenlar bo'yicha)
+
+    Bir bob/moddaning ketma-ket bandlari max_tokens gacha bitta chunk ga
+    yig'iladi; chunk hech qachon ikki bob yoki modda chegarasidan o'tmaydi
+    va band o'rtasidan bo'linmaydi (band o'zi max_tokens dan katta
+    bo'lmasa). Har bir chunk boshida bob sarlavhasi turadi.
+
+    Yields:
+        (matn, metadata)
+    """
+    buffer = []
+    buffer_tokens = 0
+
+    def header_of(section) -> str:
+        return section['chapter_title'] or ''
 
-    processed_chunks = []
-    for i, chunk in enumerate(chunks):
-        processed_chunks.append({
-            'id': f"chunk_{i}",
+    def flush():
+        text = '\n'.join(filter(None, [header_of(buffer[0])] + ['\n'.join(s['paragraphs']) for s in buffer]))
+        return text, _chunk_metadata(buffer, buffer_tokens)
+
+    for section in iter_sections(lines):
+        header = header_of(section)
+        header_tokens = count_tokens(header) if header else 0
+        body = '\n'.join(section['paragraphs'])
+        tokens = count_tokens(body)
+
+        same_place = buffer and all(
+            buffer[0][key] == section[key] for key in ('appendix', 'chapter', 'article')
+        )
+        # Raqamlash qaytadan boshlansa (yangi ro'yxat) - yangi chunk
+        restart = section['punkt'] == '1'
+        if buffer and (not same_place or restart or buffer_tokens + tokens > max_tokens):
+            yield flush()
+            buffer, buffer_tokens = [], 0
+
+        if header_tokens + tokens <= max_tokens:
+            if not buffer:
+                buffer_tokens = header_tokens
+            buffer.append(section)
+            buffer_tokens += tokens
+            continue
+
+        # Band bitta chunk ga sig'maydi - paragraflar bo'yicha, kerak bo'lsa so'zlar bo'yicha bo'lamiz
+        budget = max_tokens - header_tokens
+        parts = []
+        for paragraph in section['paragraphs']:
+            if count_tokens(paragraph) > budget:
+                parts.extend(split_by_tokens(paragraph, budget, overlap))
+            elif parts and count_tokens(parts[-1] + '\n' + paragraph) <= budget:
+                parts[-1] += '\n' + paragraph
+            else:
+                parts.append(paragraph)
+        for part in parts:
+            part_tokens = header_tokens + count_tokens(part)
+            text = f"{header}\n{part}" if header else part
+            yield text, _chunk_metadata([section], part_tokens)
+
+    if buffer:
+        yield flush()
+
+
+def chunk_id(source: str, text: str) -> str:
+    """Chunk id - manba nomi va matn hash i (matn o'zgarmasa id ham o'zgarmaydi)"""
+    return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def iter_rules_chunks(file_path: str):
+    """
+    Rules faylni o'qib, chunk larni birma-bir berish
+
+    Yields:
+        {'id': '3f2a...', 'text': '...', 'metadata': {...}}
+    """
+    # Fayl nomi bo'yicha - loyiha boshqa papkaga ko'chirilsa ham id lar saqlanadi
+    source = os.path.basename(file_path)
+
+    if settings.CHUNKER == 'words':
+        chunks = ((chunk, {}) for chunk in iter_chunks(iter_paragraphs(file_path)))
+    else:
+        chunks = iter_structured_chunks(
+            iter_docx_lines(file_path), settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS
+        )
+
+    for i, (chunk, metadata) in enumerate(chunks):
+        yield {
+            'id': chunk_id(source, chunk),
             'text': chunk,
             'metadata': {
-                'source': file_path,
-                'chunk_index': i
+                'source': source,
+                'chunk_index': i,
+                **metadata
             }
-        })
+        }
+
 
-    return processed_chunks
+def process_rules_file(file_path: str) -> list:
+    """
+    Rules faylni o'qish va bo'laklarga bo'lish
+
+    Returns:
+        [{'id': '3f2a...', 'text': '...', 'metadata': {...}}, ...]
+    """
+    return list(iter_rules_chunks(file_path))
@@ -0,0 +1,111 @@
+"""
+GPT uchun kontekstni token byudjeti bo'yicha yig'ish
+
+Qidiruv natijalari (relevantlik tartibida) quyidagicha qayta ishlanadi:
+  - deyarli bir xil chunklar tashlanadi;
+  - byudjet (RAG_CONTEXT_TOKENS) tugaguncha eng relevant chunklar olinadi,
+    lekin eng kamida min_chunks tasi byudjetdan qat'i nazar olinadi;
+  - bir fayldagi qo'shni (chunk_index ketma-ket) chunklar bitta blokka
+    birlashtiriladi: so'zlar bo'yicha overlap va takrorlangan bob
+    sarlavhasi olib tashlanadi;
+  - bloklar hujjatdagi tartibda joylashtiriladi - bir xil chunklar
+    topilganda kontekst matni ham bir xil bo'ladi (provider prompt caching).
+"""
+from .tokens import count_tokens
+
+
+SEPARATOR = "\n\n---\n\n"
+
+# Shu ulushdan ko'p so'zlari mos tushsa chunk takror hisoblanadi
+DUPLICATE_JACCARD = 0.9
+
+# Overlap ni qidirishda ko'riladigan eng ko'p so'zlar soni
+MAX_OVERLAP_WORDS = 200
+
+
+def _tokens(result: dict) -> int:
+    tokens = result['metadata'].get('tokens')
+    return tokens if tokens else count_tokens(result['text'])
+
+
+def _is_duplicate(words: set, selected: list) -> bool:
+    for other in selected:
+        union = len(words | other)
+        if union and len(words & other) / union >= DUPLICATE_JACCARD:
+            return True
+    return False
+
+
+def _merge_text(first: str, second: str, chapter_title: str = None) -> str:
+    """Ketma-ket ikki chunk matnini takrorlarsiz qo'shish"""
+    if chapter_title and second.startswith(chapter_title + "\n"):
+        return first + "\n" + second[len(chapter_title) + 1:]
+
+    first_words = first.split()
+    second_words = second.split()
+    for size in range(min(len(first_words), len(second_words), MAX_OVERLAP_WORDS), 0, -1):
+        if first_words[-size:] == second_words[:size]:
+            return first + " " + " ".join(second_words[size:])
+    return first + "\n" + second
+
+
+def build_context(results: list, budget: int, min_chunks: int = 0) -> str:
+    """
+    Args:
+        results: search() natijalari ([{text, score, metadata}, ...]), relevantlik tartibida
+        budget: kontekst uchun tokenlar chegarasi
+        min_chunks: byudjetdan oshsa ham olinadigan eng relevant chunklar soni
+
+    Returns:
+        kontekst matni
+    """
+    # Relevantlik tartibida, takrorlarsiz, byudjet doirasida tanlash
+    selected = []
+    selected_words = []
+    used = 0
+    for result in results:
+        words = set(result['text'].split())
+        if _is_duplicate(words, selected_words):
+            continue
+        tokens = _tokens(result)
+        if used + tokens > budget and len(selected) >= min_chunks:
+            continue
+        selected.append(result)
+        selected_words.append(words)
+        used += tokens
+
+    # Bir fayldagi qo'shni chunklarni bloklarga birlashtirish
+    def position(result):
+        metadata = result['metadata']
+        return metadata.get('source'), metadata.get('chunk_index')
+
+    by_position = {position(r): r for r in selected if position(r)[1] is not None}
+    blocks = []
+    seen = set()
+    for result in selected:
+        source, index = position(result)
+        if (source, index) in seen:
+            continue
+        if index is None:
+            # Joylashuvi noma'lum chunklar oxirida, relevantlik tartibida
+            blocks.append(((1, '', len(blocks)), result['text']))
+            continue
+
+        # Blok boshini topish
+        start = index
+        while (source, start - 1) in by_position and (source, start - 1) not in seen:
+            start -= 1
+
+        text = None
+        current = start
+        while (source, current) in by_position and (source, current) not in seen:
+            chunk = by_position[(source, current)]
+            seen.add((source, current))
+            if text is None:
+                text = chunk['text']
+            else:
+                text = _merge_text(text, chunk['text'], chunk['metadata'].get('chapter_title'))
+            current += 1
+        blocks.append(((0, source or '', start), text))
+
+    return SEPARATOR.join(text for _, text in sorted(blocks))
@@ -0,0 +1,117 @@
+"""
+Savol embeddinglari uchun kesh
+
+Kalit: normallashtirilgan matn + model nomi. Oldinda xotiradagi LRU,
+orqasida SQLite fayl (vektorlar float32 ko'rinishida saqlanadi), shuning
+uchun kesh bot qayta ishga tushganda ham saqlanib qoladi.
+
+SQLite xatoliklari (masalan, boshqa worker yozayotganda "database is
+locked") topilmadi deb hisoblanadi, yozuv esa faqat xotirada qoladi -
+embedding baribir API dan olinadi.
+"""
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+
+def normalize_text(text: str) -> str:
+    """Kesh kaliti uchun matnni normallashtirish (registr, bo'shliqlar, Unicode)"""
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+class EmbeddingCache:
+    """Xotiradagi LRU + SQLite disk keshi"""
+
+    def __init__(self, path: str, max_memory_items: int = 10000):
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_memory(self, text: str, model: str):
+        """Faqat xotiradan: embedding yoki None (disk ga murojaat qilinmaydi, event loop uchun)"""
+        key = self.make_key(text, model)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return vector
+
+    def get(self, text: str, model: str):
+        """Embedding (list) yoki None"""
+        key = self.make_key(text, model)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+            try:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Embedding keshidan o'qib bo'lmadi: {e}")
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+
+            vector = array("f", row[0]).tolist()
+            self._remember(key, vector)
+            self.disk_hits += 1
+            return vector
+
+    def set_memory(self, text: str, model: str, vector: list):
+        """Faqat xotiraga yozish"""
+        key = self.make_key(text, model)
+        with self._lock:
+            self._remember(key, vector)
+
+    def set(self, text: str, model: str, vector: list):
+        key = self.make_key(text, model)
+        with self._lock:
+            self._remember(key, vector)
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    (key, array("f", vector).tobytes())
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Embedding keshiga yozib bo'lmadi: {e}")
+
+    def _remember(self, key: str, vector: list):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': hits / total if total else 0.0,
+        }
@@ -1,23 +1,124 @@
-from openai import OpenAI
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI, AsyncOpenAI
 from django.conf import settings
+from .embedding_cache import EmbeddingCache
+from .bulk_embeddings import EmbeddingCheckpoint, embed_bulk
+from .batching import MicroBatcher
+
 
+EMBEDDING_MODEL = "text-embedding-3-small"
 
 client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
+# Bot event loop uchun asinxron client
+async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+# Takroriy savollar uchun embedding keshi
+embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_SIZE)
+
+# Keshning SQLite o'qish/yozishlari event loop dan tashqarida bajariladi
+cache_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="embedding-cache")
+
+# Indekslash to'xtab qolsa, olingan embeddinglar shu yerdan davom ettiriladi
+embedding_checkpoint = EmbeddingCheckpoint(settings.EMBEDDING_CHECKPOINT_PATH)
+
 
 def get_embedding(text: str) -> list:
     """Matn uchun embedding olish"""
+    cached = embedding_cache.get(text, EMBEDDING_MODEL)
+    if cached is not None:
+        return cached
+
     response = client.embeddings.create(
-        model="text-embedding-3-small",
+        model=EMBEDDING_MODEL,
         input=text
     )
-    return response.data[0].embedding
+    embedding = response.data[0].embedding
+    embedding_cache.set(text, EMBEDDING_MODEL, embedding)
+    return embedding
+
+
+async def aget_embedding(text: str) -> list:
+    """
+    Matn uchun embedding olish (event loop ni bloklamasdan)
+
+    Bir vaqtda kelgan keshda yo'q savollar embedding_batcher orqali bitta
+    so'rovga yig'iladi.
+    """
+    cached = embedding_cache.get_memory(text, EMBEDDING_MODEL)
+    if cached is None:
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(cache_executor, embedding_cache.get, text, EMBEDDING_MODEL)
+    if cached is not None:
+        return cached
+
+    return await embedding_batcher.submit(EMBEDDING_MODEL, text)
+
+
+def get_embeddings(texts: list) -> list:
+    """Bir nechta savol uchun embeddinglar: keshda yo'qlari bitta so'rovda olinadi"""
+    embeddings = [embedding_cache.get(text, EMBEDDING_MODEL) for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        response = client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=[texts[i] for i in missing]
+        )
+        for i, item in zip(missing, sorted(response.data, key=lambda item: item.index)):
+            embeddings[i] = item.embedding
+            embedding_cache.set(texts[i], EMBEDDING_MODEL, item.embedding)
+    return embeddings
+
+
+def _cache_get_many(texts: list) -> list:
+    return [embedding_cache.get(text, EMBEDDING_MODEL) for text in texts]
+
+
+def _cache_set_many(items: list):
+    for text, embedding in items:
+        embedding_cache.set(text, EMBEDDING_MODEL, embedding)
+
+
+async def aget_embeddings(texts: list) -> list:
+    """
+    get_embeddings() ning asinxron varianti
+
+    Disk keshi cache_executor da o'qiladi; yangi embeddinglar darhol
+    xotiraga, diskka esa javobni kutdirmasdan fonda yoziladi.
+    """
+    loop = asyncio.get_running_loop()
+    embeddings = [embedding_cache.get_memory(text, EMBEDDING_MODEL) for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        found = await loop.run_in_executor(cache_executor, _cache_get_many, [texts[i] for i in missing])
+        for i, embedding in zip(missing, found):
+            embeddings[i] = embedding
+        missing = [i for i in missing if embeddings[i] is None]
+    if missing:
+        response = await async_client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=[texts[i] for i in missing]
+        )
+        new_items = []
+        for i, item in zip(missing, sorted(response.data, key=lambda item: item.index)):
+            embeddings[i] = item.embedding
+            embedding_cache.set_memory(texts[i], EMBEDDING_MODEL, item.embedding)
+            new_items.append((texts[i], item.embedding))
+        loop.run_in_executor(cache_executor, _cache_set_many, new_items)
+    return embeddings
+
+
+async def _embed_batch(model: str, texts: list) -> list:
+    return await aget_embeddings(texts)
+
+
+embedding_batcher = MicroBatcher(
+    _embed_batch, settings.RAG_BATCH_WINDOW_MS / 1000, settings.RAG_BATCH_MAX
+)
 
 
 def get_embeddings_batch(texts: list) -> list:
-    """Bir nechta matnlar uchun embedding olish"""
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=texts
-    )
-    return [item.embedding for item in response.data]
+    """Bir nechta matnlar uchun embedding olish (token byudjeti bo'yicha batch, parallel, checkpoint bilan)"""
+    return embed_bulk(client, EMBEDDING_MODEL, texts, embedding_checkpoint)
@@ -0,0 +1,167 @@
+"""
+Leksik (BM25) qidiruv
+
+index_rules har safar collection ni o'zgartirganda uning yonida
+(CHROMA_PATH/<collection>.bm25.json) teskari indeks quriladi. Qaror
+raqamlari, band raqamlari, summalar kabi aniq atamalar embedding
+qidiruvida yo'qolib qolishi mumkin - ular shu indeks orqali topiladi va
+vektor natijalari bilan reciprocal rank fusion (RRF) orqali birlashtiriladi.
+"""
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+
+
+# O'zbek tutuq belgisining turli yozilishlari (o‘, g‘, ʼ ...)
+APOSTROPHES = str.maketrans({c: "'" for c in "‘’ʻʼ`´"})
+
+# Raqamlar (12, 12.1, 1,5) va so'zlar (lotin, kirill, o'zbekcha tutuq belgisi bilan)
+TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)*|[^\W\d_]+(?:'[^\W\d_]+)*")
+
+# Qo'shimchalarni taxminan olib tashlash: so'z boshidagi shuncha harf saqlanadi
+STEM_LENGTH = 7
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list:
+    """Matnni BM25 tokenlariga ajratish (registrsiz, so'zlar qisqartirilgan)"""
+    text = unicodedata.normalize("NFC", text).lower().translate(APOSTROPHES)
+    tokens = []
+    for token in TOKEN_RE.findall(text):
+        if token[0].isdigit():
+            tokens.append(token)
+        else:
+            tokens.append(token[:STEM_LENGTH])
+    return tokens
+
+
+def is_identifier_query(query: str) -> bool:
+    """Savol asosan raqamlar/identifikatorlardan iboratmi (embedding shart emas)"""
+    tokens = TOKEN_RE.findall(query)
+    if not tokens:
+        return False
+    numeric = sum(1 for token in tokens if token[0].isdigit())
+    return numeric / len(tokens) >= settings.LEXICAL_QUERY_MIN_SHARE
+
+
+def build_index(path: str, ids: list, documents: list, metadatas: list):
+    """Collection hujjatlaridan BM25 indeksini qurib, faylga atomar yozish"""
+    postings = {}
+    lengths = []
+    for doc_index, document in enumerate(documents):
+        counts = Counter(tokenize(document))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append([doc_index, tf])
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            'ids': ids,
+            'documents': documents,
+            'metadatas': metadatas,
+            'lengths': lengths,
+            'postings': postings,
+        }, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def build_index_from_collection(path: str, collection):
+    """Collection dagi barcha chunklar bo'yicha indeksni qayta qurish (embedding kerak emas)"""
+    stored = collection.get(include=["documents", "metadatas"])
+    build_index(path, stored['ids'], stored['documents'], stored['metadatas'])
+
+
+class LexicalIndex:
+    """Xotiraga yuklangan BM25 indeksi"""
+
+    def __init__(self, data: dict):
+        self.ids = data['ids']
+        self.documents = data['documents']
+        self.metadatas = data['metadatas']
+        self.lengths = data['lengths']
+        self.postings = data['postings']
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        self._positions = None
+
+    def get(self, ids: list) -> list:
+        """id lar bo'yicha chunklar ({id, text, metadata}), topilmaganlari uchun None"""
+        if self._positions is None:
+            self._positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        chunks = []
+        for chunk_id in ids:
+            i = self._positions.get(chunk_id)
+            chunks.append(None if i is None else {
+                'id': chunk_id,
+                'text': self.documents[i],
+                'metadata': self.metadatas[i] or {},
+            })
+        return chunks
+
+    def search(self, query: str, n_results: int) -> list:
+        """[{id, text, score, metadata}, ...] BM25 bali bo'yicha kamayish tartibida"""
+        total = len(self.ids)
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_index, tf in posting:
+                norm = 1 - BM25_B + BM25_B * self.lengths[doc_index] / self.average_length
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return [
+            {
+                'id': self.ids[doc_index],
+                'text': self.documents[doc_index],
+                'score': score,
+                'metadata': self.metadatas[doc_index] or {},
+            }
+            for doc_index, score in best
+        ]
+
+
+# fayl yo'li -> (mtime, LexicalIndex)
+_indexes = {}
+_lock = threading.Lock()
+
+
+def load_index(path: str):
+    """BM25 indeksi (fayl o'zgarmaguncha xotiradan), fayl yo'q bo'lsa None"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        cached = _indexes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, encoding="utf-8") as f:
+            index = LexicalIndex(json.load(f))
+        _indexes[path] = (mtime, index)
+        return index
+
+
+def reciprocal_rank_fusion(result_lists: list, n_results: int) -> list:
+    """Bir nechta natijalar ro'yxatini RRF bilan birlashtirish (id bo'yicha)"""
+    k = settings.RAG_RRF_K
+    fused = {}
+    for results in result_lists:
+        for rank, result in enumerate(results):
+            key = result.get('id') or result['text']
+            entry = fused.setdefault(key, {'result': result, 'score': 0.0})
+            entry['score'] += 1 / (k + rank + 1)
+
+    best = sorted(fused.values(), key=lambda entry: entry['score'], reverse=True)[:n_results]
+    return [entry['result'] for entry in best]
@@ -0,0 +1,157 @@
+"""
+Xotiradagi NumPy vektor indeksi (VECTOR_BACKEND=numpy)
+
+Qoidalar korpusi kichik (bir necha yuz chunk), shuning uchun aniq top-k
+bitta matritsa-vektor ko'paytmasi bilan Chroma stekidan ancha tez topiladi.
+Chroma ma'lumotlarning asosiy manbai bo'lib qoladi: indeks har bir
+collection versiyasi yonida (CHROMA_PATH/<collection>.vectors.*) saqlanadi
+va ishga tushishda yuklanadi yoki memory-map qilinadi.
+
+Vektorlar normallashtiriladi (kosinus o'xshashlik = skalyar ko'paytma) va
+float32, float16 yoki int8 (har bir qator uchun masshtab bilan)
+ko'rinishida saqlanishi mumkin. float16/int8 xotirani 2-4 baravar
+kamaytiradi, lekin hisoblashda float32 ga bloklab o'tkaziladi.
+"""
+import json
+import os
+
+import numpy as np
+
+
+DTYPES = ('float32', 'float16', 'int8')
+
+# float16/int8 matritsa shu qatorlar bo'yicha float32 ga o'tkaziladi
+BLOCK_ROWS = 4096
+
+
+def quantize(embeddings, dtype: str) -> tuple:
+    """
+    Embeddinglarni normallashtirib kerakli turga o'tkazish
+
+    Returns:
+        (matritsa, qator masshtablari yoki None)
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.size == 0:
+        matrix = matrix.reshape(0, 0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix = matrix / norms
+
+    if dtype == 'float32':
+        return np.ascontiguousarray(matrix), None
+    if dtype == 'float16':
+        return matrix.astype(np.float16), None
+    if dtype == 'int8':
+        scales = np.abs(matrix).max(axis=1, initial=0)
+        scales[scales == 0] = 1
+        quantized = np.round(matrix / scales[:, None] * 127).astype(np.int8)
+        return quantized, (scales / 127).astype(np.float32)
+    raise ValueError(f"Noma'lum VECTOR_DTYPE: {dtype}")
+
+
+class NumpyIndex:
+    """Aniq (brute-force) kosinus qidiruvi"""
+
+    def __init__(self, ids: list, documents: list, metadatas: list, matrix, scales=None):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.matrix = matrix
+        self.scales = scales
+
+    @classmethod
+    def build(cls, ids: list, embeddings, documents: list, metadatas: list, dtype: str = 'float32'):
+        matrix, scales = quantize(embeddings, dtype)
+        return cls(list(ids), list(documents), list(metadatas), matrix, scales)
+
+    def save(self, prefix: str):
+        """<prefix>.npy (+ .scales.npy) va <prefix>.json - atomar almashtirish bilan"""
+        pid = os.getpid()
+        files = [(f"{prefix}.npy", self.matrix)]
+        if self.scales is not None:
+            files.append((f"{prefix}.scales.npy", self.scales))
+        for path, array in files:
+            with open(f"{path}.{pid}.tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(f"{path}.{pid}.tmp", path)
+
+        # json oxirida yoziladi - u bor bo'lsa matritsa ham tayyor
+        with open(f"{prefix}.json.{pid}.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                'ids': self.ids,
+                'documents': self.documents,
+                'metadatas': self.metadatas,
+                'quantized': self.scales is not None,
+            }, f, ensure_ascii=False)
+        os.replace(f"{prefix}.json.{pid}.tmp", f"{prefix}.json")
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True):
+        with open(f"{prefix}.json", encoding="utf-8") as f:
+            rows = json.load(f)
+        mode = 'r' if mmap else None
+        matrix = np.load(f"{prefix}.npy", mmap_mode=mode)
+        scales = np.load(f"{prefix}.scales.npy") if rows['quantized'] else None
+        return cls(rows['ids'], rows['documents'], rows['metadatas'], matrix, scales)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def similarities(self, query_embeddings) -> np.ndarray:
+        """Har bir so'rov va har bir qator orasidagi kosinus o'xshashlik: (so'rovlar, qatorlar)"""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        queries = (queries / norms).T
+
+        if self.matrix.dtype == np.float32:
+            scores = self.matrix @ queries
+        else:
+            scores = np.empty((len(self.matrix), queries.shape[1]), dtype=np.float32)
+            for start in range(0, len(self.matrix), BLOCK_ROWS):
+                block = self.matrix[start:start + BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ queries
+        if self.scales is not None:
+            scores *= self.scales[:, None]
+        return scores.T
+
+    def top_k_many(self, query_embeddings, n_results: int) -> list:
+        """Har bir so'rov uchun (indekslar, o'xshashliklar) - kamayish tartibida"""
+        n_results = min(n_results, len(self.ids))
+        if n_results <= 0:
+            empty = (np.array([], dtype=np.int64), np.array([], dtype=np.float32))
+            return [empty for _ in query_embeddings]
+
+        results = []
+        for scores in self.similarities(query_embeddings):
+            if n_results < len(scores):
+                top = np.argpartition(-scores, n_results - 1)[:n_results]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            results.append((top, scores[top]))
+        return results
+
+    def top_k(self, query_embedding, n_results: int) -> tuple:
+        """(indekslar, o'xshashliklar) - kamayish tartibida"""
+        return self.top_k_many([query_embedding], n_results)[0]
+
+    def query_many(self, query_embeddings, n_results: int) -> list:
+        """Har bir so'rov uchun _query_collection() formatidagi natijalar"""
+        return [
+            [
+                {
+                    'id': self.ids[i],
+                    'text': self.documents[i],
+                    # Normallashtirilgan vektorlar uchun Chroma l2 masofasi bilan bir xil shkala
+                    'score': float(2 - 2 * score),
+                    'metadata': self.metadatas[i] or {},
+                }
+                for i, score in zip(top.tolist(), scores.tolist())
+            ]
+            for top, scores in self.top_k_many(query_embeddings, n_results)
+        ]
+
+    def query(self, query_embedding, n_results: int) -> list:
+        return self.query_many([query_embedding], n_results)[0]
@@ -0,0 +1,173 @@
+"""
+Qidiruv natijalari keshi
+
+Kalit: indeks versiyasi + til + n_results + normallashtirilgan savol.
+Qiymat: chunk id lari va ularning ballari (matn va metadata indeksdan
+olinadi). index_rules collection ni o'zgartirganda indeks versiyasi
+o'zgaradi, shuning uchun eski yozuvlar hech qachon topilmaydi va
+prune() bilan o'chiriladi.
+
+Oldinda xotiradagi LRU, orqasida SQLite fayl - bir nechta bot worker
+bitta faylni bo'lishadi. Topilish/topilmaslik hisoblagichlari ham shu
+faylda jamlanadi (retrieval_cache buyrug'i ko'rsatadi).
+
+Bot ichida kesh query_executor thread larida chaqiriladi (event loop
+SQLite ni kutmaydi). SQLite xatoliklari topilmadi deb hisoblanadi, yozuv
+esa faqat xotirada qoladi - natija baribir qidiruvdan olinadi.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from .embedding_cache import normalize_text
+
+
+# Hisoblagichlar SQLite ga shuncha so'rovda bir marta yoziladi
+STATS_FLUSH_EVERY = 50
+
+
+class RetrievalCache:
+    """Xotiradagi LRU + umumiy SQLite keshi"""
+
+    def __init__(self, path: str, max_memory_items: int = 10000):
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS retrievals ("
+            "key TEXT PRIMARY KEY, lang TEXT NOT NULL, version TEXT NOT NULL, results TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.errors = 0
+        # Hali SQLite ga yozilmagan hisoblagichlar
+        self._pending = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def make_key(query: str, lang: str, n_results: int, version: str) -> str:
+        raw = f"{version}\0{lang}\0{n_results}\0{normalize_text(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, query: str, lang: str, n_results: int, version: str):
+        """[(id, score), ...] yoki None"""
+        key = self.make_key(query, lang, n_results, version)
+        with self._lock:
+            entries = self._memory.get(key)
+            if entries is not None:
+                self._memory.move_to_end(key)
+                self._count('memory_hits')
+                return entries
+
+            try:
+                row = self._db.execute("SELECT results FROM retrievals WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Qidiruv keshidan o'qib bo'lmadi: {e}")
+                row = None
+            if row is None:
+                self._count('misses')
+                return None
+
+            entries = [tuple(entry) for entry in json.loads(row[0])]
+            self._remember(key, entries)
+            self._count('disk_hits')
+            return entries
+
+    def set(self, query: str, lang: str, n_results: int, version: str, entries: list):
+        key = self.make_key(query, lang, n_results, version)
+        with self._lock:
+            self._remember(key, [tuple(entry) for entry in entries])
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO retrievals (key, lang, version, results) VALUES (?, ?, ?, ?)",
+                    (key, lang, version, json.dumps(entries))
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"Qidiruv keshiga yozib bo'lmadi: {e}")
+
+    def prune(self, lang: str, version: str) -> int:
+        """Tilning boshqa (eski) versiyalariga tegishli yozuvlarni o'chirish"""
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM retrievals WHERE lang = ? AND version != ?", (lang, version)
+            ).rowcount
+            self._db.commit()
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM retrievals")
+            self._db.execute("DELETE FROM counters")
+            self._db.commit()
+
+    def _remember(self, key: str, entries: list):
+        self._memory[key] = entries
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _count(self, name: str):
+        setattr(self, name, getattr(self, name) + 1)
+        self._pending[name] += 1
+        if sum(self._pending.values()) >= STATS_FLUSH_EVERY:
+            self._flush_counters()
+
+    def _flush_counters(self):
+        rows = [(name, value) for name, value in self._pending.items() if value]
+        try:
+            self._db.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                rows
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            # Hisoblagichlar keyingi safar yoziladi
+            self._db.rollback()
+            self.errors += 1
+            print(f"Qidiruv keshi hisoblagichlarini yozib bo'lmadi: {e}")
+            return
+        for name, _ in rows:
+            self._pending[name] = 0
+
+    def flush(self):
+        """Yozilmagan hisoblagichlarni SQLite ga yozish"""
+        with self._lock:
+            self._flush_counters()
+
+    def stats(self) -> dict:
+        """Shu jarayondagi hisoblagichlar"""
+        return _ratio({
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'errors': self.errors,
+        })
+
+    def shared_stats(self) -> dict:
+        """Barcha worker lar bo'yicha jamlangan hisoblagichlar va yozuvlar soni"""
+        with self._lock:
+            counters = dict(self._db.execute("SELECT name, value FROM counters").fetchall())
+            versions = self._db.execute(
+                "SELECT lang, version, COUNT(*) FROM retrievals GROUP BY lang, version ORDER BY lang, version"
+            ).fetchall()
+        stats = _ratio({name: counters.get(name, 0) for name in ('memory_hits', 'disk_hits', 'misses')})
+        stats['versions'] = versions
+        return stats
+
+
+def _ratio(counters: dict) -> dict:
+    hits = counters['memory_hits'] + counters['disk_hits']
+    total = hits + counters['misses']
+    counters['hit_ratio'] = hits / total if total else 0.0
+    return counters
@@ -0,0 +1,79 @@
+"""
+Tokenlar sonini hisoblash (OpenAI tokenizer - tiktoken)
+
+tiktoken lug'atini yuklab bo'lmasa (internet yo'q), kirill/lotin matn
+uchun yuqoridan baholanadi: 2 belgi ~ 1 token.
+"""
+import tiktoken
+
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"tiktoken yuklanmadi ({e}), tokenlar taxminiy hisoblanadi")
+            _encoding = False
+    return _encoding
+
+
+def load_encoding():
+    """
+    Lug'atni oldindan yuklash: birinchi chaqiruvda u tarmoqdan yuklab olinishi
+    mumkin, shuning uchun ishga tushishda executor da chaqiriladi
+    """
+    _get_encoding()
+
+
+def count_tokens(text: str) -> int:
+    """Matndagi tokenlar soni (text-embedding-3-* va gpt-4 oilasi uchun cl100k_base)"""
+    encoding = _get_encoding()
+    if encoding is False:
+        return len(text) // 2 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: list) -> int:
+    """
+    Chat so'rovi promptidagi tokenlar soni (yuborishdan oldin)
+
+    Har bir xabar uchun rol va ajratgichlar ~3 token, javob boshlanishi
+    uchun yana 3 token. gpt-4o o200k_base ishlatadi - cl100k_base o'zbek
+    va rus matni uchun biroz ko'proq sanaydi, ya'ni baho yuqoridan.
+    """
+    return sum(count_tokens(message['content']) + 3 for message in messages) + 3
+
+
+def split_by_tokens(text: str, max_tokens: int, overlap: int = 0) -> list:
+    """
+    Uzun matnni so'z chegarasida max_tokens dan oshmaydigan bo'laklarga bo'lish
+
+    Ketma-ket bo'laklar taxminan `overlap` token bilan ustma-ust tushadi.
+    """
+    words = text.split()
+    sizes = [count_tokens(" " + word) for word in words]
+
+    parts = []
+    start = 0
+    while start < len(words):
+        end = start
+        total = 0
+        while end < len(words) and (end == start or total + sizes[end] <= max_tokens):
+            total += sizes[end]
+            end += 1
+        parts.append(" ".join(words[start:end]))
+        if end == len(words):
+            break
+
+        # Keyingi bo'lak oxirgi ~overlap tokendan boshlanadi
+        next_start = end
+        carried = 0
+        while next_start > start + 1 and carried + sizes[next_start - 1] <= overlap:
+            next_start -= 1
+            carried += sizes[next_start]
+        start = next_start
+    return parts
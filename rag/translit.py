@@ -0,0 +1,87 @@
+"""
+O'zbek kirill <-> lotin transliteratsiyasi va savolni normallashtirish
+
+O'zbekcha savol embedding, BM25 va keshlardan oldin qoidalar matni
+(rules.docx) alifbosiga - UZ_CORPUS_SCRIPT (standart: kirill) -
+o'tkaziladi: "Экспертиза муддати" va "ekspertiza muddati" bitta kalitga
+tushadi va ikkalasi ham indeksdagi so'zlar bilan mos keladi. Javob
+baribir foydalanuvchi alifbosida qaytariladi.
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+
+from .lexical import APOSTROPHES
+
+
+CYRILLIC_TO_LATIN = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'j',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'x', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': "'", 'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'ў': "o'", 'қ': 'q', 'ғ': "g'", 'ҳ': 'h',
+    'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ё': 'Yo', 'Ж': 'J',
+    'З': 'Z', 'И': 'I', 'Й': 'Y', 'К': 'K', 'Л': 'L', 'М': 'M', 'Н': 'N', 'О': 'O',
+    'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U', 'Ф': 'F', 'Х': 'X', 'Ц': 'Ts',
+    'Ч': 'Ch', 'Ш': 'Sh', 'Щ': 'Sh', 'Ъ': "'", 'Ы': 'I', 'Ь': '', 'Э': 'E', 'Ю': 'Yu',
+    'Я': 'Ya', 'Ў': "O'", 'Қ': 'Q', 'Ғ': "G'", 'Ҳ': 'H',
+})
+
+# So'z boshida va unlidan keyin "е" -> "ye" (ер -> yer, поезд -> poyezd)
+INITIAL_E_RE = re.compile(r"(?<![^\W\d_])[еЕ]|(?<=[аеёиоуўэюяъьАЕЁИОУЎЭЮЯЪЬ])[еЕ]")
+
+CYRILLIC_RE = re.compile(r"[Ѐ-ӿ]")
+
+LATIN_TO_CYRILLIC = {
+    "o'": 'ў', "g'": 'ғ', 'sh': 'ш', 'ch': 'ч', 'yo': 'ё', 'yu': 'ю', 'ya': 'я', 'ye': 'е', 'ts': 'ц',
+    'a': 'а', 'b': 'б', 'c': 'с', 'd': 'д', 'f': 'ф', 'g': 'г', 'h': 'ҳ', 'i': 'и', 'j': 'ж',
+    'k': 'к', 'l': 'л', 'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'q': 'қ', 'r': 'р', 's': 'с',
+    't': 'т', 'u': 'у', 'v': 'в', 'w': 'в', 'x': 'х', 'y': 'й', 'z': 'з',
+}
+
+# Avval ikki harfli birikmalar ("yo'" - йў, ё emas); "e" alohida (э/е), tutuq belgisi faqat harflar orasida (ъ)
+LATIN_RE = re.compile(r"[og]'|sh|ch|yo(?!')|y[ue]|ya|ts|[a-z]|(?<=[^\W\d_])'(?=[^\W\d_])", re.IGNORECASE)
+
+LATIN_VOWELS = "aeiou"
+
+
+def to_latin(text: str) -> str:
+    """O'zbek kirill matnini lotinga o'tkazish (lotin matn o'zgarmaydi)"""
+    if not CYRILLIC_RE.search(text):
+        return text
+    text = INITIAL_E_RE.sub(lambda m: 'ye' if m.group() == 'е' else 'Ye', text)
+    return text.translate(CYRILLIC_TO_LATIN)
+
+
+def _latin_letter(match) -> str:
+    latin = match.group()
+    lower = latin.lower()
+    if lower == "'":
+        return 'ъ'
+    if lower == 'e':
+        # So'z boshida va unlidan keyin "э" (ekspertiza -> экспертиза), aks holda "е"
+        start = match.start()
+        previous = match.string[start - 1].lower() if start else ""
+        cyrillic = 'э' if not previous.isalpha() or previous in LATIN_VOWELS else 'е'
+    else:
+        cyrillic = LATIN_TO_CYRILLIC[lower]
+    return cyrillic.upper() if latin[0].isupper() else cyrillic
+
+
+def to_cyrillic(text: str) -> str:
+    """O'zbek lotin matnini kirillga o'tkazish (kirill harflar o'zgarmaydi, tutuq belgilari "'" bo'lishi kerak)"""
+    return LATIN_RE.sub(_latin_letter, text)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Embedding, BM25 va keshlar uchun yagona ko'rinish: Unicode NFC, qoidalar
+    matni alifbosi (UZ_CORPUS_SCRIPT), kichik harflar, bitta bo'shliq
+    """
+    text = unicodedata.normalize("NFC", text).translate(APOSTROPHES)
+    if settings.UZ_CORPUS_SCRIPT == 'latin':
+        text = to_latin(text)
+    else:
+        text = to_cyrillic(text)
+    return " ".join(text.lower().split())
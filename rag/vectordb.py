@@ -1,9 +1,19 @@
+import asyncio
+import threading
+import time
 import chromadb
 from chromadb.config import Settings
 import os
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings as django_settings
-from .embeddings import get_embedding, get_embeddings_batch
+from .embeddings import get_embeddings, aget_embeddings, get_embeddings_batch, embedding_checkpoint
+from .batching import MicroBatcher
 from .chunker import process_rules_file
+from .context import build_context
+from . import lexical
+from .numpy_index import NumpyIndex
+from .retrieval_cache import RetrievalCache
+from .translit import normalize_query
 
 
 # ChromaDB client
@@ -11,99 +21,620 @@ CHROMA_PATH = os.path.join(django_settings.BASE_DIR, 'chroma_db')
 
 client = chromadb.PersistentClient(path=CHROMA_PATH)
 
-# Collection yaratish yoki olish
-collection = client.get_or_create_collection(
-    name="eco_rules",
-    metadata={"description": "Ekologik qoidalar"}
-)
+# Har bir til uchun asosiy nom va tavsif. Haqiqiy ma'lumot versiyalangan
+# collection larda (eco_rules__v7) turadi, asosiy nom esa alias fayli orqali
+# joriy versiyaga ishora qiladi.
+COLLECTIONS = {
+    "uz": ("eco_rules", "Ekologik qoidalar"),
+    "ru": ("eco_rules_ru", "Экологические правила (рус)"),
+}
 
-collection_ru = client.get_or_create_collection(
-    name="eco_rules_ru",
-    metadata={"description": "Экологические правила (рус)"}
+# Chroma so'rovlari uchun chegaralangan thread pool (event loop bloklanmasligi uchun)
+query_executor = ThreadPoolExecutor(
+    max_workers=django_settings.CHROMA_MAX_WORKERS,
+    thread_name_prefix="chroma"
 )
 
+# Takroriy savollar uchun qidiruv natijalari keshi (indeks versiyasiga bog'langan)
+retrieval_cache = RetrievalCache(django_settings.RETRIEVAL_CACHE_PATH, django_settings.RETRIEVAL_CACHE_SIZE)
+
+
+def _base_name(lang: str) -> str:
+    return COLLECTIONS["ru" if lang == "ru" else "uz"][0]
+
+
+def _alias_path(base_name: str) -> str:
+    return os.path.join(CHROMA_PATH, f"{base_name}.alias")
+
+
+def _lexical_path(collection_name: str) -> str:
+    """Collection yonidagi BM25 indeksi (rag/lexical.py)"""
+    return os.path.join(CHROMA_PATH, f"{collection_name}.bm25.json")
+
+
+def _vectors_prefix(collection_name: str) -> str:
+    """Collection yonidagi NumPy vektor indeksi fayllari (rag/numpy_index.py)"""
+    return os.path.join(CHROMA_PATH, f"{collection_name}.vectors")
+
+
+def _index_files(collection_name: str) -> list:
+    prefix = _vectors_prefix(collection_name)
+    return [_lexical_path(collection_name), f"{prefix}.json", f"{prefix}.npy", f"{prefix}.scales.npy"]
+
+
+def _read_alias(base_name: str) -> tuple:
+    """
+    Alias ko'rsatayotgan collection nomi va uning reviziyasi
+
+    Alias bo'lmasa - eski, versiyasiz collection (reviziya 0).
+    """
+    try:
+        with open(_alias_path(base_name), encoding="utf-8") as f:
+            lines = f.read().split()
+    except FileNotFoundError:
+        return base_name, 0
+    if not lines:
+        return base_name, 0
+    return lines[0], int(lines[1]) if len(lines) > 1 else 0
+
+
+def _write_alias(base_name: str, collection_name: str, revision: int = 0):
+    """Alias ni atomar almashtirish (vaqtinchalik fayl + os.replace)"""
+    path = _alias_path(base_name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(f"{collection_name}\n{revision}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _collection_names() -> list:
+    return [item if isinstance(item, str) else item.name for item in client.list_collections()]
+
+
+def _list_versions(base_name: str) -> list:
+    """base_name ning mavjud versiyalari: [(raqam, nom), ...] o'sish tartibida"""
+    prefix = f"{base_name}__v"
+    versions = []
+    for name in _collection_names():
+        if name == base_name:
+            versions.append((0, name))
+        elif name.startswith(prefix) and name[len(prefix):].isdigit():
+            versions.append((int(name[len(prefix):]), name))
+    return sorted(versions)
+
+
+# lang -> (collection nomi, reviziya, tekshirilgan vaqt)
+_resolved = {}
+# collection nomi -> Collection
+_collections = {}
+
+
+def _resolve(lang: str) -> tuple:
+    """
+    Alias ni (collection nomi, reviziya) ga aylantirish
+
+    Boshqa jarayon qayta indekslaganini sezish uchun alias
+    INDEX_VERSION_TTL soniyada bir marta qayta o'qiladi, shuning uchun
+    ishlab turgan bot yangi versiyaga qayta ishga tushirilmasdan o'tadi.
+    """
+    cached = _resolved.get(lang)
+    if cached and time.monotonic() - cached[2] < django_settings.INDEX_VERSION_TTL:
+        return cached[0], cached[1]
+
+    name, revision = _read_alias(_base_name(lang))
+    _resolved[lang] = (name, revision, time.monotonic())
+    return name, revision
+
+
+def get_index_version(lang: str = "uz") -> str:
+    """Joriy indeks versiyasi: collection nomi va qisman yangilanishlar reviziyasi"""
+    name, revision = _resolve(lang)
+    return f"{name}:{revision}"
+
+
+def get_collection(lang: str = "uz"):
+    """Til uchun joriy (alias ko'rsatayotgan) collection"""
+    name, _ = _resolve(lang)
+    target_collection = _collections.get(name)
+    if target_collection is None:
+        base_name, description = COLLECTIONS["ru" if lang == "ru" else "uz"]
+        target_collection = client.get_or_create_collection(
+            name=name,
+            metadata={"description": description}
+        )
+        _collections[name] = target_collection
+    return target_collection
+
+
+def _unique_chunks(chunks: list) -> list:
+    """Bir xil matnli (demak bir xil id li) chunk lardan faqat birinchisini qoldirish"""
+    seen = set()
+    unique = []
+    for chunk in chunks:
+        if chunk['id'] not in seen:
+            seen.add(chunk['id'])
+            unique.append(chunk)
+    return unique
+
 
-def index_rules(file_path: str, lang: str = "uz"):
+def _same_source(metadata: dict, source: str) -> bool:
+    """Chunk shu fayldanmi (eski indekslarda source - to'liq yo'l)"""
+    return os.path.basename((metadata or {}).get('source') or '') == source
+
+
+def _split_sources(collection_name: str, source: str) -> tuple:
+    """
+    Joriy collection ni ikkiga ajratish (collection bo'lmasa - ikkalasi bo'sh):
+    boshqa fayllar (qarorlar) chunk lari {'ids', 'embeddings', 'documents', 'metadatas'}
+    va shu fayl chunk lari {id: (embedding, metadata)}
+    """
+    others = {'ids': [], 'embeddings': [], 'documents': [], 'metadatas': []}
+    own = {}
+    if collection_name not in _collection_names():
+        return others, own
+    stored = client.get_collection(name=collection_name).get(include=["embeddings", "documents", "metadatas"])
+    for i, metadata in enumerate(stored['metadatas']):
+        # Chroma numpy massiv qaytaradi, yangi embeddinglar esa list
+        embedding = [float(value) for value in stored['embeddings'][i]]
+        if _same_source(metadata, source):
+            own[stored['ids'][i]] = (embedding, metadata)
+        else:
+            others['ids'].append(stored['ids'][i])
+            others['embeddings'].append(embedding)
+            others['documents'].append(stored['documents'][i])
+            others['metadatas'].append(metadata)
+    return others, own
+
+
+def _build_version(base_name: str, description: str, chunks: list, carried: dict, reuse: dict = None) -> str:
+    """
+    Fayl chunk lari va boshqa fayllardan ko'chirilgan chunk lardan (carried,
+    qayta embed qilinmaydi) yangi versiya collection qurish, nomini qaytaradi
+
+    reuse - {id: (embedding, metadata)}: shu fayldagi o'zgarmagan chunk lar
+    embeddinglari, faqat qolganlari embed qilinadi.
+    """
+    reuse = reuse or {}
+    versions = _list_versions(base_name)
+    new_name = f"{base_name}__v{versions[-1][0] + 1 if versions else 1}"
+    new_collection = client.create_collection(
+        name=new_name,
+        metadata={"description": description}
+    )
+
+    missing = [chunk for chunk in chunks if chunk['id'] not in reuse]
+    fresh = get_embeddings_batch([chunk['text'] for chunk in missing]) if missing else []
+    fresh = dict(zip((chunk['id'] for chunk in missing), fresh))
+
+    texts = [chunk['text'] for chunk in chunks]
+    ids = carried['ids'] + [chunk['id'] for chunk in chunks]
+    embeddings = carried['embeddings'] + [
+        reuse[chunk['id']][0] if chunk['id'] in reuse else fresh[chunk['id']] for chunk in chunks
+    ]
+    metadatas = carried['metadatas'] + [chunk['metadata'] for chunk in chunks]
+    texts = carried['documents'] + texts
+    # Chroma bitta add da get_max_batch_size() dan ko'p yozuv qabul qilmaydi
+    batch = client.get_max_batch_size()
+    for start in range(0, len(ids), batch):
+        new_collection.add(
+            ids=ids[start:start + batch],
+            embeddings=embeddings[start:start + batch],
+            documents=texts[start:start + batch],
+            metadatas=metadatas[start:start + batch]
+        )
+    lexical.build_index(_lexical_path(new_name), ids, texts, metadatas)
+    if django_settings.VECTOR_BACKEND == 'numpy':
+        NumpyIndex.build(ids, embeddings, texts, metadatas, django_settings.VECTOR_DTYPE) \
+            .save(_vectors_prefix(new_name))
+    return new_name
+
+
+def _drop_old_versions(base_name: str, current_name: str):
+    """Oxirgi INDEX_KEEP_VERSIONS tadan eski versiyalarni o'chirish"""
+    keep = django_settings.INDEX_KEEP_VERSIONS
+    for _, name in _list_versions(base_name)[:-keep]:
+        if name == current_name:
+            continue
+        client.delete_collection(name=name)
+        _collections.pop(name, None)
+        for path in _index_files(name):
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"Eski versiya o'chirildi: {name}")
+
+
+def index_rules(file_path: str, lang: str = "uz", dry_run: bool = False, full: bool = False) -> dict:
     """
     Rules faylni indekslash (vector DB ga yuklash)
     lang: "uz" yoki "ru"
-    """
-    target_collection = collection_ru if lang == "ru" else collection
 
-    # Avvalgi ma'lumotlarni o'chirish
-    try:
-        existing = target_collection.get()
-        if existing['ids']:
-            target_collection.delete(ids=existing['ids'])
-    except Exception:
-        pass
+    Chunk id lari matn hash idan olinadi, shuning uchun joriy collection dagi
+    shu fayl chunk lari bilan solishtirib faqat yangi/o'zgargan chunk lar
+    embed qilinadi - API xarajati fayldagi o'zgarishlarga bog'liq, umumiy
+    qoidalar hajmiga emas.
+
+    Har qanday o'zgarishda yangi versiya alohida collection da quriladi:
+    boshqa fayllar chunk lari va shu faylning o'zgarmagan chunk lari joriy
+    collection dan embeddinglari bilan ko'chiriladi, BM25 va NumPy
+    indekslari ham shu versiya uchun quriladi, keyin alias atomar
+    o'tkaziladi. Qidiruv hech qachon yarim yangilangan indeksni ko'rmaydi.
+
+    full=True bo'lsa (yoki alias hali yo'q bo'lsa) shu fayl chunk lari
+    o'zgarmagan bo'lsa ham qayta embed qilinadi.
+
+    Returns:
+        {'added': .., 'removed': .., 'unchanged': .., 'kept': .., 'collection': ..}
+    """
+    base_name, description = COLLECTIONS["ru" if lang == "ru" else "uz"]
 
     # Chunks olish
-    chunks = process_rules_file(file_path)
+    chunks = _unique_chunks(process_rules_file(file_path))
 
     if not chunks:
         print("Chunks topilmadi!")
-        return
+        return {'added': 0, 'removed': 0, 'unchanged': 0, 'kept': 0, 'collection': None}
 
-    # Embeddings olish
-    texts = [chunk['text'] for chunk in chunks]
-    embeddings = get_embeddings_batch(texts)
-
-    # ChromaDB ga qo'shish
-    target_collection.add(
-        ids=[chunk['id'] for chunk in chunks],
-        embeddings=embeddings,
-        documents=texts,
-        metadatas=[chunk['metadata'] for chunk in chunks]
+    source = chunks[0]['metadata']['source']
+    current_name, _ = _read_alias(base_name)
+    full = full or not os.path.exists(_alias_path(base_name))
+
+    # Joriy collection dagi shu faylga tegishli chunk lar bilan solishtirish
+    carried, stored = _split_sources(current_name, source)
+    reuse = {} if full else stored
+
+    added = [chunk for chunk in chunks if chunk['id'] not in reuse]
+    new_ids = {chunk['id'] for chunk in chunks}
+    removed = [chunk_id for chunk_id in stored if chunk_id not in new_ids]
+    # Matni o'zgarmagan, lekin o'rni siljigan chunk lar - faqat metadata yangilanadi
+    moved = [
+        chunk for chunk in chunks
+        if chunk['id'] in reuse and reuse[chunk['id']][1] != chunk['metadata']
+    ]
+
+    summary = {
+        'added': len(added),
+        'removed': len(removed),
+        'unchanged': len(chunks) - len(added),
+        'kept': len(carried['ids']),
+        'collection': current_name,
+    }
+    if dry_run:
+        return summary
+    if not (full or added or removed or moved):
+        # BM25 indeksi hali qurilmagan bo'lsa (eski indeks) - faqat uni qurish
+        if not os.path.exists(_lexical_path(current_name)):
+            lexical.build_index_from_collection(_lexical_path(current_name), client.get_collection(name=current_name))
+        return summary
+
+    summary['collection'] = _build_version(base_name, description, chunks, carried, reuse)
+    _write_alias(base_name, summary['collection'])
+    # Embeddinglar collection ga yozildi - checkpoint endi kerak emas
+    embedding_checkpoint.clear()
+    _resolved.pop(lang, None)
+    retrieval_cache.prune(lang, get_index_version(lang))
+    print(f"{len(added)} ta chunk embed qilindi, {len(removed)} ta o'chirildi, {summary['unchanged']} ta o'zgarmadi, "
+          f"boshqa fayllardan {summary['kept']} ta ko'chirildi ({lang}): {summary['collection']}")
+    _drop_old_versions(base_name, summary['collection'])
+    return summary
+
+
+async def aget_index_version(lang: str = "uz") -> str:
+    """get_index_version() ning asinxron varianti"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(query_executor, get_index_version, lang)
+
+
+def _build_numpy_index(collection_name: str, target_collection) -> NumpyIndex:
+    """Collection dagi embeddinglardan NumPy indeksini qurib saqlash"""
+    stored = target_collection.get(include=["embeddings", "documents", "metadatas"])
+    index = NumpyIndex.build(
+        stored['ids'], stored['embeddings'], stored['documents'], stored['metadatas'],
+        django_settings.VECTOR_DTYPE
     )
+    index.save(_vectors_prefix(collection_name))
+    return index
 
-    print(f"{len(chunks)} ta chunk indekslandi ({lang})!")
 
+# collection nomi -> (fayl mtime, NumpyIndex)
+_numpy_indexes = {}
+_numpy_lock = threading.Lock()
 
-def search(query: str, n_results: int = 3, lang: str = "uz") -> list:
-    """
-    Savol bo'yicha eng yaqin chunklar ni qidirish
 
-    Args:
-        query: Foydalanuvchi savoli
-        n_results: Qaytariladigan natijalar soni
-        lang: Til - "uz" yoki "ru"
+def get_numpy_index(lang: str = "uz") -> NumpyIndex:
+    """
+    Joriy collection uchun NumPy indeksi
 
-    Returns:
-        [{text, score, metadata}, ...]
+    Fayl bo'lmasa (masalan, backend keyinroq yoqilgan bo'lsa) Chroma dagi
+    embeddinglardan bir marta quriladi.
     """
-    target_collection = collection_ru if lang == "ru" else collection
+    name, _ = _resolve(lang)
+    prefix = _vectors_prefix(name)
+    with _numpy_lock:
+        try:
+            mtime = os.stat(f"{prefix}.json").st_mtime_ns
+        except FileNotFoundError:
+            index = _build_numpy_index(name, get_collection(lang))
+            mtime = os.stat(f"{prefix}.json").st_mtime_ns
+            _numpy_indexes[name] = (mtime, index)
+            return index
+
+        cached = _numpy_indexes.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        index = NumpyIndex.load(prefix, mmap=django_settings.VECTOR_MMAP)
+        _numpy_indexes[name] = (mtime, index)
+        return index
 
-    # Query embedding
-    query_embedding = get_embedding(query)
 
-    # Qidirish
-    results = target_collection.query(
-        query_embeddings=[query_embedding],
+def warm_up():
+    """Ishga tushishda qidiruv indekslarini yuklab qo'yish (birinchi savol sekin bo'lmasligi uchun)"""
+    for lang in COLLECTIONS:
+        try:
+            if django_settings.VECTOR_BACKEND == 'numpy':
+                index = get_numpy_index(lang)
+                print(f"NumPy indeksi yuklandi ({lang}): {len(index)} ta chunk, {index.matrix.dtype}")
+            if django_settings.RAG_HYBRID:
+                lexical.load_index(_lexical_path(_resolve(lang)[0]))
+        except Exception as e:
+            # Indeks birinchi so'rovda qayta yuklanadi
+            print(f"Indeksni oldindan yuklashda xatolik ({lang}): {e}")
+
+
+def _query_many(lang: str, query_embeddings: list, n_results: int) -> list:
+    """Bir nechta embedding bo'yicha joriy indeksdan bitta so'rovda qidirish"""
+    if django_settings.VECTOR_BACKEND == 'numpy':
+        return get_numpy_index(lang).query_many(query_embeddings, n_results)
+
+    results = get_collection(lang).query(
+        query_embeddings=query_embeddings,
         n_results=n_results
     )
 
     # Natijalarni formatlash
-    formatted_results = []
-    if results['documents'] and results['documents'][0]:
-        for i, doc in enumerate(results['documents'][0]):
+    all_results = []
+    for q in range(len(query_embeddings)):
+        formatted_results = []
+        documents = results['documents'][q] if results['documents'] else []
+        for i, doc in enumerate(documents):
             formatted_results.append({
+                'id': results['ids'][q][i] if results.get('ids') else None,
                 'text': doc,
-                'score': results['distances'][0][i] if results['distances'] else None,
-                'metadata': results['metadatas'][0][i] if results['metadatas'] else {}
+                'score': results['distances'][q][i] if results['distances'] else None,
+                'metadata': results['metadatas'][q][i] if results['metadatas'] else {}
             })
+        all_results.append(formatted_results)
+
+    return all_results
+
+
+def _query_collection(lang: str, query_embedding: list, n_results: int) -> list:
+    """Tayyor embedding bo'yicha joriy indeksdan qidirish va natijani formatlash"""
+    return _query_many(lang, [query_embedding], n_results)[0]
+
+
+def _lexical_search(query: str, n_results: int, lang: str) -> list:
+    """Joriy collection ning BM25 indeksi bo'yicha qidirish (indeks bo'lmasa - bo'sh ro'yxat)"""
+    if not django_settings.RAG_HYBRID:
+        return []
+    name, _ = _resolve(lang)
+    index = lexical.load_index(_lexical_path(name))
+    return index.search(query, n_results) if index else []
+
+
+def _lexical_many(queries: list, n_results: int, lang: str) -> list:
+    return [_lexical_search(query, n_results, lang) for query in queries]
+
+
+def _fuse(queries: list, lexical_results: list, vector_results: dict, n_results: int) -> list:
+    """Har bir savol uchun leksik va vektor natijalarini birlashtirish"""
+    fused = []
+    for i, query in enumerate(queries):
+        if i not in vector_results:
+            fused.append(lexical_results[i])
+        elif not lexical_results[i]:
+            fused.append(vector_results[i])
+        else:
+            fused.append(lexical.reciprocal_rank_fusion([vector_results[i], lexical_results[i]], n_results))
+    return fused
+
+
+def _needs_vectors(queries: list, lexical_results: list) -> list:
+    # Raqamlar/identifikatorlar bo'yicha savol - embedding so'ramasdan leksik natija
+    return [
+        i for i, query in enumerate(queries)
+        if not (lexical_results[i] and lexical.is_identifier_query(query))
+    ]
+
+
+def _search_many_uncached(queries: list, n_results: int, lang: str) -> list:
+    lexical_results = _lexical_many(queries, n_results, lang)
+    vector_indexes = _needs_vectors(queries, lexical_results)
+
+    vector_results = {}
+    if vector_indexes:
+        embeddings = get_embeddings([queries[i] for i in vector_indexes])
+        for i, results in zip(vector_indexes, _query_many(lang, embeddings, n_results)):
+            vector_results[i] = results
+    return _fuse(queries, lexical_results, vector_results, n_results)
+
+
+async def _asearch_many_uncached(queries: list, n_results: int, lang: str) -> list:
+    loop = asyncio.get_running_loop()
+    lexical_results = await loop.run_in_executor(query_executor, _lexical_many, queries, n_results, lang)
+    vector_indexes = _needs_vectors(queries, lexical_results)
+
+    vector_results = {}
+    if vector_indexes:
+        embeddings = await aget_embeddings([queries[i] for i in vector_indexes])
+        results = await loop.run_in_executor(query_executor, _query_many, lang, embeddings, n_results)
+        vector_results = dict(zip(vector_indexes, results))
+    return _fuse(queries, lexical_results, vector_results, n_results)
+
+
+def _hydrate(lang: str, entries: list):
+    """Keshdagi (id, ball) larni to'liq natijalarga aylantirish (chunk yo'qolgan bo'lsa - None)"""
+    ids = [chunk_id for chunk_id, _ in entries]
+    index = lexical.load_index(_lexical_path(_resolve(lang)[0]))
+    if index is not None:
+        chunks = index.get(ids)
+    else:
+        stored = get_collection(lang).get(ids=ids, include=["documents", "metadatas"])
+        found = {
+            chunk_id: {'id': chunk_id, 'text': text, 'metadata': metadata or {}}
+            for chunk_id, text, metadata in zip(stored['ids'], stored['documents'], stored['metadatas'])
+        }
+        chunks = [found.get(chunk_id) for chunk_id in ids]
+
+    if None in chunks:
+        return None
+    return [dict(chunk, score=score) for chunk, (_, score) in zip(chunks, entries)]
+
+
+def _cache_lookup(queries: list, n_results: int, lang: str) -> tuple:
+    """(har bir savol uchun keshdagi natija yoki None, indeks versiyasi)"""
+    if not django_settings.RETRIEVAL_CACHE:
+        return [None] * len(queries), None
+    version = get_index_version(lang)
+    cached = []
+    for query in queries:
+        entries = retrieval_cache.get(query, lang, n_results, version)
+        cached.append(_hydrate(lang, entries) if entries is not None else None)
+    return cached, version
+
+
+async def _acache_lookup(queries: list, n_results: int, lang: str) -> tuple:
+    """_cache_lookup() query_executor da: alias fayli, SQLite va hydrate event loop ni to'xtatmaydi"""
+    if not django_settings.RETRIEVAL_CACHE:
+        return [None] * len(queries), None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(query_executor, _cache_lookup, queries, n_results, lang)
+
+
+def _acache_store(queries: list, results: list, n_results: int, lang: str, version):
+    """_cache_store() ni query_executor ga yuborish (javob kesh yozilishini kutmaydi)"""
+    if version is not None:
+        asyncio.get_running_loop().run_in_executor(
+            query_executor, _cache_store, queries, results, n_results, lang, version
+        )
+
+
+def _cache_store(queries: list, results: list, n_results: int, lang: str, version):
+    if version is None:
+        return
+    for query, query_results in zip(queries, results):
+        # id siz natijalarni (masalan, eski collection) keshdan qayta tiklab bo'lmaydi
+        if query_results and all(result.get('id') for result in query_results):
+            entries = [(result['id'], result['score']) for result in query_results]
+            retrieval_cache.set(query, lang, n_results, version, entries)
+
 
-    return formatted_results
+def _normalize_queries(queries: list, lang: str) -> list:
+    # O'zbekcha savollar (lotin/kirill) qoidalar matni alifbosidagi bir xil ko'rinishga keltiriladi
+    if lang == "ru":
+        return list(queries)
+    return [normalize_query(query) for query in queries]
 
 
-def get_context(query: str, n_results: int = 3, lang: str = "uz") -> str:
+def search_many(queries: list, n_results: int = 3, lang: str = "uz") -> list:
     """
-    Savol uchun kontekst olish (GPT ga yuborish uchun)
+    Bir nechta savol uchun qidiruv: barcha embeddinglar bitta so'rovda,
+    indeks ham barcha vektorlar bilan bir marta so'raladi
+
+    Returns:
+        har bir savol uchun [{id, text, score, metadata}, ...]
+    """
+    queries = _normalize_queries(queries, lang)
+    results, version = _cache_lookup(queries, n_results, lang)
+    missing = [i for i, cached in enumerate(results) if cached is None]
+    if missing:
+        missing_queries = [queries[i] for i in missing]
+        found = _search_many_uncached(missing_queries, n_results, lang)
+        _cache_store(missing_queries, found, n_results, lang, version)
+        for i, query_results in zip(missing, found):
+            results[i] = query_results
+    return results
+
+
+async def asearch_many(queries: list, n_results: int = 3, lang: str = "uz") -> list:
+    """search_many() ning asinxron varianti"""
+    queries = _normalize_queries(queries, lang)
+    results, version = await _acache_lookup(queries, n_results, lang)
+    missing = [i for i, cached in enumerate(results) if cached is None]
+    if missing:
+        missing_queries = [queries[i] for i in missing]
+        found = await _asearch_many_uncached(missing_queries, n_results, lang)
+        _acache_store(missing_queries, found, n_results, lang, version)
+        for i, query_results in zip(missing, found):
+            results[i] = query_results
+    return results
+
+
+async def _search_batch(key: tuple, queries: list) -> list:
+    lang, n_results = key
+    version = await aget_index_version(lang) if django_settings.RETRIEVAL_CACHE else None
+    results = await _asearch_many_uncached(queries, n_results, lang)
+    _acache_store(queries, results, n_results, lang, version)
+    return results
+
+
+# Bir vaqtda kelgan answer_question qidiruvlari bitta qidiruvga yig'iladi
+search_batcher = MicroBatcher(
+    _search_batch, django_settings.RAG_BATCH_WINDOW_MS / 1000, django_settings.RAG_BATCH_MAX
+)
+
+
+def search(query: str, n_results: int = 3, lang: str = "uz") -> list:
+    """
+    Savol bo'yicha eng yaqin chunklar ni qidirish (vektor + BM25, RRF bilan)
+
+    Args:
+        query: Foydalanuvchi savoli
+        n_results: Qaytariladigan natijalar soni
+        lang: Til - "uz" yoki "ru"
+
+    Returns:
+        [{id, text, score, metadata}, ...]
+    """
+    return search_many([query], n_results, lang)[0]
+
+
+async def asearch(query: str, n_results: int = 3, lang: str = "uz") -> list:
+    """
+    search() ning asinxron varianti: embedding AsyncOpenAI orqali,
+    Chroma, BM25 va qidiruv keshi so'rovlari esa query_executor da bajariladi.
+    Keshda yo'q parallel savollar search_batcher orqali bitta batch da qidiriladi.
     """
-    results = search(query, n_results, lang)
+    query = _normalize_queries([query], lang)[0]
+    cached, _ = await _acache_lookup([query], n_results, lang)
+    if cached[0] is not None:
+        return cached[0]
+    return await search_batcher.submit((lang, n_results), query)
+
 
+def _join_results(results: list, max_tokens: int = None) -> str:
+    """
+    Natijalarni max_tokens (standart - RAG_CONTEXT_TOKENS) byudjetidagi bitta kontekst matniga
+    birlashtirish; eng relevant RAG_MIN_CONTEXT_CHUNKS ta chunk byudjetdan qat'i nazar qoladi
+    """
     if not results:
         return ""
 
-    context = "\n\n---\n\n".join([r['text'] for r in results])
-    return context
+    if max_tokens is None:
+        max_tokens = django_settings.RAG_CONTEXT_TOKENS
+    return build_context(results, max_tokens, django_settings.RAG_MIN_CONTEXT_CHUNKS)
+
+
+def get_context(query: str, n_results: int = 3, lang: str = "uz", max_tokens: int = None) -> str:
+    """
+    Savol uchun kontekst olish (GPT ga yuborish uchun)
+    """
+    return _join_results(search(query, n_results, lang), max_tokens)
+
+
+async def aget_context(query: str, n_results: int = 3, lang: str = "uz", max_tokens: int = None) -> str:
+    """
+    get_context() ning asinxron varianti
+    """
+    return _join_results(await asearch(query, n_results, lang), max_tokens)